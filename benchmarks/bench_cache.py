@@ -0,0 +1,67 @@
+# bench_cache.py
+#  - lookup latency of the persistent cache backends
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""Fill each persistent cache backend with expand entries and time random
+lookups against it.
+
+Usage: python benchmarks/bench_cache.py [num_entries] [num_lookups]
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from yourls.cache import SQLiteCache, DbmCache
+
+def bench(cache, entries, lookups):
+    start = time.time()
+    for i in xrange(entries):
+        cache.set(('expand', 'http://sho.rt/%x' % i), 'http://example.com/%d' % i)
+    if hasattr(cache, 'flush'):
+        cache.flush()
+    fill = time.time() - start
+
+    keys = [('expand', 'http://sho.rt/%x' % random.randrange(entries))
+            for i in xrange(lookups)]
+    start = time.time()
+    for key in keys:
+        cache.get(key)
+    lookup = (time.time() - start) / lookups
+    cache.close()
+    return fill, lookup
+
+def main(entries=1000000, lookups=100000):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name, make in (('sqlite', lambda: SQLiteCache(os.path.join(tmpdir, 'c.sqlite'), batch_size=10000)),
+                           ('dbm', lambda: DbmCache(os.path.join(tmpdir, 'c.dbm')))):
+            fill, lookup = bench(make(), entries, lookups)
+            sys.stdout.write('%-8s fill %d: %7.2fs  lookup: %7.1f us\n'
+                             % (name, entries, fill, lookup * 1e6))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
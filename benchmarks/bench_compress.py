@@ -0,0 +1,61 @@
+# bench_compress.py
+#  - stats transfer size and time with and without compression
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""Fetch the stats of every link on a local stand-in server that compresses
+like mod_deflate, once with compression negotiated and once without, and
+report the bytes received and the time taken.
+
+Usage: python benchmarks/bench_compress.py [num_links]
+"""
+
+import sys
+import time
+
+from yourls.client import YourlsClient
+from yourls.fakeserver import FakeYourlsServer
+
+SIGNATURE = 'benchmark'
+
+def main(num_links=5000):
+    with FakeYourlsServer(signature=SIGNATURE, compress=True) as server:
+        for i in range(num_links):
+            server.add('http://example.com/articles/%d?utm_source=feed' % i,
+                       title='Article number %d' % i, clicks=i % 97)
+
+        sys.stdout.write('%-10s %12s %12s %8s %10s\n'
+                         % ('compress', 'wire bytes', 'decoded', 'ratio', 'seconds'))
+        for compress in (False, True):
+            client = YourlsClient(server.apiurl, token=SIGNATURE,
+                                  compress=compress)
+            start = time.time()
+            for link in client.stats(limit=num_links, chunk_size=500):
+                pass
+            elapsed = time.time() - start
+            pool = client.pool
+            sys.stdout.write('%-10s %12d %12d %8.1f %10.3f\n'
+                             % (compress, pool.bytes_on_wire, pool.bytes_decoded,
+                                float(pool.bytes_decoded) / pool.bytes_on_wire,
+                                elapsed))
+            client.close()
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
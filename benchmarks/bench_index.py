@@ -0,0 +1,59 @@
+# bench_index.py
+#  - lookup time of the offline expansion index
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""Build an expansion index of many links and time lookups of present and
+missing keywords.
+
+Usage: python benchmarks/bench_index.py [num_links]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from yourls.fakeserver import _base36
+from yourls.index import ExpansionIndex
+
+def main(num_links=1000000, lookups=100000):
+    path = os.path.join(tempfile.mkdtemp(), 'links.idx')
+    start = time.time()
+    index = ExpansionIndex.build(path, ((_base36(i), 'http://example.com/page/%d' % i)
+                                        for i in xrange(num_links)))
+    sys.stdout.write('built %d links in %.1fs, %d bytes\n'
+                     % (num_links, time.time() - start, os.path.getsize(path)))
+
+    rng = random.Random(0)
+    for label, keywords in (
+            ('hit', [_base36(rng.randrange(num_links)) for i in xrange(lookups)]),
+            ('miss', [_base36(num_links + i) for i in xrange(lookups)])):
+        start = time.time()
+        for keyword in keywords:
+            index.get(keyword)
+        elapsed = time.time() - start
+        sys.stdout.write('%-5s %8.2f us/lookup\n' % (label, elapsed / lookups * 1e6))
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
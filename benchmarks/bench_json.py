@@ -0,0 +1,66 @@
+# bench_json.py
+#  - compare the installed JSON decoders on YOURLS payloads
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""Time every installed JSON decoder on expand, url-stats and stats
+responses as produced by the fake YOURLS server.
+
+Usage: python benchmarks/bench_json.py [repeat]
+"""
+
+import sys
+import timeit
+
+from yourls.decoders import available_decoders, get_decoder
+from yourls.fakeserver import FakeYourlsServer
+
+def payloads():
+    fake = FakeYourlsServer()
+    fake._server = type('Bound', (object,), {'server_address' : ('127.0.0.1', 80)})
+    for i in range(1000):
+        fake.add('http://example.com/some/fairly/long/path/%d?utm_source=news' % i,
+                 title='Example page number %d' % i, clicks=i)
+
+    yield 'expand', fake.handle({'action' : 'expand', 'shorturl' : '1'})[1]
+    yield 'url-stats', fake.handle({'action' : 'url-stats', 'shorturl' : '1'})[1]
+    for limit in (100, 1000):
+        yield 'stats/%d' % limit, fake.handle({'action' : 'stats',
+                                               'limit' : limit})[1]
+
+def main(repeat=5):
+    decoders = available_decoders()
+    sys.stdout.write('%-12s %8s' % ('payload', 'bytes'))
+    for name in decoders:
+        sys.stdout.write(' %12s' % name)
+    sys.stdout.write('\n')
+
+    for label, payload in payloads():
+        number = max(1, 2000000 // len(payload))
+        sys.stdout.write('%-12s %8d' % (label, len(payload)))
+        for name in decoders:
+            loads = get_decoder(name)
+            best = min(timeit.repeat(lambda: loads(payload), number=number,
+                                     repeat=repeat))
+            sys.stdout.write(' %9.1f us' % (best / number * 1e6))
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
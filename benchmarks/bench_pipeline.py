@@ -0,0 +1,69 @@
+# bench_pipeline.py
+#  - compare request throughput over a slow link with and without pipelining
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""Measure expand() requests per second against a local stand-in server
+behind a proxy adding network latency: serially on one connection,
+serially on one connection per thread, and pipelined on one connection
+at several depths.
+
+Usage: python benchmarks/bench_pipeline.py [num_requests] [rtt_ms]
+"""
+
+import sys
+import time
+
+from yourls.client import YourlsClient
+from yourls.fakeserver import FakeYourlsServer, LatencyProxy
+
+SIGNATURE = 'benchmark'
+THREADS = 16
+
+def run(client, keywords, workers):
+    start = time.time()
+    for shorturl, longurl in client.expand_many(keywords, workers=workers):
+        if not isinstance(longurl, basestring):
+            raise longurl
+    return time.time() - start
+
+
+def main(num_requests=400, rtt_ms=80):
+    with FakeYourlsServer(signature=SIGNATURE) as server:
+        keywords = [server.add('http://example.com/%d' % i)
+                    for i in range(num_requests)]
+
+        sys.stdout.write('%-22s %8s %12s %10s\n'
+                         % ('mode', 'threads', 'connections', 'req/s'))
+        modes = [('serial', None, 1), ('serial', None, THREADS)]
+        modes += [('pipelined, depth %d' % depth, depth, THREADS)
+                  for depth in (2, 4, 8, 16)]
+        for name, depth, workers in modes:
+            with LatencyProxy(server, rtt=rtt_ms / 1000.0) as proxy:
+                client = YourlsClient(proxy.apiurl, token=SIGNATURE,
+                                      pool_size=workers, pipeline=depth)
+                elapsed = run(client, keywords, workers)
+                sys.stdout.write('%-22s %8d %12d %10.1f\n'
+                                 % (name, workers, proxy.connections,
+                                    num_requests / elapsed))
+                client.close()
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,64 @@
+# bench_pool.py
+#  - compare request throughput with and without the connection pool
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""Measure expand() requests per second against a local stand-in server,
+once through a plain urllib2.urlopen per request and once through the
+keep-alive ConnectionPool.
+
+Usage: python benchmarks/bench_pool.py [num_requests]
+"""
+
+import sys
+import time
+import urllib
+import urllib2
+
+from yourls.client import YourlsClient
+from yourls.fakeserver import FakeYourlsServer
+
+class UnpooledClient(YourlsClient):
+    """The pre-pool request path: one urlopen, and one connection, per call"""
+
+    def _send_request(self, args):
+        req = urllib2.Request(self.apiurl)
+        req.add_data(urllib.urlencode(self._make_args(args)))
+        return urllib2.urlopen(req).read()
+
+def run(client, keyword, count):
+    start = time.time()
+    for i in xrange(count):
+        client.expand(keyword)
+    return count / (time.time() - start)
+
+def main(count=2000):
+    with FakeYourlsServer(signature='bench') as server:
+        keyword = server.add('http://example.com/some/long/path')
+        unpooled = run(UnpooledClient(server.apiurl, token='bench'), keyword, count)
+        pooled = run(YourlsClient(server.apiurl, token='bench'), keyword, count)
+
+    sys.stdout.write('requests:   %d\n' % count)
+    sys.stdout.write('unpooled:   %8.1f req/s\n' % unpooled)
+    sys.stdout.write('pooled:     %8.1f req/s\n' % pooled)
+    sys.stdout.write('speedup:    %8.2fx\n' % (pooled / unpooled))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,167 @@
+# run.py
+#  - benchmark suite for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""Run expand() against the fake YOURLS server in serial, threaded, bulk
+and async modes and report throughput with p50/p99 latency.
+
+Usage: python benchmarks/run.py [--requests N] [--concurrency N]
+                                [--latency SECONDS] [--error-rate FRACTION]
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from yourls.async_client import AsyncYourlsClient
+from yourls.client import YourlsClient
+from yourls.fakeserver import FakeYourlsServer
+
+SIGNATURE = 'bench'
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+class TimedClient(YourlsClient):
+    """Records the latency of every expand() call"""
+
+    def __init__(self, *args, **kwargs):
+        YourlsClient.__init__(self, *args, **kwargs)
+        self.latencies = []
+
+    def expand(self, shorturl):
+        start = time.time()
+        try:
+            return YourlsClient.expand(self, shorturl)
+        finally:
+            self.latencies.append(time.time() - start)
+
+def bench_serial(server, keywords, concurrency):
+    client = TimedClient(server.apiurl, token=SIGNATURE)
+    for keyword in keywords:
+        try:
+            client.expand(keyword)
+        except Exception:
+            pass
+    client.close()
+    return client.latencies
+
+def bench_threaded(server, keywords, concurrency):
+    client = TimedClient(server.apiurl, token=SIGNATURE, pool_size=concurrency)
+
+    def worker(chunk):
+        for keyword in chunk:
+            try:
+                client.expand(keyword)
+            except Exception:
+                pass
+
+    threads = [threading.Thread(target=worker, args=(keywords[i::concurrency],))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    client.close()
+    return client.latencies
+
+def bench_bulk(server, keywords, concurrency):
+    client = TimedClient(server.apiurl, token=SIGNATURE, pool_size=concurrency)
+    for item in client.expand_many(keywords, workers=concurrency):
+        pass
+    client.close()
+    return client.latencies
+
+def bench_async(server, keywords, concurrency):
+    client = AsyncYourlsClient(server.apiurl, token=SIGNATURE,
+                               max_in_flight=concurrency)
+    latencies = []
+    lock = threading.Lock()
+
+    def record(started):
+        def done(future):
+            with lock:
+                latencies.append(time.time() - started)
+        return done
+
+    futures = []
+    for keyword in keywords:
+        future = client.expand(keyword)
+        future.add_done_callback(record(time.time()))
+        futures.append(future)
+    for future in futures:
+        future.exception()
+    client.close()
+    return latencies
+
+def bench_batch(server, keywords, concurrency):
+    client = YourlsClient(server.apiurl, token=SIGNATURE)
+    client.supports_batch()
+    latencies = []
+    for start in range(0, len(keywords), server.max_batch):
+        chunk = keywords[start:start + server.max_batch]
+        started = time.time()
+        client.batch([('expand', keyword) for keyword in chunk])
+        # every operation of a batch waits for the whole batch
+        latencies.extend([time.time() - started] * len(chunk))
+    client.close()
+    return latencies
+
+SCENARIOS = (('serial', bench_serial), ('threaded', bench_threaded),
+             ('bulk', bench_bulk), ('async', bench_async),
+             ('batch', bench_batch))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--links', type=int, default=1000)
+    parser.add_argument('scenarios', nargs='*',
+                        default=[name for name, fn in SCENARIOS])
+    options = parser.parse_args(argv)
+
+    server = FakeYourlsServer(signature=SIGNATURE, latency=options.latency,
+                              error_rate=options.error_rate, seed=0,
+                              max_batch=100)
+    with server:
+        links = [server.add('http://example.com/page/%d' % i)
+                 for i in range(options.links)]
+        keywords = [links[i % len(links)] for i in range(options.requests)]
+
+        sys.stdout.write('%-10s %10s %10s %10s\n'
+                         % ('scenario', 'req/s', 'p50 ms', 'p99 ms'))
+        for name, fn in SCENARIOS:
+            if name not in options.scenarios:
+                continue
+            start = time.time()
+            latencies = fn(server, keywords, options.concurrency)
+            elapsed = time.time() - start
+            sys.stdout.write('%-10s %10.1f %10.2f %10.2f\n'
+                             % (name, len(keywords) / elapsed,
+                                percentile(latencies, 0.5) * 1000,
+                                percentile(latencies, 0.99) * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -20,5 +20,6 @@ setup(name='Yourls',
       packages=['yourls'],
       package_dir={'yourls':'yourls'},
       py_modules=['yourls'],
+      scripts=['bin/yourls'],
       cmdclass = {'test' : PyTest}
      )
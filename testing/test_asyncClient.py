@@ -0,0 +1,151 @@
+# test_asyncClient.py
+#  - tests for the non-blocking python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import threading
+import time
+
+import pytest
+import yourls.async_client
+from yourls import YourlsError, YourlsOperationError
+from yourls.fakeserver import FakeYourlsServer
+from yourls.futures import Executor
+from yourls.resilience import RetryPolicy, CircuitBreaker
+from testing.test_yourlsClient import (test_apiurl, test_user, test_pass,
+        test_baseurl, test_url1, test_url2, mock_request, mock_request_404,
+        mock_short_keyworderror)
+
+class TestAsyncYourlsClient():
+
+    def setup_method(self, method):
+        self.testclient = yourls.async_client.AsyncYourlsClient(test_apiurl,
+                test_user, test_pass, max_in_flight=2)
+
+    def teardown_method(self, method):
+        self.testclient.close()
+
+    def test_shorten_url(self, monkeypatch):
+        monkeypatch.setattr(self.testclient.client, '_send_request', mock_request)
+        futures = [self.testclient.shorten(test_url1),
+                   self.testclient.shorten(test_url2)]
+
+        assert [f.result(5) for f in futures] == [test_baseurl + '1', test_baseurl + '2']
+
+    def test_expand_url(self, monkeypatch):
+        monkeypatch.setattr(self.testclient.client, '_send_request', mock_request)
+
+        assert self.testclient.expand(1).result(5) == test_url1
+
+    def test_shorten_used_keyword(self, monkeypatch):
+        monkeypatch.setattr(self.testclient.client, '_send_request', mock_short_keyworderror)
+        future = self.testclient.shorten(test_url1, custom='1')
+
+        assert isinstance(future.exception(5), YourlsOperationError)
+        with pytest.raises(YourlsOperationError):
+            future.result()
+
+    def test_stats_nonextant_url(self, monkeypatch):
+        monkeypatch.setattr(self.testclient.client, '_send_request', mock_request_404)
+        with pytest.raises(YourlsOperationError):
+            self.testclient.get_url_stats('blahdontexist').result(5)
+
+    def test_in_flight_bounded(self, monkeypatch):
+        lock = threading.Lock()
+        state = {'current' : 0, 'peak' : 0}
+
+        def slow_request(args):
+            with lock:
+                state['current'] += 1
+                state['peak'] = max(state['peak'], state['current'])
+            time.sleep(0.01)
+            with lock:
+                state['current'] -= 1
+            return mock_request(args)
+
+        monkeypatch.setattr(self.testclient.client, '_send_request', slow_request)
+        futures = [self.testclient.expand(1) for i in range(10)]
+        for future in futures:
+            future.result(5)
+
+        assert state['peak'] <= 2
+
+    def test_done_callback(self, monkeypatch):
+        monkeypatch.setattr(self.testclient.client, '_send_request', mock_request)
+        done = threading.Event()
+        future = self.testclient.expand(2)
+        future.add_done_callback(lambda f: done.set())
+
+        assert done.wait(5)
+        assert future.result() == test_url2
+
+    def test_client_options_passed_on(self):
+        retry = RetryPolicy(retries=2)
+        breaker = CircuitBreaker()
+        testclient = yourls.async_client.AsyncYourlsClient(test_apiurl,
+                test_user, test_pass, timeout=3, deadline=5, retry=retry,
+                breaker=breaker)
+
+        assert testclient.client.pool.timeout == 3
+        assert testclient.client.deadline == 5
+        assert testclient.client.retry is retry
+        assert testclient.client.breaker is breaker
+        testclient.close()
+
+    def test_call_timeout(self):
+        with FakeYourlsServer(latency=0.5) as server:
+            keyword = server.add(test_url1)
+            testclient = yourls.async_client.AsyncYourlsClient(server.apiurl,
+                    token='unused', timeout=5)
+            started = time.time()
+
+            error = testclient.expand(keyword, timeout=0.1).exception(5)
+            assert isinstance(error, YourlsOperationError)
+            assert time.time() - started < 0.4
+            testclient.close()
+
+    def test_deadline_counts_time_queued(self, monkeypatch):
+        release = threading.Event()
+        def slow_request(args):
+            release.wait(5)
+            return mock_request(args)
+        monkeypatch.setattr(self.testclient.client, '_send_request', slow_request)
+        busy = [self.testclient.expand(1) for i in range(2)]
+        late = self.testclient.expand(2, deadline=0.05)
+        time.sleep(0.1)
+        release.set()
+
+        assert isinstance(late.exception(5), YourlsOperationError)
+        assert [f.result(5) for f in busy] == [test_url1] * 2
+
+    def test_failing_callback_keeps_worker(self):
+        executor = Executor(1)
+        release = threading.Event()
+        first = executor.submit(release.wait, 5)
+        first.add_done_callback(lambda f: 1 / 0)
+        release.set()
+
+        assert executor.submit(lambda: 'ok').result(5) == 'ok'
+        executor.shutdown()
+
+    def test_submit_after_close(self):
+        self.testclient.close()
+        with pytest.raises(YourlsError):
+            self.testclient.expand(1)
@@ -0,0 +1,131 @@
+# test_balancer.py
+#  - tests for the load balancing python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import time
+import urlparse
+import urllib2
+
+import pytest
+from yourls import YourlsError, YourlsOperationError
+from yourls.balancer import MultiEndpointClient, POWER_OF_TWO
+from testing.test_yourlsClient import (test_user, test_pass, test_url1,
+        mock_request)
+
+test_apiurls = ['http://yourls%d.localhost/yourls-api.php' % i for i in range(3)]
+
+class FakePool(object):
+    """Stands in for an endpoint's ConnectionPool"""
+
+    def __init__(self, down=False, status=None):
+        self.down = down
+        self.status = status
+        self.count = 0
+
+    def urlopen(self, body, headers=None):
+        self.count += 1
+        if self.down:
+            raise urllib2.URLError('connection refused')
+        if self.status is not None:
+            raise urllib2.HTTPError(test_apiurls[0], self.status, 'Refused',
+                                    {}, None)
+        args = dict(urlparse.parse_qsl(body))
+        if args['action'] == 'version':
+            return '{"version": "1.5"}'
+        if 'shorturl' in args:
+            args['shorturl'] = int(args['shorturl'])
+        return mock_request(args)
+
+def make_client(pools, **kwargs):
+    testclient = MultiEndpointClient(test_apiurls[:len(pools)], test_user,
+                                     test_pass, **kwargs)
+    for endpoint, pool in zip(testclient.endpoints, pools):
+        endpoint.pool = pool
+    return testclient
+
+class TestMultiEndpointClient():
+
+    def test_reads_spread_across_endpoints(self):
+        pools = [FakePool(), FakePool(), FakePool()]
+        testclient = make_client(pools, read_policy=POWER_OF_TWO)
+        for i in range(30):
+            assert testclient.expand(1) == test_url1
+
+        assert sum(p.count for p in pools) == 30
+
+    def test_writes_use_first_endpoint(self):
+        pools = [FakePool(), FakePool()]
+        testclient = make_client(pools)
+        for i in range(5):
+            testclient.shorten(test_url1)
+
+        assert [p.count for p in pools] == [5, 0]
+
+    def test_read_fails_over(self):
+        pools = [FakePool(down=True), FakePool()]
+        testclient = make_client(pools, read_policy='failover')
+
+        assert testclient.expand(1) == test_url1
+        assert [p.count for p in pools] == [1, 1]
+
+    def test_write_not_resent(self):
+        pools = [FakePool(down=True), FakePool()]
+        testclient = make_client(pools)
+
+        with pytest.raises(YourlsOperationError):
+            testclient.shorten(test_url1)
+        assert pools[1].count == 0
+
+    def test_eject_and_readmit(self, monkeypatch):
+        pools = [FakePool(down=True), FakePool()]
+        testclient = make_client(pools, read_policy='failover', eject_after=2,
+                                 readmit_after=60)
+        for i in range(4):
+            testclient.expand(1)
+
+        assert pools[0].count == 2
+        assert not testclient.endpoints[0].healthy
+
+        pools[0].down = False
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 61)
+        testclient.expand(1)
+
+        assert pools[0].count == 3
+        assert testclient.endpoints[0].healthy
+
+    def test_check_health(self):
+        pools = [FakePool(down=True), FakePool()]
+        testclient = make_client(pools)
+
+        assert testclient.check_health() == [test_apiurls[1]]
+        assert [e['healthy'] for e in testclient.endpoint_stats()] == [False, True]
+
+    def test_check_health_client_error(self):
+        pools = [FakePool(status=403), FakePool(status=503)]
+        testclient = make_client(pools)
+
+        assert testclient.check_health() == [test_apiurls[0]]
+
+    def test_unknown_policy(self):
+        with pytest.raises(YourlsError):
+            MultiEndpointClient(test_apiurls, test_user, test_pass,
+                                read_policy='random')
@@ -0,0 +1,79 @@
+# test_batch.py
+#  - tests for the batch action
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import pytest
+import yourls.client
+from yourls import YourlsError, YourlsOperationError
+from yourls.fakeserver import FakeYourlsServer
+from yourls.writebehind import ShortenQueue
+
+SIGNATURE = 'secret'
+
+def run_batch(testclient, server):
+    known = server.add('http://example.com/known', clicks=2)
+    operations = [('shorturl', 'http://example.com/%d' % i) for i in range(12)]
+    operations += [('shorturl', 'http://example.com/custom', 'custom'),
+                   ('expand', known), ('url-stats', known),
+                   ('expand', 'missing')]
+    return testclient.batch(operations)
+
+class TestBatch():
+
+    def test_batch_action(self):
+        with FakeYourlsServer(signature=SIGNATURE, max_batch=10) as server:
+            testclient = yourls.client.YourlsClient(server.apiurl, token=SIGNATURE)
+            results = run_batch(testclient, server)
+
+            assert testclient.supports_batch()
+            # the probe and two batches
+            assert server.requests == 3
+            assert results[0] == server.baseurl + '2'
+            assert results[12] == server.baseurl + 'custom'
+            assert results[13] == 'http://example.com/known'
+            assert results[14].clicks == 2
+            assert isinstance(results[15], YourlsOperationError)
+
+    def test_fallback_to_single_calls(self):
+        with FakeYourlsServer(signature=SIGNATURE) as server:
+            testclient = yourls.client.YourlsClient(server.apiurl, token=SIGNATURE)
+            results = run_batch(testclient, server)
+
+            assert not testclient.supports_batch()
+            assert server.requests == 17
+            assert results[12] == server.baseurl + 'custom'
+            assert results[14].clicks == 2
+            assert isinstance(results[15], YourlsOperationError)
+
+    def test_unsupported_operation(self):
+        testclient = yourls.client.YourlsClient('http://localhost/', token=SIGNATURE)
+        with pytest.raises(YourlsError):
+            testclient.batch([('db-stats',)])
+
+    def test_shorten_queue_batches(self):
+        with FakeYourlsServer(signature=SIGNATURE, max_batch=50) as server:
+            testclient = yourls.client.YourlsClient(server.apiurl, token=SIGNATURE)
+            queue = ShortenQueue(testclient, max_batch=50, max_delay=10)
+            futures = [queue.submit('http://example.com/%d' % i) for i in range(50)]
+            queue.close()
+
+            assert len(set(f.result() for f in futures)) == 50
+            assert server.requests == 2
@@ -0,0 +1,86 @@
+# test_bloom.py
+#  - tests for the keyword Bloom filter
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import pytest
+import yourls.client
+from yourls import YourlsOperationError
+from yourls.bloom import BloomFilter, KeywordFilter
+from yourls.fakeserver import FakeYourlsServer
+
+class TestBloomFilter():
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add('key%d' % i)
+
+        assert all('key%d' % i in bloom for i in range(1000))
+        assert len(bloom) == 1000
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add('key%d' % i)
+
+        false_positives = sum('other%d' % i in bloom for i in range(10000))
+        assert false_positives < 300
+        assert 0.005 < bloom.false_positive_rate() < 0.02
+
+class TestKeywordFilter():
+
+    def setup_method(self, method):
+        self.server = FakeYourlsServer().start()
+        for i in range(20):
+            self.server.add('http://example.com/%d' % i)
+        self.testclient = yourls.client.YourlsClient(self.server.apiurl,
+                                                     token='unused')
+        self.keywords = KeywordFilter(self.testclient)
+        self.keywords.refresh()
+        self.testclient.keyword_filter = self.keywords
+
+    def teardown_method(self, method):
+        self.server.stop()
+
+    def test_unknown_keyword_fails_locally(self):
+        requests = self.server.requests
+        with pytest.raises(YourlsOperationError):
+            self.testclient.expand('doesnotexist')
+
+        assert self.server.requests == requests
+        assert self.keywords.stats()['misses'] == 1
+
+    def test_known_keyword_expands(self):
+        assert self.testclient.expand('1') == 'http://example.com/0'
+        assert self.keywords.stats()['hits'] == 1
+        assert self.keywords.stats()['keywords'] == 20
+
+    def test_new_keywords_added(self):
+        shorturl = self.testclient.shorten('http://example.com/new', custom='new')
+
+        assert self.testclient.expand(shorturl) == 'http://example.com/new'
+
+    def test_refresh_from_links(self):
+        self.keywords.refresh([('abc', 'http://abc.com/')])
+
+        assert self.keywords.might_exist('http://sho.rt/abc')
+        assert not self.keywords.might_exist('1')
+        assert self.keywords.stats()['refreshes'] == 2
@@ -0,0 +1,133 @@
+# test_cache.py
+#  - tests for the python yourls client result caches
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import time
+
+import yourls.client
+from yourls.cache import LRUCache, SQLiteCache, DbmCache
+from testing.test_yourlsClient import (test_apiurl, test_user, test_pass,
+        test_baseurl, test_url1, mock_request)
+
+class CountingRequest(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, args):
+        self.count += 1
+        return mock_request(args)
+
+class TestLRUCache():
+
+    def test_hit_and_miss(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.stats() == {'hits' : 1, 'misses' : 1, 'evictions' : 0,
+                                 'size' : 1}
+
+    def test_lru_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert cache.evictions == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        cache = LRUCache(ttl=10)
+        cache.set('a', 1)
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 11)
+
+        assert cache.get('a') is None
+        assert cache.misses == 1
+
+class TestClientCache():
+
+    def setup_method(self, method):
+        self.cache = LRUCache()
+        self.testclient = yourls.client.YourlsClient(test_apiurl, test_user,
+                test_pass, cache=self.cache)
+        self.request = CountingRequest()
+
+    def test_expand_cached(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', self.request)
+
+        assert self.testclient.expand(1) == test_url1
+        assert self.testclient.expand(1) == test_url1
+        assert self.request.count == 1
+
+    def test_shorten_fills_expand(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', self.request)
+
+        shorturl = self.testclient.shorten(test_url1)
+        assert self.testclient.shorten(test_url1) == test_baseurl + '1'
+        assert self.testclient.expand(shorturl) == test_url1
+        assert self.request.count == 1
+
+class TestPersistentCache():
+
+    def check_persists(self, make_cache, monkeypatch):
+        cache = make_cache()
+        testclient = yourls.client.YourlsClient(test_apiurl, test_user,
+                test_pass, cache=cache)
+        monkeypatch.setattr(testclient, '_send_request', mock_request)
+        shorturl = testclient.shorten(test_url1)
+        cache.close()
+
+        cache = make_cache()
+        testclient = yourls.client.YourlsClient(test_apiurl, test_user,
+                test_pass, cache=cache)
+        request = CountingRequest()
+        monkeypatch.setattr(testclient, '_send_request', request)
+
+        assert testclient.shorten(test_url1) == shorturl
+        assert testclient.expand(shorturl) == test_url1
+        assert request.count == 0
+        assert cache.stats() == {'hits' : 2, 'misses' : 0}
+        cache.close()
+
+    def test_sqlite_persists(self, tmpdir, monkeypatch):
+        path = str(tmpdir.join('cache.sqlite'))
+        self.check_persists(lambda: SQLiteCache(path), monkeypatch)
+
+    def test_dbm_persists(self, tmpdir, monkeypatch):
+        path = str(tmpdir.join('cache.dbm'))
+        self.check_persists(lambda: DbmCache(path), monkeypatch)
+
+    def test_sqlite_batched_writes(self, tmpdir):
+        cache = SQLiteCache(str(tmpdir.join('cache.sqlite')), batch_size=3)
+        cache.set(('expand', 'a'), 'http://a/')
+        cache.set(('expand', 'b'), 'http://b/')
+
+        assert cache._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0] == 0
+        assert cache.get(('expand', 'a')) == 'http://a/'
+
+        cache.set(('expand', 'c'), 'http://c/')
+        assert cache._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0] == 3
+        cache.close()
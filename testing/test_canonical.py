@@ -0,0 +1,117 @@
+# test_canonical.py
+#  - tests for long URL canonicalization and deduplication
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import threading
+
+import yourls.client
+from yourls.cache import LRUCache
+from yourls.canonical import Canonicalizer
+from yourls.fakeserver import FakeYourlsServer
+
+VARIANTS = ['http://example.com/?a=1&b=2',
+            'HTTP://Example.COM:80/?b=2&a=1',
+            'http://example.com?a=1&utm_source=mail&b=2&utm_medium=x']
+
+class TestCanonicalizer():
+
+    def setup_method(self, method):
+        self.canonical = Canonicalizer()
+
+    def test_variants_collapse(self):
+        assert set(self.canonical(url) for url in VARIANTS) == \
+            set(['http://example.com/?a=1&b=2'])
+
+    def test_keeps_meaningful_parts(self):
+        url = 'https://user@example.com:8443/Path/?q=%20x&q=a#Top'
+        assert self.canonical(url) == url
+
+    def test_drop_params_patterns(self):
+        canonical = Canonicalizer(drop_params=('utm_*', 'fbclid'), sort_query=False)
+
+        assert canonical('http://a.com/x?z=1&FBCLID=2&utm_campaign=3&a=4') == \
+            'http://a.com/x?z=1&a=4'
+
+    def test_options_off(self):
+        canonical = Canonicalizer(drop_params=(), sort_query=False,
+                                  normalize_host=False, drop_fragment=True)
+
+        assert canonical('http://A.com:80?b=1&a=2#x') == 'http://A.com:80?b=1&a=2'
+
+    def test_other_urls_untouched(self):
+        assert self.canonical('mailto:someone@example.com') == \
+            'mailto:someone@example.com'
+
+class TestDeduplication():
+
+    def setup_method(self, method):
+        self.server = FakeYourlsServer(max_batch=100).start()
+        self.testclient = yourls.client.YourlsClient(self.server.apiurl,
+                            token='unused', canonicalizer=Canonicalizer())
+
+    def teardown_method(self, method):
+        self.server.stop()
+
+    def test_shorten_canonical(self):
+        shorturl = self.testclient.shorten(VARIANTS[1])
+
+        assert self.testclient.expand(shorturl) == VARIANTS[0]
+
+    def test_shorten_many(self):
+        results = list(self.testclient.shorten_many(VARIANTS * 3, workers=4))
+
+        assert len(set(result for item, result in results)) == 1
+        assert self.server.requests + self.testclient.deduplicated == 9
+
+    def test_shorten_many_with_cache(self):
+        testclient = yourls.client.YourlsClient(self.server.apiurl, token='unused',
+                        canonicalizer=Canonicalizer(), cache=LRUCache(100))
+        results = list(testclient.shorten_many(VARIANTS * 3, workers=4))
+
+        assert len(set(result for item, result in results)) == 1
+        assert self.server.requests == 1
+
+    def test_shorten_many_keeps_distinct_keywords(self):
+        items = [(VARIANTS[0], 'one'), (VARIANTS[1], 'two'), VARIANTS[2]]
+        list(self.testclient.shorten_many(items))
+
+        assert self.server.requests == 3
+        assert self.testclient.deduplicated == 0
+
+    def test_batch(self):
+        results = self.testclient.batch([('shorturl', url) for url in VARIANTS] +
+                                        [('shorturl', 'http://other.com/')])
+
+        assert results[0] == results[1] == results[2] != results[3]
+        # the probe and one batch of two operations
+        assert self.server.requests == 2
+        assert self.testclient.deduplicated == 2
+
+    def test_batch_counter_threadsafe(self):
+        operations = [('shorturl', url) for url in VARIANTS]
+        threads = [threading.Thread(target=self.testclient.batch, args=(operations,))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert self.testclient.deduplicated == 16
@@ -0,0 +1,101 @@
+# test_cli.py
+#  - tests for the yourls command line tool
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import csv
+import json
+
+import pytest
+from yourls import YourlsError
+from yourls.cli import main, Checkpoint
+from yourls.fakeserver import FakeYourlsServer
+
+SIGNATURE = 'secret'
+
+class TestCli():
+
+    def setup_method(self, method):
+        self.server = FakeYourlsServer(signature=SIGNATURE).start()
+
+    def teardown_method(self, method):
+        self.server.stop()
+
+    def run(self, command, infile, outfile, *extra):
+        return main(['--apiurl', self.server.apiurl, '--token', SIGNATURE,
+                     command, str(infile), '-o', str(outfile),
+                     '--chunk-size', '3'] + list(extra))
+
+    def test_bulk_shorten_csv(self, tmpdir):
+        infile = tmpdir.join('links.csv')
+        infile.write('id,url\n' + ''.join('%d,http://example.com/%d\n' % (i, i)
+                                          for i in range(10)))
+        outfile = tmpdir.join('short.csv')
+
+        assert self.run('bulk-shorten', infile, outfile) == 0
+
+        rows = list(csv.DictReader(outfile.open()))
+        assert [row['id'] for row in rows] == [str(i) for i in range(10)]
+        for row in rows:
+            assert row['shorturl'].startswith(self.server.baseurl)
+            assert row['error'] == ''
+        assert not tmpdir.join('short.csv.checkpoint').check()
+
+    def test_bulk_expand_jsonl_processes(self, tmpdir):
+        keywords = [self.server.add('http://example.com/%d' % i) for i in range(10)]
+        infile = tmpdir.join('links.jsonl')
+        infile.write(''.join(json.dumps({'shorturl' : k}) + '\n' for k in keywords)
+                     + '{"shorturl": "missing"}\n')
+        outfile = tmpdir.join('long.jsonl')
+
+        assert self.run('bulk-expand', infile, outfile, '--processes', '2') == 1
+
+        rows = [json.loads(line) for line in outfile.open()]
+        assert [row['longurl'] for row in rows[:10]] == ['http://example.com/%d' % i
+                                                        for i in range(10)]
+        assert rows[10]['error']
+
+    def test_resume_from_checkpoint(self, tmpdir):
+        infile = tmpdir.join('links.jsonl')
+        infile.write(''.join(json.dumps({'url' : 'http://example.com/%d' % i}) + '\n'
+                             for i in range(9)))
+        outfile = tmpdir.join('short.jsonl')
+        done = ''.join(json.dumps({'url' : 'http://example.com/%d' % i,
+                                   'shorturl' : 'done', 'error' : ''}) + '\n'
+                       for i in range(3))
+        # a partial row written after the checkpoint was saved
+        outfile.write(done + '{"url": "http://exa')
+        Checkpoint(str(outfile) + '.checkpoint', 'bulk-shorten',
+                   str(infile)).save(3, len(done))
+
+        assert self.run('bulk-shorten', infile, outfile) == 0
+
+        rows = [json.loads(line) for line in outfile.open()]
+        assert len(rows) == 9
+        assert [row['shorturl'] for row in rows[:3]] == ['done'] * 3
+        assert self.server.requests == 6
+
+    def test_checkpoint_for_other_run(self, tmpdir):
+        checkpoint = Checkpoint(str(tmpdir.join('out.checkpoint')), 'bulk-expand',
+                                '/some/input.csv')
+        checkpoint.save(3, 10)
+
+        with pytest.raises(YourlsError):
+            Checkpoint(checkpoint.path, 'bulk-shorten', '/some/input.csv').load()
@@ -0,0 +1,56 @@
+# test_decoders.py
+#  - tests for JSON decoder selection
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import json
+
+import pytest
+import yourls.client
+from yourls import YourlsError
+from yourls.decoders import get_decoder, available_decoders
+from testing.test_yourlsClient import (test_apiurl, test_user, test_pass,
+        test_url1, mock_request)
+
+class TestDecoders():
+
+    def test_stdlib_always_available(self):
+        assert 'json' in available_decoders()
+        assert get_decoder('json') is json.loads
+
+    def test_fastest_installed(self):
+        assert get_decoder() is get_decoder(available_decoders()[0])
+
+    def test_unknown_decoder(self):
+        with pytest.raises(YourlsError):
+            get_decoder('yaml')
+
+    def test_client_custom_decoder(self, monkeypatch):
+        decoded = []
+        def decoder(data):
+            decoded.append(data)
+            return json.loads(data)
+
+        testclient = yourls.client.YourlsClient(test_apiurl, test_user,
+                test_pass, decoder=decoder)
+        monkeypatch.setattr(testclient, '_send_request', mock_request)
+
+        assert testclient.expand(1) == test_url1
+        assert len(decoded) == 1
@@ -0,0 +1,101 @@
+# test_fakeserver.py
+#  - tests running the python yourls client against the fake YOURLS api
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import pytest
+import yourls.client
+from yourls import YourlsOperationError
+from yourls.fakeserver import FakeYourlsServer
+from testing.test_yourlsClient import test_user, test_pass, test_url1, test_url2
+
+class TestFakeYourlsServer():
+
+    def setup_method(self, method):
+        self.server = FakeYourlsServer(test_user, test_pass, seed=0).start()
+        self.testclient = yourls.client.YourlsClient(self.server.apiurl,
+                test_user, test_pass)
+
+    def teardown_method(self, method):
+        self.testclient.close()
+        self.server.stop()
+
+    def test_shorten_and_expand(self):
+        shorturl = self.testclient.shorten(test_url1)
+
+        assert shorturl == self.server.baseurl + '1'
+        assert self.testclient.expand(shorturl) == test_url1
+        assert self.testclient.expand('1') == test_url1
+
+    def test_shorten_existing_url(self):
+        first = self.testclient.shorten(test_url1)
+
+        assert self.testclient.shorten(test_url1) == first
+
+    def test_shorten_used_keyword(self):
+        self.testclient.shorten(test_url1, custom='taken')
+        with pytest.raises(YourlsOperationError):
+            self.testclient.shorten(test_url2, custom='taken')
+
+    def test_expand_nonexistant_url(self):
+        with pytest.raises(YourlsOperationError):
+            self.testclient.expand('blahdontexist')
+
+    def test_url_stats(self):
+        keyword = self.server.add(test_url1, clicks=3)
+
+        stats = self.testclient.get_url_stats(keyword)
+        assert stats.url == test_url1
+        assert stats.clicks == 3
+        assert stats['clicks'] == 3
+        assert stats.timestamp.year >= 2011
+
+    def test_invalid_login(self):
+        testclient = yourls.client.YourlsClient(self.server.apiurl, test_user,
+                                                'wrong')
+        with pytest.raises(YourlsOperationError):
+            testclient.shorten(test_url1)
+
+    def test_error_injection(self):
+        self.server.error_rate = 1
+        with pytest.raises(YourlsOperationError):
+            self.testclient.expand('1')
+
+    def test_compressed_responses(self):
+        self.server.compress = True
+        for i in range(50):
+            self.server.add('%s?page=%d' % (test_url1, i), title='Page %d' % i)
+        events = []
+        self.testclient.add_hook(events.append)
+
+        links = list(self.testclient.stats(limit=50))
+        assert len(links) == 50
+        assert events[0].bytes_on_wire < events[0].bytes_received
+        assert self.testclient.pool.bytes_on_wire < self.testclient.pool.bytes_decoded
+
+    def test_compression_opt_out(self):
+        self.server.compress = True
+        testclient = yourls.client.YourlsClient(self.server.apiurl, test_user,
+                                                test_pass, compress=False)
+        self.server.add(test_url1, keyword='plain')
+
+        assert testclient.expand('plain') == test_url1
+        assert testclient.pool.bytes_on_wire == testclient.pool.bytes_decoded
+        testclient.close()
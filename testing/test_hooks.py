@@ -0,0 +1,117 @@
+# test_hooks.py
+#  - tests for the instrumentation hooks
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import pytest
+import yourls.client
+from yourls import YourlsOperationError
+from yourls.fakeserver import FakeYourlsServer
+from yourls.hooks import MetricsCollector, Histogram
+from yourls.resilience import RetryPolicy
+from testing.test_resilience import FlakyRequest
+from testing.test_yourlsClient import (test_user, test_pass, test_url1,
+        mock_request_404)
+
+class TestHooks():
+
+    def setup_method(self, method):
+        self.events = []
+        self.server = FakeYourlsServer(test_user, test_pass).start()
+        self.testclient = yourls.client.YourlsClient(self.server.apiurl,
+                test_user, test_pass, hooks=[self.events.append])
+
+    def teardown_method(self, method):
+        self.testclient.close()
+        self.server.stop()
+
+    def test_event_per_call(self):
+        self.testclient.shorten(test_url1)
+
+        assert len(self.events) == 1
+        event = self.events[0]
+        assert event.action == 'shorturl'
+        assert event.endpoint == self.server.apiurl
+        assert event.outcome == 'success'
+        assert event.bytes_sent > len(test_url1)
+        assert event.bytes_received > 0
+        assert event.total_time >= event.network_time > 0
+        assert event.encode_time > 0
+        assert event.retries == 0
+
+    def test_failure_outcome(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', mock_request_404)
+        with pytest.raises(YourlsOperationError):
+            self.testclient.expand('nope')
+
+        assert self.events[0].outcome == 'fail'
+        assert self.events[0].error == 'Error: short URL not found'
+
+    def test_retries_counted(self, monkeypatch):
+        self.testclient.retry = RetryPolicy(retries=2, backoff=0)
+        monkeypatch.setattr(self.testclient, '_send_request', FlakyRequest(2))
+        self.testclient.expand(1)
+
+        assert self.events[0].retries == 2
+        assert self.events[0].outcome == 'success'
+
+    def test_transport_error_outcome(self):
+        self.server.error_rate = 1
+        with pytest.raises(YourlsOperationError):
+            self.testclient.expand('1')
+
+        assert self.events[0].outcome == 'error'
+
+    def test_broken_hook_ignored(self):
+        def broken(event):
+            raise ValueError('broken hook')
+        self.testclient.add_hook(broken)
+
+        assert self.testclient.shorten(test_url1)
+        assert len(self.events) == 1
+
+class TestMetricsCollector():
+
+    def test_collect_and_export(self):
+        metrics = MetricsCollector()
+        with FakeYourlsServer(test_user, test_pass) as server:
+            testclient = yourls.client.YourlsClient(server.apiurl, test_user,
+                                                    test_pass, hooks=[metrics])
+            shorturl = testclient.shorten(test_url1)
+            testclient.expand(shorturl)
+            testclient.expand(shorturl)
+
+        assert metrics.requests == {('shorturl', 'success') : 1,
+                                    ('expand', 'success') : 2}
+        assert metrics.histogram('expand').count == 2
+
+        text = metrics.prometheus_text()
+        assert 'yourls_requests_total{action="expand",outcome="success"} 2' in text
+        assert ('yourls_request_duration_seconds_count{action="expand",'
+                'phase="total"} 2') in text
+
+    def test_histogram_quantile(self):
+        histogram = Histogram(buckets=(1, 2, 3))
+        for value in (0.5, 1.5, 1.5, 2.5):
+            histogram.observe(value)
+
+        assert histogram.quantile(0.5) == 2
+        assert histogram.quantile(1.0) == 3
+        assert histogram.sum == 6
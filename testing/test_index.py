@@ -0,0 +1,96 @@
+# test_index.py
+#  - tests for the offline expansion index
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import pytest
+import yourls.client
+from yourls import YourlsError
+from yourls.fakeserver import FakeYourlsServer
+from yourls.index import ExpansionIndex, read_export
+from yourls.models import Link
+from testing.test_yourlsClient import test_apiurl, test_user, test_pass
+
+def unreachable(args):
+    raise AssertionError('expand went to the api')
+
+class TestExpansionIndex():
+
+    def test_build_and_get(self, tmpdir):
+        path = str(tmpdir.join('links.idx'))
+        index = ExpansionIndex.build(path, [('b', 'http://b.com/'),
+                                            ('a', 'http://a.com/'),
+                                            ('c', u'http://c.com/\xe9')])
+
+        assert len(index) == 3
+        assert index.get('a') == 'http://a.com/'
+        assert index.get('http://sho.rt/c') == u'http://c.com/\xe9'
+        assert index.get('d') is None
+        assert index.stats() == {'links' : 3, 'hits' : 2, 'misses' : 1}
+        assert ExpansionIndex(path).get('b') == 'http://b.com/'
+
+    def test_build_from_links_and_export(self, tmpdir):
+        export = tmpdir.join('yourls_url.tsv')
+        export.write('keyword\turl\ttitle\nold\thttp://old.com/\tOld\n')
+        links = [Link('http://sho.rt/new', 'http://new.com/', '', None, '', 0)]
+
+        index = ExpansionIndex.build(str(tmpdir.join('links.idx')),
+                                     list(read_export(str(export))) + links)
+        assert index.get('old') == 'http://old.com/'
+        assert index.get('new') == 'http://new.com/'
+
+    def test_update_merges(self, tmpdir):
+        index = ExpansionIndex.build(str(tmpdir.join('links.idx')),
+                                     [(str(i), 'http://%d.com/' % i) for i in range(0, 10, 2)])
+        assert index.update([('3', 'http://3.com/'), ('4', 'http://four.com/')]) == 2
+
+        assert [keyword for keyword, url in index] == ['0', '2', '3', '4', '6', '8']
+        assert index.get('4') == 'http://four.com/'
+
+    def test_not_an_index(self, tmpdir):
+        path = tmpdir.join('links.idx')
+        path.write('')
+        with pytest.raises(YourlsError):
+            ExpansionIndex(str(path))
+
+    def test_client_expands_from_index(self, tmpdir, monkeypatch):
+        index = ExpansionIndex.build(str(tmpdir.join('links.idx')),
+                                     [('1', 'http://example.com/')])
+        testclient = yourls.client.YourlsClient(test_apiurl, test_user,
+                test_pass, index=index)
+        monkeypatch.setattr(testclient, '_send_request', unreachable)
+
+        assert testclient.expand(1) == 'http://example.com/'
+
+    def test_refresh(self, tmpdir):
+        with FakeYourlsServer() as server:
+            for i in range(5):
+                server.add('http://example.com/%d' % i)
+            testclient = yourls.client.YourlsClient(server.apiurl, token='unused')
+            index = ExpansionIndex.build(str(tmpdir.join('links.idx')),
+                                         testclient.stats('last'))
+            for i in range(5, 8):
+                server.add('http://example.com/%d' % i)
+            requests = server.requests
+
+            assert index.refresh(testclient, chunk_size=2) == 3
+            assert server.requests - requests == 2
+            assert len(index) == 8
+            assert index.get(server.baseurl + '8') == 'http://example.com/7'
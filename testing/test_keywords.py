@@ -0,0 +1,116 @@
+# test_keywords.py
+#  - tests for the custom keyword allocator
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import pytest
+import yourls.client
+from yourls import YourlsError, YourlsOperationError
+from yourls.fakeserver import FakeYourlsServer
+from yourls.keywords import KeywordAllocator
+
+class TestKeywordAllocator():
+
+    def setup_method(self, method):
+        self.server = FakeYourlsServer(max_batch=100).start()
+        self.testclient = yourls.client.YourlsClient(self.server.apiurl,
+                                                     token='unused')
+
+    def teardown_method(self, method):
+        self.server.stop()
+
+    def test_skips_taken_keywords(self):
+        for keyword in ('aa', 'ab', 'ba'):
+            self.server.add('http://example.com/' + keyword, keyword=keyword)
+        keywords = KeywordAllocator(self.testclient, length=2, alphabet='ab',
+                                    pool_size=4, low_water=0, seed=1)
+
+        assert keywords.refill() == 1
+        assert keywords.get() == 'bb'
+        assert keywords.stats()['taken'] == 3
+
+    def test_get_without_network(self):
+        keywords = KeywordAllocator(self.testclient, pool_size=20, low_water=0,
+                                    seed=1)
+        keywords.refill()
+        requests = self.server.requests
+        got = [keywords.get() for i in range(20)]
+
+        assert self.server.requests == requests
+        assert len(set(got)) == 20
+        assert keywords.stats()['pooled'] == 0
+
+    def test_shorten(self):
+        keywords = KeywordAllocator(self.testclient, pool_size=10, seed=1)
+        shorturl = keywords.shorten('http://example.com/')
+
+        assert self.testclient.expand(shorturl) == 'http://example.com/'
+        assert keywords.stats()['allocated'] == 1
+
+    def test_recovers_from_collision(self):
+        keywords = KeywordAllocator(self.testclient, pool_size=10, low_water=0,
+                                    seed=1)
+        keywords.refill()
+        # someone else takes the next pooled keyword after the check
+        stolen = keywords._pool[0]
+        self.server.add('http://elsewhere.com/', keyword=stolen)
+        shorturl = keywords.shorten('http://example.com/')
+
+        assert not shorturl.endswith('/' + stolen)
+        assert keywords.stats()['collisions'] == 1
+
+    def test_existing_url_returns_keyword(self):
+        existing = self.server.add('http://example.com/')
+        keywords = KeywordAllocator(self.testclient, pool_size=10, low_water=0,
+                                    seed=1)
+        keywords.refill()
+
+        assert keywords.shorten('http://example.com/').endswith('/' + existing)
+        assert keywords.stats()['pooled'] == 10
+
+    def test_gives_up(self):
+        self.server.add('http://example.com/', keyword='a')
+        keywords = KeywordAllocator(self.testclient, length=1, alphabet='a',
+                                    max_rounds=2)
+
+        with pytest.raises(YourlsError):
+            keywords.get()
+
+    def test_no_attempts(self):
+        keywords = KeywordAllocator(self.testclient, max_attempts=0)
+
+        with pytest.raises(YourlsError) as error:
+            keywords.shorten('http://example.com/')
+        assert not isinstance(error.value, YourlsOperationError)
+
+    def test_without_batch_action(self):
+        self.server.max_batch = 0
+        self.server.add('http://example.com/', keyword='a')
+        keywords = KeywordAllocator(self.testclient, length=1, alphabet='ab',
+                                    pool_size=2)
+
+        assert keywords.get() == 'b'
+
+    def test_error_code(self):
+        self.server.add('http://example.com/', keyword='taken')
+
+        with pytest.raises(YourlsOperationError) as error:
+            self.testclient.shorten('http://other.com/', 'taken')
+        assert error.value.code == 'error:keyword'
@@ -0,0 +1,133 @@
+# test_pipeline.py
+#  - tests for the HTTP/1.1 pipelining transport
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import socket
+import threading
+import time
+
+import pytest
+import yourls.client
+from yourls import YourlsOperationError
+from yourls.fakeserver import FakeYourlsServer, LatencyProxy
+from yourls.pipeline import PipelinedPool
+
+RTT = 0.05
+
+def expand_all(testclient, shorturls, workers=8):
+    return [longurl for shorturl, longurl in
+            testclient.expand_many(shorturls, workers=workers)]
+
+class TestPipelinedPool():
+
+    def setup_method(self, method):
+        self.server = FakeYourlsServer().start()
+        self.proxy = LatencyProxy(self.server, rtt=RTT).start()
+        self.keywords = [self.server.add('http://example.com/%d' % i)
+                         for i in range(32)]
+        self.testclient = yourls.client.YourlsClient(self.proxy.apiurl,
+                            token='unused', pipeline=8, timeout=5)
+
+    def teardown_method(self, method):
+        self.testclient.close()
+        self.proxy.stop()
+        self.server.stop()
+
+    def test_pipelined_on_one_connection(self):
+        start = time.time()
+        urls = expand_all(self.testclient, self.keywords)
+        elapsed = time.time() - start
+
+        assert urls == ['http://example.com/%d' % i for i in range(32)]
+        assert self.testclient.pool.pipelined == 32
+        assert self.proxy.connections == 1
+        # one round trip to check the server, then 8 requests per round trip
+        assert elapsed < 16 * RTT
+
+    def test_writes_not_pipelined(self):
+        shorturl = self.testclient.shorten('http://example.com/new')
+
+        assert self.testclient.expand(shorturl) == 'http://example.com/new'
+        assert self.testclient.pool.pipelined == 1
+
+    def test_errors(self):
+        with pytest.raises(YourlsOperationError) as error:
+            self.testclient.get_url_stats('missing')
+        assert error.value.code == 404
+        assert self.testclient.expand(self.keywords[0]) == 'http://example.com/0'
+
+    def test_compressed(self):
+        self.server.compress = True
+        urls = expand_all(self.testclient, self.keywords[:8])
+
+        assert urls == ['http://example.com/%d' % i for i in range(8)]
+        assert self.testclient.pool.bytes_decoded > self.testclient.pool.bytes_on_wire
+
+    def test_broken_pipeline_falls_back(self):
+        self.server.latency = 0.1
+        results = []
+        worker = threading.Thread(target=lambda: results.extend(
+                expand_all(self.testclient, self.keywords[:8])))
+        worker.start()
+        # drop the connection while pipelined requests are waiting
+        time.sleep(0.25)
+        with self.proxy._lock:
+            for sock in self.proxy._sockets:
+                sock.shutdown(socket.SHUT_RDWR)
+        worker.join()
+
+        assert results == ['http://example.com/%d' % i for i in range(8)]
+        assert self.testclient.pool.fallbacks > 0
+        assert self.testclient.pool.pipelining
+
+    def test_timeout_covers_wait_for_room(self):
+        self.server.latency = 1.0
+        # the first request on a connection has it to itself
+        worker = threading.Thread(target=self.testclient.expand,
+                                  args=(self.keywords[0],))
+        worker.start()
+        time.sleep(0.1)
+        started = time.time()
+        with pytest.raises(YourlsOperationError):
+            self.testclient.expand(self.keywords[1], timeout=0.3)
+        elapsed = time.time() - started
+        worker.join()
+
+        assert elapsed < 0.6
+
+class TestFallback():
+
+    def test_server_closing_connections(self):
+        with FakeYourlsServer(keep_alive=False) as server:
+            keywords = [server.add('http://example.com/%d' % i) for i in range(8)]
+            testclient = yourls.client.YourlsClient(server.apiurl, token='unused',
+                                                    pipeline=8, timeout=5)
+            urls = expand_all(testclient, keywords)
+
+            assert urls == ['http://example.com/%d' % i for i in range(8)]
+            assert not testclient.pool.pipelining
+            assert testclient.pool.pipelined == 1
+            testclient.close()
+
+    def test_https_not_pipelined(self):
+        pool = PipelinedPool('https://sho.rt/yourls-api.php')
+
+        assert not pool.pipelining
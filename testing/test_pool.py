@@ -0,0 +1,162 @@
+# test_pool.py
+#  - tests for the keep-alive connection pool
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import BaseHTTPServer
+import SocketServer
+import socket
+import threading
+import time
+import urllib2
+import zlib
+
+import pytest
+from yourls import YourlsError
+from yourls.fakeserver import FakeYourlsServer
+from yourls.pool import ConnectionPool
+
+class EchoHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        status = 403 if body == 'forbidden' else 200
+        if body == 'request-line':
+            body = '%s %s' % (self.path, self.headers.get('Proxy-Authorization'))
+        self.send_response(status)
+        if body == 'raw-deflate':
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+            body = compressor.compress(body * 20) + compressor.flush()
+            self.send_header('Content-Encoding', 'deflate')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class EchoServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class TestConnectionPool():
+
+    def setup_method(self, method):
+        self.server = EchoServer(('127.0.0.1', 0), EchoHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/yourls-api.php' % self.server.server_address[1]
+
+    def teardown_method(self, method):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_connection(self):
+        pool = ConnectionPool(self.url)
+        for i in range(5):
+            assert pool.urlopen('data%d' % i) == 'data%d' % i
+
+        assert pool.connections_created == 1
+        assert pool.connections_reused == 4
+
+    def test_idle_connection_evicted(self):
+        pool = ConnectionPool(self.url, idle_timeout=0)
+        pool.urlopen('one')
+        pool.urlopen('two')
+
+        assert pool.connections_created == 2
+        assert pool.connections_reused == 0
+
+    def test_http_error_status(self):
+        pool = ConnectionPool(self.url)
+        with pytest.raises(urllib2.HTTPError):
+            pool.urlopen('forbidden')
+
+    def test_connection_refused(self):
+        self.server.shutdown()
+        self.server.server_close()
+        pool = ConnectionPool(self.url)
+        with pytest.raises(urllib2.URLError):
+            pool.urlopen('data')
+
+    def test_raw_deflate_response(self):
+        pool = ConnectionPool(self.url)
+
+        assert pool.urlopen('raw-deflate') == 'raw-deflate' * 20
+        assert pool.bytes_decoded == len('raw-deflate') * 20
+        assert pool.bytes_on_wire == pool.last_wire_bytes < pool.bytes_decoded
+
+    def test_bad_scheme(self):
+        with pytest.raises(YourlsError):
+            ConnectionPool('ftp://localhost/yourls-api.php')
+
+    def test_stale_connection_resent(self):
+        pool = ConnectionPool(self.url)
+        pool.urlopen('one')
+        # as if the server had dropped the idle connection
+        pool._idle[0][0].sock.shutdown(socket.SHUT_RDWR)
+
+        assert pool.urlopen('two') == 'two'
+        assert pool.connections_created == 2
+
+    def test_http_proxy(self):
+        proxy = 'http://user:pw@127.0.0.1:%d' % self.server.server_address[1]
+        pool = ConnectionPool('http://sho.invalid/yourls-api.php',
+                              proxies={'http' : proxy})
+
+        assert pool.urlopen('request-line') == ('http://sho.invalid/yourls-api.php '
+                                                'Basic dXNlcjpwdw==')
+
+    def test_proxy_from_environment(self, monkeypatch):
+        for name in ('no_proxy', 'NO_PROXY', 'http_proxy', 'HTTP_PROXY'):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setenv('http_proxy',
+                           'http://127.0.0.1:%d' % self.server.server_address[1])
+        pool = ConnectionPool('http://sho.invalid/yourls-api.php')
+
+        assert pool.urlopen('request-line') == ('http://sho.invalid/yourls-api.php '
+                                                'None')
+
+    def test_no_proxy(self, monkeypatch):
+        for name in ('NO_PROXY', 'HTTP_PROXY'):
+            monkeypatch.delenv(name, raising=False)
+        # nothing listens on the proxy's port
+        monkeypatch.setenv('http_proxy', 'http://127.0.0.1:1')
+        monkeypatch.setenv('no_proxy', '127.0.0.1')
+        pool = ConnectionPool(self.url)
+
+        assert pool.urlopen('request-line') == '/yourls-api.php None'
+
+class TestTimeouts():
+
+    def test_timeout_not_resent(self):
+        with FakeYourlsServer(signature='secret') as server:
+            pool = ConnectionPool(server.apiurl, timeout=0.3)
+            pool.urlopen('signature=secret&format=json&action=version')
+            server.latency = 0.5
+            with pytest.raises(urllib2.URLError):
+                pool.urlopen('signature=secret&format=json&action=shorturl'
+                             '&url=http%3A%2F%2Fexample.com%2F')
+            # a resend would have gone out when the first attempt timed out
+            time.sleep(0.4)
+
+            assert server.requests == 2
@@ -0,0 +1,146 @@
+# test_ratelimit.py
+#  - tests for client side rate limiting
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import urllib2
+
+import pytest
+import yourls.client
+import yourls.ratelimit
+from yourls import YourlsError, YourlsOperationError
+from yourls.ratelimit import TokenBucket, RateLimiter
+from testing.test_yourlsClient import (test_apiurl, test_user, test_pass,
+        test_url1, mock_request)
+
+class FakeClock(object):
+    """Replaces the time module used by the rate limiter so waits take no
+    real time"""
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        self.slept = 0
+        monkeypatch.setattr(yourls.ratelimit, 'time', self)
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+class TestTokenBucket():
+
+    def test_burst_then_rate(self, monkeypatch):
+        clock = FakeClock(monkeypatch)
+        bucket = TokenBucket(10, burst=5)
+        for i in range(5):
+            bucket.acquire()
+        assert clock.slept == 0
+
+        for i in range(10):
+            bucket.acquire()
+        assert clock.slept == pytest.approx(1.0)
+
+    def test_acquire_timeout(self, monkeypatch):
+        clock = FakeClock(monkeypatch)
+        bucket = TokenBucket(2, burst=1)
+
+        assert bucket.acquire(0.1)
+        assert not bucket.acquire(0.1)
+        assert clock.slept == 0
+        # the refused call did not take a token
+        assert bucket.acquire(0.5)
+        assert clock.slept == pytest.approx(0.5)
+
+    def test_aimd(self, monkeypatch):
+        FakeClock(monkeypatch)
+        bucket = TokenBucket(10, max_rate=20, increase=5)
+        bucket.on_failure()
+        assert bucket.rate == 5
+        assert bucket.throttled == 1
+
+        bucket.on_success(0.1)
+        assert bucket.rate == 6
+        for i in range(100):
+            bucket.on_success(0.1)
+        assert bucket.rate == 20
+
+    def test_slow_response_decreases(self, monkeypatch):
+        FakeClock(monkeypatch)
+        bucket = TokenBucket(10, slow_threshold=1)
+        bucket.on_success(2)
+
+        assert bucket.rate == 5
+
+    def test_min_rate(self, monkeypatch):
+        FakeClock(monkeypatch)
+        bucket = TokenBucket(10, min_rate=4)
+        bucket.on_failure()
+        bucket.on_failure()
+
+        assert bucket.rate == 4
+
+    def test_invalid_rate(self):
+        with pytest.raises(YourlsError):
+            TokenBucket(0)
+
+class TestClientRateLimit():
+
+    def test_per_action_limits(self, monkeypatch):
+        clock = FakeClock(monkeypatch)
+        limiter = RateLimiter({'shorturl' : 2}, burst=1)
+        testclient = yourls.client.YourlsClient(test_apiurl, test_user,
+                test_pass, rate_limiter=limiter)
+        monkeypatch.setattr(testclient, '_send_request', mock_request)
+
+        for i in range(5):
+            testclient.expand(1)
+        assert clock.slept == 0
+
+        for i in range(5):
+            testclient.shorten(test_url1)
+        assert clock.slept == pytest.approx(2.0)
+
+    def test_deadline_caps_wait(self, monkeypatch):
+        clock = FakeClock(monkeypatch)
+        limiter = RateLimiter({'expand' : 1}, burst=1)
+        testclient = yourls.client.YourlsClient(test_apiurl, test_user,
+                test_pass, rate_limiter=limiter)
+        monkeypatch.setattr(testclient, '_send_request', mock_request)
+
+        testclient.expand(1)
+        with pytest.raises(YourlsOperationError):
+            testclient.expand(1, deadline=0.5)
+        assert clock.slept == 0
+
+    def test_throttle_feedback(self, monkeypatch):
+        FakeClock(monkeypatch)
+        limiter = RateLimiter({'shorturl' : 8})
+        testclient = yourls.client.YourlsClient(test_apiurl, test_user,
+                test_pass, rate_limiter=limiter)
+
+        def throttled(args):
+            raise urllib2.HTTPError(test_apiurl, 429, 'Too Many Requests', {}, None)
+        monkeypatch.setattr(testclient, '_send_request', throttled)
+
+        with pytest.raises(YourlsOperationError):
+            testclient.shorten(test_url1)
+        assert limiter.stats() == {'shorturl' : {'rate' : 4, 'throttled' : 1}}
@@ -0,0 +1,221 @@
+# test_resilience.py
+#  - tests for retries and the circuit breaker
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import time
+import urllib2
+
+import pytest
+import yourls.client
+from yourls import YourlsOperationError
+from yourls.fakeserver import FakeYourlsServer
+from yourls.ratelimit import RateLimiter
+from yourls.resilience import RetryPolicy, CircuitBreaker
+from testing.test_yourlsClient import (test_apiurl, test_user, test_pass,
+        test_url1, mock_request)
+
+class FlakyRequest(object):
+    """Fails the first ``failures`` requests with ``error``"""
+
+    def __init__(self, failures, error=None):
+        self.failures = failures
+        self.error = error or urllib2.URLError('connection reset')
+        self.count = 0
+
+    def __call__(self, args):
+        self.count += 1
+        if self.count <= self.failures:
+            raise self.error
+        return mock_request(args)
+
+def make_client(**kwargs):
+    return yourls.client.YourlsClient(test_apiurl, test_user, test_pass, **kwargs)
+
+class TestRetry():
+
+    def test_expand_retried(self, monkeypatch):
+        testclient = make_client(retry=RetryPolicy(retries=2, backoff=0))
+        request = FlakyRequest(2)
+        monkeypatch.setattr(testclient, '_send_request', request)
+
+        assert testclient.expand(1) == test_url1
+        assert request.count == 3
+
+    def test_retries_exhausted(self, monkeypatch):
+        testclient = make_client(retry=RetryPolicy(retries=2, backoff=0))
+        request = FlakyRequest(3)
+        monkeypatch.setattr(testclient, '_send_request', request)
+
+        with pytest.raises(YourlsOperationError):
+            testclient.expand(1)
+        assert request.count == 3
+
+    def test_shorten_not_retried(self, monkeypatch):
+        testclient = make_client(retry=RetryPolicy(retries=2, backoff=0))
+        request = FlakyRequest(1)
+        monkeypatch.setattr(testclient, '_send_request', request)
+
+        with pytest.raises(YourlsOperationError):
+            testclient.shorten(test_url1)
+        assert request.count == 1
+
+    def test_client_error_not_retried(self, monkeypatch):
+        testclient = make_client(retry=RetryPolicy(retries=2, backoff=0))
+        error = urllib2.HTTPError(test_apiurl, 403, 'Forbidden', {}, None)
+        request = FlakyRequest(1, error)
+        monkeypatch.setattr(testclient, '_send_request', request)
+
+        with pytest.raises(YourlsOperationError):
+            testclient.expand(1)
+        assert request.count == 1
+
+    def test_deadline_stops_retries(self, monkeypatch):
+        testclient = make_client(retry=RetryPolicy(retries=5, backoff=10),
+                                 deadline=0.01)
+        request = FlakyRequest(5)
+        monkeypatch.setattr(testclient, '_send_request', request)
+        monkeypatch.setattr(RetryPolicy, 'delay', lambda self, attempt: 1)
+
+        with pytest.raises(YourlsOperationError):
+            testclient.expand(1)
+        assert request.count == 1
+
+    def test_backoff_bounded(self):
+        policy = RetryPolicy(backoff=1, max_backoff=4)
+        for attempt in range(10):
+            assert 0 <= policy.delay(attempt) <= min(4, 2 ** attempt)
+
+class TestCircuitBreaker():
+
+    def test_opens_and_fails_fast(self, monkeypatch):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        testclient = make_client(breaker=breaker)
+        request = FlakyRequest(10)
+        monkeypatch.setattr(testclient, '_send_request', request)
+
+        for i in range(4):
+            with pytest.raises(YourlsOperationError):
+                testclient.expand(1)
+
+        assert request.count == 2
+        assert breaker.stats() == {'state' : 'open', 'failures' : 2,
+                                   'times_opened' : 1, 'rejected' : 2}
+
+    def test_half_open_trial_closes(self, monkeypatch):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        testclient = make_client(breaker=breaker)
+        monkeypatch.setattr(testclient, '_send_request', FlakyRequest(1))
+
+        with pytest.raises(YourlsOperationError):
+            testclient.expand(1)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 61)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert testclient.expand(1) == test_url1
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_rate_limited_call_keeps_no_trial(self, monkeypatch):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        limiter = RateLimiter({'expand' : 10}, burst=1)
+        testclient = make_client(breaker=breaker, rate_limiter=limiter)
+        monkeypatch.setattr(testclient, '_send_request', FlakyRequest(1))
+
+        with pytest.raises(YourlsOperationError):
+            testclient.expand(1)
+        # the bucket is empty, so this gives up before reaching the backend
+        with pytest.raises(YourlsOperationError):
+            testclient.expand(1, deadline=0.01)
+
+        assert testclient.expand(1) == test_url1
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_unexpected_error_releases_trial(self, monkeypatch):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        testclient = make_client(breaker=breaker)
+
+        def broken(args):
+            raise ValueError('not a response')
+        monkeypatch.setattr(testclient, '_send_request', broken)
+        with pytest.raises(ValueError):
+            testclient.expand(1)
+
+        monkeypatch.setattr(testclient, '_send_request', mock_request)
+        assert testclient.expand(1) == test_url1
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_allows_one_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+
+class TestCallLimits():
+
+    def test_call_timeout(self):
+        with FakeYourlsServer(latency=0.5) as server:
+            keyword = server.add(test_url1)
+            testclient = yourls.client.YourlsClient(server.apiurl, token='unused',
+                                                    timeout=5)
+            started = time.time()
+            with pytest.raises(YourlsOperationError):
+                testclient.expand(keyword, timeout=0.1)
+            assert time.time() - started < 0.4
+
+            # later calls get the client's timeout back
+            assert testclient.expand(keyword) == test_url1
+            testclient.close()
+
+    def test_call_deadline_caps_socket_timeout(self):
+        with FakeYourlsServer(latency=0.5) as server:
+            keyword = server.add(test_url1)
+            testclient = yourls.client.YourlsClient(server.apiurl, token='unused',
+                                                    timeout=5)
+            started = time.time()
+            with pytest.raises(YourlsOperationError):
+                testclient.get_url_stats(keyword, deadline=0.2)
+            assert time.time() - started < 0.45
+            testclient.close()
+
+    def test_client_deadline_caps_socket_timeout(self):
+        with FakeYourlsServer(latency=0.5) as server:
+            testclient = yourls.client.YourlsClient(server.apiurl, token='unused',
+                                                    timeout=5, deadline=0.2)
+            started = time.time()
+            with pytest.raises(YourlsOperationError):
+                testclient.shorten(test_url1)
+            assert time.time() - started < 0.45
+            testclient.close()
+
+    def test_call_deadline_overrides_client(self, monkeypatch):
+        testclient = make_client(retry=RetryPolicy(retries=5, backoff=0),
+                                 deadline=0.01)
+        request = FlakyRequest(2)
+        monkeypatch.setattr(testclient, '_send_request', request)
+        monkeypatch.setattr(RetryPolicy, 'delay', lambda self, attempt: 0.05)
+
+        assert testclient.expand(1, deadline=5) == test_url1
+        assert request.count == 3
@@ -0,0 +1,107 @@
+# test_sharding.py
+#  - tests for the sharded client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import pytest
+from yourls import YourlsError, YourlsOperationError
+from yourls.canonical import Canonicalizer
+from yourls.fakeserver import FakeYourlsServer
+from yourls.sharding import HashRing, ShardedYourlsClient
+
+SIGNATURE = 'secret'
+
+class TestHashRing():
+
+    def test_spread(self):
+        ring = HashRing(['a', 'b', 'c'])
+        counts = {'a' : 0, 'b' : 0, 'c' : 0}
+        for i in range(3000):
+            counts[ring.get('http://example.com/%d' % i)] += 1
+
+        assert min(counts.values()) > 700
+
+    def test_minimal_remapping(self):
+        ring = HashRing(['a', 'b', 'c'])
+        keys = ['http://example.com/%d' % i for i in range(3000)]
+        before = dict((key, ring.get(key)) for key in keys)
+        ring.add('d')
+
+        moved = [key for key in keys if ring.get(key) != before[key]]
+        assert all(ring.get(key) == 'd' for key in moved)
+        assert 500 < len(moved) < 1100
+
+    def test_empty(self):
+        with pytest.raises(YourlsError):
+            HashRing().get('key')
+
+class TestShardedYourlsClient():
+
+    def setup_method(self, method):
+        self.servers = [FakeYourlsServer(signature=SIGNATURE).start()
+                        for i in range(3)]
+        self.testclient = ShardedYourlsClient([s.apiurl for s in self.servers],
+                                              token=SIGNATURE)
+
+    def teardown_method(self, method):
+        self.testclient.close()
+        for server in self.servers:
+            server.stop()
+
+    def test_shorten_and_expand(self):
+        urls = ['http://example.com/%d' % i for i in range(30)]
+        shorturls = [self.testclient.shorten(url) for url in urls]
+
+        assert [self.testclient.expand(s) for s in shorturls] == urls
+        assert all(server.requests > 0 for server in self.servers)
+        assert self.testclient.shorten(urls[0]) == shorturls[0]
+        assert self.testclient.db_stats().total_links == 30
+
+    def test_unroutable(self):
+        with pytest.raises(YourlsOperationError):
+            self.testclient.expand('abc')
+        with pytest.raises(YourlsOperationError):
+            self.testclient.expand('http://elsewhere.com/abc')
+
+    def test_bulk(self):
+        urls = ['http://example.com/%d' % i for i in range(30)]
+        shortened = list(self.testclient.shorten_many(urls, workers=2))
+
+        assert [url for url, shorturl in shortened] == urls
+        expanded = list(self.testclient.expand_many(
+                [shorturl for url, shorturl in shortened] + ['abc']))
+        assert [longurl for shorturl, longurl in expanded[:30]] == urls
+        assert isinstance(expanded[30][1], YourlsOperationError)
+
+    def test_short_domains(self):
+        apiurl = self.servers[1].apiurl
+        testclient = ShardedYourlsClient([s.apiurl for s in self.servers],
+                token=SIGNATURE, domains={'sho.rt' : apiurl})
+
+        assert testclient.shard_for_shorturl('http://SHO.RT/abc') is testclient.shards[apiurl]
+
+    def test_canonical_routing(self):
+        testclient = ShardedYourlsClient([s.apiurl for s in self.servers],
+                token=SIGNATURE, canonicalizer=Canonicalizer())
+        for i in range(20):
+            variant = 'HTTP://Example.com:80/?b=%d&a=%d' % (i, i)
+            canonical = 'http://example.com/?a=%d&b=%d' % (i, i)
+            assert testclient.shard_for_url(variant) is testclient.shard_for_url(canonical)
+        assert testclient.shards.values()[0].canonicalizer is testclient.canonicalizer
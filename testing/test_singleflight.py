@@ -0,0 +1,137 @@
+# test_singleflight.py
+#  - tests for coalescing identical concurrent requests
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import threading
+import time
+
+import pytest
+import yourls.async_client
+import yourls.client
+from yourls import YourlsOperationError
+from yourls.singleflight import SingleFlight
+from testing.test_yourlsClient import (test_apiurl, test_user, test_pass,
+        test_url1, mock_request, mock_request_404)
+
+class GatedRequest(object):
+    """Blocks every request until released, counting how many were sent"""
+
+    def __init__(self, response):
+        self.response = response
+        self.count = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, args):
+        self.count += 1
+        self.started.set()
+        self.release.wait(5)
+        return self.response(args)
+
+def run_concurrently(fn, count):
+    results = []
+    def target():
+        try:
+            results.append(fn())
+        except YourlsOperationError as error:
+            results.append(error)
+    threads = [threading.Thread(target=target) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+class TestSingleFlight():
+
+    def setup_method(self, method):
+        self.testclient = yourls.client.YourlsClient(test_apiurl, test_user,
+                test_pass, coalesce=True)
+
+    def wait_for_waiters(self, count):
+        while self.testclient.flights.coalesced < count:
+            time.sleep(0.001)
+
+    def test_expand_coalesced(self, monkeypatch):
+        request = GatedRequest(mock_request)
+        monkeypatch.setattr(self.testclient, '_send_request', request)
+
+        threads, results = run_concurrently(lambda: self.testclient.expand(1), 5)
+        request.started.wait(5)
+        self.wait_for_waiters(4)
+        request.release.set()
+        for thread in threads:
+            thread.join()
+
+        assert results == [test_url1] * 5
+        assert request.count == 1
+
+    def test_shared_exception(self, monkeypatch):
+        request = GatedRequest(mock_request_404)
+        monkeypatch.setattr(self.testclient, '_send_request', request)
+
+        threads, results = run_concurrently(lambda: self.testclient.expand('nope'), 3)
+        request.started.wait(5)
+        self.wait_for_waiters(2)
+        request.release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 3
+        assert all(isinstance(r, YourlsOperationError) for r in results)
+        assert request.count == 1
+
+    def test_waiter_deadline(self, monkeypatch):
+        request = GatedRequest(mock_request)
+        monkeypatch.setattr(self.testclient, '_send_request', request)
+
+        threads, results = run_concurrently(lambda: self.testclient.expand(1), 1)
+        request.started.wait(5)
+        started = time.time()
+        with pytest.raises(YourlsOperationError):
+            self.testclient.expand(1, deadline=0.2)
+        assert time.time() - started < 1
+
+        request.release.set()
+        for thread in threads:
+            thread.join()
+        assert results == [test_url1]
+        assert request.count == 1
+
+    def test_sequential_calls_not_coalesced(self, monkeypatch):
+        flights = SingleFlight()
+
+        assert flights.do('key', lambda: 1) == 1
+        assert flights.do('key', lambda: 2) == 2
+        assert flights.coalesced == 0
+
+    def test_async_client_shares_future(self, monkeypatch):
+        testclient = yourls.async_client.AsyncYourlsClient(test_apiurl,
+                test_user, test_pass, coalesce=True)
+        request = GatedRequest(mock_request)
+        monkeypatch.setattr(testclient.client, '_send_request', request)
+
+        first = testclient.expand(1)
+        second = testclient.expand(1)
+        request.release.set()
+
+        assert first is second
+        assert first.result(5) == test_url1
+        assert request.count == 1
+        testclient.close()
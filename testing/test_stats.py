@@ -0,0 +1,77 @@
+# test_stats.py
+#  - tests for the stats and db-stats api actions
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import datetime
+import types
+
+import yourls.client
+from yourls.fakeserver import FakeYourlsServer
+from yourls.models import Link, parse_timestamp
+from testing.test_yourlsClient import test_user, test_pass
+
+class TestStats():
+
+    def setup_method(self, method):
+        self.server = FakeYourlsServer(test_user, test_pass).start()
+        self.testclient = yourls.client.YourlsClient(self.server.apiurl,
+                test_user, test_pass)
+        for i in range(25):
+            self.server.add('http://example.com/%d' % i, clicks=i)
+
+    def teardown_method(self, method):
+        self.testclient.close()
+        self.server.stop()
+
+    def test_stats_chunked(self):
+        links = self.testclient.stats('top', chunk_size=10)
+
+        assert isinstance(links, types.GeneratorType)
+        links = list(links)
+        assert [link.clicks for link in links] == range(24, -1, -1)
+        assert isinstance(links[0], Link)
+        assert links[0].url == 'http://example.com/24'
+        assert self.server.requests == 3
+
+    def test_stats_limit(self):
+        links = list(self.testclient.stats('bottom', limit=12, chunk_size=5))
+
+        assert [link.clicks for link in links] == range(12)
+        assert self.server.requests == 3
+
+    def test_stats_lazy(self):
+        links = self.testclient.stats(chunk_size=10)
+        next(links)
+
+        assert self.server.requests == 1
+
+    def test_db_stats(self):
+        stats = self.testclient.db_stats()
+
+        assert stats.total_links == 25
+        assert stats.total_clicks == sum(range(25))
+
+    def test_timestamp_parsed(self):
+        link = next(self.testclient.stats(limit=1))
+
+        assert isinstance(link.timestamp, datetime.datetime)
+        assert parse_timestamp('2011-11-21 13:30:32') == datetime.datetime(2011, 11, 21, 13, 30, 32)
+        assert parse_timestamp('now') is None
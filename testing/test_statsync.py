@@ -0,0 +1,107 @@
+# test_statsync.py
+#  - tests for the adaptive click stats poller
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import yourls.client
+from yourls.fakeserver import FakeYourlsServer
+from yourls.statsync import StatsSync
+
+class TestStatsSync():
+
+    def setup_method(self, method):
+        self.server = FakeYourlsServer(max_batch=100).start()
+        self.keywords = [self.server.add('http://example.com/%d' % i)
+                         for i in range(10)]
+        self.testclient = yourls.client.YourlsClient(self.server.apiurl,
+                                                     token='unused')
+        self.sync = StatsSync(self.testclient, ':memory:', min_interval=60,
+                              max_interval=3600, target_clicks=10, budget=100)
+        self.sync.track(self.keywords, now=0)
+
+    def teardown_method(self, method):
+        self.sync.close()
+        self.server.stop()
+
+    def test_first_cycle_records_baseline(self):
+        self.server.click(self.keywords[0], 5)
+        result = self.sync.run_cycle(now=0)
+
+        assert result == {'polled' : 10, 'changed' : 1, 'errors' : 0, 'due' : 0}
+        assert self.sync.clicks(self.keywords[0]) == 5
+        assert self.sync.history(self.keywords[0]) == [(0, 5, 5)]
+        assert self.sync.history(self.keywords[1]) == []
+
+    def test_only_deltas_written(self):
+        self.sync.run_cycle(now=0)
+        self.server.click(self.keywords[0], 3)
+        result = self.sync.run_cycle(now=60)
+
+        assert result['polled'] == 10
+        assert result['changed'] == 1
+        assert self.sync.history(self.keywords[0]) == [(60, 3, 3)]
+
+    def test_cold_links_back_off(self):
+        self.sync.run_cycle(now=0)
+        self.sync.run_cycle(now=60)
+
+        # unchanged at 60, so next due at 60 + 120
+        assert self.sync.run_cycle(now=179)['polled'] == 0
+        assert self.sync.run_cycle(now=180)['polled'] == 10
+
+    def test_hot_links_polled_often(self):
+        hot = self.keywords[0]
+        self.sync.run_cycle(now=0)
+        for now in (60, 180, 420):
+            self.server.click(hot, 1000)
+            self.sync.run_cycle(now=now)
+
+        # cold links are not due for a while, the hot one every minute
+        assert self.sync.run_cycle(now=480) == {'polled' : 1, 'changed' : 0,
+                                                'errors' : 0, 'due' : 0}
+
+    def test_budget_limits_cycle(self):
+        self.sync.budget = 4
+        assert self.sync.run_cycle(now=0)['due'] == 6
+        assert self.sync.run_cycle(now=0)['due'] == 2
+        assert self.sync.run_cycle(now=0) == {'polled' : 2, 'changed' : 0,
+                                              'errors' : 0, 'due' : 0}
+
+    def test_errors_back_off(self):
+        self.sync.track(['http://sho.rt/missing'], now=0)
+        result = self.sync.run_cycle(now=0)
+
+        assert result['errors'] == 1
+        assert self.sync.clicks('http://sho.rt/missing') is None
+        assert self.sync.stats()['errors'] == 1
+
+    def test_without_batch_action(self):
+        self.server.max_batch = 0
+        self.server.click(self.keywords[2], 2)
+
+        assert self.sync.run_cycle(now=0)['changed'] == 1
+        assert self.sync.clicks(self.keywords[2]) == 2
+
+    def test_stats(self):
+        self.sync.run_cycle(now=0)
+        self.sync.untrack(self.keywords[0])
+
+        assert self.sync.stats() == {'tracked' : 9, 'cycles' : 1, 'polled' : 10,
+                                     'changed' : 0, 'errors' : 0}
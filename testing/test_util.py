@@ -0,0 +1,47 @@
+# test_util.py
+#  - tests for the shared helpers of the yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+from yourls import YourlsOperationError
+from yourls.util import utf8, capture, shorten_item
+
+def fake_shorten(url, custom=None, title=None):
+    if url == 'bad':
+        raise YourlsOperationError(url, 'Missing URL input')
+    return (url, custom, title)
+
+class TestUtil():
+
+    def test_utf8(self):
+        assert utf8(u'http://example.com/\xe9') == 'http://example.com/\xc3\xa9'
+        assert utf8('abc') == 'abc'
+        assert utf8(12) == '12'
+
+    def test_capture(self):
+        assert capture(fake_shorten, 'http://example.com/')[0] == 'http://example.com/'
+        assert isinstance(capture(fake_shorten, 'bad'), YourlsOperationError)
+
+    def test_shorten_item(self):
+        assert shorten_item(fake_shorten, 'http://example.com/') == \
+                ('http://example.com/', None, None)
+        assert shorten_item(fake_shorten, ('http://example.com/', 'kw', 'T')) == \
+                ('http://example.com/', 'kw', 'T')
+        assert isinstance(shorten_item(fake_shorten, ('bad',)), YourlsOperationError)
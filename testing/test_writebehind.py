@@ -0,0 +1,131 @@
+# test_writebehind.py
+#  - tests for the write-behind shorten queue
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+import threading
+import time
+
+import pytest
+from yourls import YourlsError, YourlsOperationError
+from yourls.writebehind import ShortenQueue
+
+class FakeClient(object):
+    """Records shorten calls, optionally holding them until released"""
+
+    def __init__(self, hold=False):
+        self.calls = []
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def shorten(self, url, custom=None, title=None):
+        self.release.wait()
+        self.calls.append(url)
+        if url == 'bad':
+            raise YourlsOperationError(url, 'Missing URL input')
+        return 'http://sho.rt/%d' % len(self.calls)
+
+class TestShortenQueue():
+
+    def test_batches_by_size(self):
+        client = FakeClient()
+        queue = ShortenQueue(client, max_batch=4, max_delay=10)
+        futures = [queue.submit('http://example.com/%d' % i) for i in range(8)]
+
+        assert set(f.result(5) for f in futures) == set('http://sho.rt/%d' % i
+                                                        for i in range(1, 9))
+        assert queue.stats()['batches'] == 2
+        queue.close()
+
+    def test_batches_by_time(self):
+        queue = ShortenQueue(FakeClient(), max_batch=100, max_delay=0.01)
+        started = time.time()
+
+        assert queue.submit('http://example.com/').result(5) == 'http://sho.rt/1'
+        assert time.time() - started < 1
+        queue.close()
+
+    def test_duplicates_sent_once(self):
+        client = FakeClient()
+        queue = ShortenQueue(client, max_batch=10, max_delay=10)
+        futures = [queue.submit('http://example.com/') for i in range(3)]
+        queue.flush()
+
+        assert [f.result() for f in futures] == ['http://sho.rt/1'] * 3
+        assert len(client.calls) == 1
+        assert queue.stats()['deduplicated'] == 2
+        queue.close()
+
+    def test_errors(self):
+        queue = ShortenQueue(FakeClient(), max_delay=0)
+
+        assert isinstance(queue.submit('bad').exception(5), YourlsOperationError)
+        queue.close()
+
+    def test_backpressure(self):
+        client = FakeClient(hold=True)
+        queue = ShortenQueue(client, max_batch=1, max_delay=0, senders=1,
+                             maxsize=1, put_timeout=0.01)
+        with pytest.raises(YourlsError):
+            for i in range(10):
+                queue.submit('http://example.com/%d' % i)
+
+        assert queue.stats()['rejected'] == 1
+        client.release.set()
+        queue.close()
+        assert len(client.calls) == queue.stats()['submitted']
+
+    def test_close(self):
+        client = FakeClient()
+        queue = ShortenQueue(client, max_batch=100, max_delay=10)
+        future = queue.submit('http://example.com/')
+        queue.close()
+
+        assert future.done()
+        with pytest.raises(YourlsError):
+            queue.submit('http://example.com/')
+
+    def test_close_without_wait(self):
+        client = FakeClient(hold=True)
+        queue = ShortenQueue(client, max_batch=2, max_delay=10, senders=1)
+        futures = [queue.submit('http://example.com/%d' % i) for i in range(6)]
+        queue.close(wait=False)
+        client.release.set()
+
+        # batches still being collected when close returned are sent too
+        assert len(set(f.result(5) for f in futures)) == 6
+        assert queue.flush(5)
+
+    def test_flush_with_full_queue(self):
+        client = FakeClient(hold=True)
+        queue = ShortenQueue(client, max_batch=1, max_delay=0, senders=1,
+                             maxsize=1, put_timeout=0.01)
+        futures = []
+        with pytest.raises(YourlsError):
+            for i in range(10):
+                futures.append(queue.submit('http://example.com/%d' % i))
+        started = time.time()
+
+        assert not queue.flush(0.2)
+        assert time.time() - started < 0.5
+        client.release.set()
+        queue.close()
+        assert all(f.done() for f in futures)
@@ -24,7 +24,10 @@
 import pytest
 import yourls.client
 from yourls import YourlsError, YourlsOperationError
+import gc
 import json
+import urlparse
+from yourls.futures import Future
 
 test_baseurl = 'http://localhost/yourls/'
 test_apiurl = test_baseurl + 'yourls-api.php'
@@ -92,6 +95,9 @@ def mock_request(args):
                 return make_json_urlstats( test_baseurl, short, url, test_numclicks,
                                            isError = False)
 
+def mock_shorten_any(args):
+    return make_json_response('success', args['url'], test_baseurl + 'any')
+
 def mock_short_keyworderror(args):
     return make_json_response('fail', test_url1, 1, code = 'error:keyword',
             message = 'Short URL 1 already exists in database or is reserved')
@@ -186,3 +192,95 @@ class TestYourlsClient():
             yourls.client.YourlsClient(test_apiurl, test_user, '')
 
 
+
+    def test_shorten_many(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', mock_request)
+
+        results = list(self.testclient.shorten_many([test_url1, test_url2], workers=2))
+
+        assert results == [(test_url1, test_baseurl + '1'),
+                           (test_url2, test_baseurl + '2')]
+
+    def test_shorten_many_failure(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', mock_short_keyworderror)
+
+        results = list(self.testclient.shorten_many([(test_url1, '1', None)]))
+
+        assert len(results) == 1
+        assert isinstance(results[0][1], YourlsOperationError)
+
+    def test_expand_many_completion_order(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', mock_request)
+
+        results = dict(self.testclient.expand_many([1, 2], ordered=False))
+
+        assert results == url_data
+
+    def test_expand_many_bounded_window(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', mock_request)
+        consumed = []
+
+        def keywords():
+            for i in range(100):
+                consumed.append(i)
+                yield 1
+
+        results = self.testclient.expand_many(keywords(), workers=2, window=4)
+        next(results)
+
+        assert len(consumed) <= 5
+        assert len(list(results)) == 99
+
+    def test_shorten_many_bounded_state(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', mock_shorten_any)
+
+        def urls():
+            for i in range(1000):
+                yield 'http://example.com/%d' % i
+
+        results = self.testclient.shorten_many(urls(), workers=2, window=4)
+        for i in range(900):
+            next(results)
+        live = [o for o in gc.get_objects() if isinstance(o, Future)]
+
+        assert len(live) <= 10
+        assert len(list(results)) == 100
+
+    def test_shorten_result(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', mock_request)
+
+        result = self.testclient.shorten_result(test_url1)
+
+        assert result.shorturl == test_baseurl + '1'
+        assert result.url == test_url1
+        assert result.created
+
+    def test_url_stats_typed(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', mock_request)
+
+        test_data = self.testclient.get_url_stats(1)
+
+        assert test_data.clicks == test_numclicks
+        assert test_data.url == test_url1
+        with pytest.raises(KeyError):
+            test_data['nonexistant']
+
+    def test_url_stats_dict_style(self, monkeypatch):
+        monkeypatch.setattr(self.testclient, '_send_request', mock_request)
+
+        test_data = self.testclient.get_url_stats(1)
+
+        assert 'clicks' in test_data
+        assert 'nonexistant' not in test_data
+        assert test_data.get('url') == test_url1
+        assert test_data.get('nonexistant', 'missing') == 'missing'
+        assert set(test_data) == set(test_data.keys())
+        assert dict(test_data.items())['clicks'] == test_numclicks
+
+    def test_encode_args(self):
+        ref_args = {'username':test_user, 'password':test_pass, 'format':'json',
+                    'action':'expand', 'shorturl':'1'}
+
+        encoded = self.testclient._encode_args({'action':'expand', 'shorturl':'1'})
+
+        assert dict(urlparse.parse_qsl(encoded)) == ref_args
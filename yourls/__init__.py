@@ -28,10 +28,16 @@ class YourlsError(Exception):
         return self.message
 
 class YourlsOperationError(YourlsError):
-    '''Error during URL operations'''
-    def __init__(self, url, message):
+    '''Error during URL operations
+
+    ``code`` is the YOURLS status code of a failed operation, such as
+    ``error:keyword``, when the api gave one, or the HTTP status of a
+    request YOURLS refused without one.
+    '''
+    def __init__(self, url, message, code=None):
         self.url = url
         self.message = message
+        self.code = code
     def __str__(self):
         return repr('Error with url \'%s\' - %s' % (self.url, self.message))
 
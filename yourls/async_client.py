@@ -0,0 +1,163 @@
+# async_client.py
+#  - Non-blocking python client for yourls
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.async_client
+   :synopsis: A YOURLS client whose calls return futures
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+"""
+
+import threading
+import time
+
+from yourls import YourlsOperationError
+from yourls.client import YourlsClient
+from yourls.futures import Executor
+
+class AsyncYourlsClient():
+    """Non-blocking counterpart of YourlsClient
+
+    Every call returns a :class:`yourls.futures.Future` right away. The
+    request runs on one of ``max_in_flight`` worker threads, which all share
+    a single connection pool, so at most ``max_in_flight`` requests are ever
+    outstanding against the YOURLS server. Event loops can be notified of
+    completion through ``Future.add_done_callback``.
+
+    With ``coalesce`` enabled, a call identical to one that is still pending
+    returns the pending call's future instead of queueing another request.
+    Calls given their own ``timeout`` or ``deadline`` are not coalesced
+    this way.
+
+    A call's deadline counts from when it was made, so time spent queued
+    behind other calls is part of it.
+
+    """
+
+    def __init__(self, apiurl, username=None, password=None, token=None,
+                 max_in_flight=10, pool=None, idle_timeout=30.0,
+                 coalesce=False, compress=True, timeout=None, deadline=None,
+                 retry=None, breaker=None):
+        """The use of a username/password combo or a signature token is required
+
+        :param apiurl: The location of the api php file
+        :param username: The username to login with (not needed with signature token)
+        :param password: The password to login with (not needed with signature token)
+        :param token: The signature token to use (not needed with username/password combo)
+        :param max_in_flight: The maximum number of concurrent requests
+        :param pool: A ConnectionPool to share with other clients (one is created if not given)
+        :param idle_timeout: Seconds before an idle pooled connection is closed
+        :param coalesce: Share one request between identical pending calls
+        :param compress: Accept gzip/deflate encoded responses (ignored when pool is given)
+        :param timeout: Socket timeout in seconds for each attempt (ignored when pool is given)
+        :param deadline: Seconds after which a call stops retrying
+        :param retry: A yourls.resilience.RetryPolicy for failed requests
+        :param breaker: A yourls.resilience.CircuitBreaker, may be shared between clients
+        :throws: YourlsError for incorrent parameters
+
+        """
+        self.client = YourlsClient(apiurl, username, password, token, pool=pool,
+                                   pool_size=max_in_flight,
+                                   idle_timeout=idle_timeout,
+                                   coalesce=coalesce, compress=compress,
+                                   timeout=timeout, deadline=deadline,
+                                   retry=retry, breaker=breaker)
+        self.executor = Executor(max_in_flight)
+        self.coalesce = coalesce
+        self._pending = {}
+        self._lock = threading.RLock()
+
+
+    def _submit(self, key, fn, *args):
+        if not self.coalesce:
+            return self.executor.submit(fn, *args)
+
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self.executor.submit(fn, *args)
+                self._pending[key] = future
+                future.add_done_callback(lambda f: self._forget(key, f))
+            return future
+
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+
+    def _submit_limited(self, key, fn, args, timeout, deadline):
+        """Submit ``fn(*args)``, passing on a per-call timeout and deadline"""
+        if timeout is None and deadline is None:
+            return self._submit(key, fn, *args)
+        give_up_at = None if deadline is None else time.time() + deadline
+        return self.executor.submit(self._run_limited, fn, args, timeout,
+                                    give_up_at)
+
+
+    def _run_limited(self, fn, args, timeout, give_up_at):
+        deadline = None
+        if give_up_at is not None:
+            deadline = give_up_at - time.time()
+            if deadline <= 0:
+                raise YourlsOperationError(args[0], 'Call deadline exceeded')
+        return fn(*args, timeout=timeout, deadline=deadline)
+
+
+    def shorten(self, url, custom = None, title = None, timeout = None,
+                deadline = None):
+        """Request a shortened URL, see :meth:`YourlsClient.shorten`
+
+        :returns: Future -- resolves to the short URL or raises YourlsOperationError
+
+        """
+        return self._submit_limited(('shorten', url, custom, title),
+                                    self.client.shorten, (url, custom, title),
+                                    timeout, deadline)
+
+
+    def expand(self, shorturl, timeout = None, deadline = None):
+        """Expand a shortened URL, see :meth:`YourlsClient.expand`
+
+        :returns: Future -- resolves to the long URL or raises YourlsOperationError
+
+        """
+        return self._submit_limited(('expand', shorturl), self.client.expand,
+                                    (shorturl,), timeout, deadline)
+
+
+    def get_url_stats(self, shorturl, timeout = None, deadline = None):
+        """Get statistics about a shortened URL, see :meth:`YourlsClient.get_url_stats`
+
+        :returns: Future -- resolves to the stats or raises YourlsOperationError
+
+        """
+        return self._submit_limited(('url-stats', shorturl),
+                                    self.client.get_url_stats, (shorturl,),
+                                    timeout, deadline)
+
+
+    def close(self):
+        """Wait for outstanding requests and close pooled connections"""
+        self.executor.shutdown()
+        self.client.close()
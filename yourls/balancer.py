@@ -0,0 +1,248 @@
+# balancer.py
+#  - Load balancing python yourls client for replicated YOURLS front ends
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.balancer
+   :synopsis: A YOURLS client that spreads requests over several api urls
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+"""
+
+import random
+import threading
+import time
+import urllib2
+
+from yourls import YourlsError
+from yourls.client import YourlsClient
+from yourls.pool import ConnectionPool
+
+LEAST_OUTSTANDING = 'least-outstanding'
+POWER_OF_TWO = 'power-of-two'
+FAILOVER = 'failover'
+
+POLICIES = (LEAST_OUTSTANDING, POWER_OF_TWO, FAILOVER)
+
+# a batch may hold shorturl operations, so it is never resent either
+WRITE_ACTIONS = frozenset(['shorturl', 'batch'])
+
+class Endpoint(object):
+    """One YOURLS front end and its health bookkeeping"""
+
+    def __init__(self, apiurl, pool):
+        self.apiurl = apiurl
+        self.pool = pool
+        self.outstanding = 0
+        self.failures = 0
+        self.requests = 0
+        self.healthy = True
+        self.ejected_until = 0
+
+
+    def available(self, now):
+        """Whether requests may be routed here, including re-admission probes"""
+        return self.healthy or now >= self.ejected_until
+
+
+    def stats(self):
+        return {'apiurl' : self.apiurl, 'healthy' : self.healthy,
+                'outstanding' : self.outstanding, 'failures' : self.failures,
+                'requests' : self.requests}
+
+
+class MultiEndpointClient(YourlsClient):
+    """YourlsClient for several YOURLS front ends sharing one database
+
+    Reads (``expand``, ``url-stats``, ``stats``...) and writes (``shorturl``) are routed by
+    their own policy:
+
+    * ``least-outstanding`` picks the endpoint with the fewest requests in flight
+    * ``power-of-two`` compares two random endpoints and picks the less busy one
+    * ``failover`` always uses the first healthy endpoint in the given order
+
+    An endpoint is ejected after ``eject_after`` consecutive transport
+    failures. Once ``readmit_after`` seconds have passed it receives traffic
+    again, and is marked healthy on its first success. :meth:`check_health`
+    probes every endpoint actively.
+
+    A read that fails with a transport error or HTTP 5xx is tried once on
+    each of the other endpoints; writes are never resent.
+
+    """
+
+    def __init__(self, apiurls, username=None, password=None, token=None,
+                 read_policy=LEAST_OUTSTANDING, write_policy=FAILOVER,
+                 eject_after=3, readmit_after=30.0, pool_size=4,
+                 idle_timeout=30.0, timeout=None, compress=True, **kwargs):
+        """The use of a username/password combo or a signature token is required
+
+        :param apiurls: The locations of the api php files
+        :param username: The username to login with (not needed with signature token)
+        :param password: The password to login with (not needed with signature token)
+        :param token: The signature token to use (not needed with username/password combo)
+        :param read_policy: The routing policy for everything but shorturl
+        :param write_policy: The routing policy for shorturl
+        :param eject_after: Consecutive failures before an endpoint is ejected
+        :param readmit_after: Seconds before an ejected endpoint is tried again
+        :param pool_size: The number of keep-alive connections per endpoint
+        :param idle_timeout: Seconds before an idle pooled connection is closed
+        :param timeout: Socket timeout in seconds for each attempt
+        :param compress: Accept gzip/deflate encoded responses
+        :throws: YourlsError for incorrent parameters
+
+        Any other keyword arguments are passed on to YourlsClient.
+
+        """
+        if not apiurls:
+            raise YourlsError("At least one api url is required")
+        for policy in (read_policy, write_policy):
+            if policy not in POLICIES:
+                raise YourlsError("Unknown routing policy '%s'" % policy)
+
+        self.endpoints = [Endpoint(apiurl, ConnectionPool(apiurl,
+                                   maxsize=pool_size, idle_timeout=idle_timeout,
+                                   timeout=timeout, compress=compress))
+                          for apiurl in apiurls]
+        YourlsClient.__init__(self, apiurls[0], username, password, token,
+                              pool=self.endpoints[0].pool, **kwargs)
+
+        self.read_policy = read_policy
+        self.write_policy = write_policy
+        self.eject_after = eject_after
+        self.readmit_after = readmit_after
+        self._lock = threading.Lock()
+
+
+    def _choose(self, policy, exclude):
+        """Pick an endpoint and count the request as outstanding on it"""
+        now = time.time()
+        with self._lock:
+            candidates = [e for e in self.endpoints
+                          if e.available(now) and e not in exclude]
+            if not candidates:
+                # everything is ejected; better to try than to fail outright
+                candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+
+            if policy == FAILOVER:
+                endpoint = candidates[0]
+            elif policy == POWER_OF_TWO and len(candidates) > 2:
+                first, second = random.sample(candidates, 2)
+                endpoint = min(first, second, key=lambda e: e.outstanding)
+            else:
+                endpoint = min(candidates, key=lambda e: e.outstanding)
+
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+
+    def _finish(self, endpoint, failed):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if not failed:
+                endpoint.failures = 0
+                endpoint.healthy = True
+                return
+
+            endpoint.failures += 1
+            if not endpoint.healthy or endpoint.failures >= self.eject_after:
+                endpoint.healthy = False
+                endpoint.ejected_until = time.time() + self.readmit_after
+
+
+    def _send_to(self, endpoint, args):
+        event = self._current_event()
+        if event is not None:
+            event.endpoint = endpoint.apiurl
+        urlargs = self._encode_args(args)
+        failed = True
+        try:
+            response = self._urlopen(endpoint.pool, urlargs)
+            self._record_wire_bytes(endpoint.pool, response)
+            failed = False
+            return response
+        except urllib2.HTTPError as error:
+            failed = error.code >= 500
+            raise
+        finally:
+            self._finish(endpoint, failed)
+
+
+    def _send_request(self, args):
+        """Send a request to an endpoint chosen by the routing policy
+
+        :param args: The arguments to send to YOURLS
+
+        """
+        is_write = args['action'] in WRITE_ACTIONS
+        policy = self.write_policy if is_write else self.read_policy
+        tried = []
+
+        while True:
+            endpoint = self._choose(policy, tried)
+            tried.append(endpoint)
+            try:
+                return self._send_to(endpoint, args)
+            except urllib2.URLError as error:
+                if (getattr(error, 'code', 500) < 500 or is_write or
+                        len(tried) == len(self.endpoints)):
+                    raise
+
+
+    def check_health(self):
+        """Probe every endpoint with a version request, ejecting or
+        re-admitting it depending on the result
+
+        :returns: list of the healthy api urls
+
+        """
+        for endpoint in self.endpoints:
+            with self._lock:
+                endpoint.outstanding += 1
+            try:
+                self._send_to(endpoint, {'action' : 'version'})
+            except urllib2.URLError as error:
+                # a 4xx, e.g. for bad credentials, means the endpoint is up
+                if getattr(error, 'code', 500) < 500:
+                    continue
+                with self._lock:
+                    endpoint.healthy = False
+                    endpoint.ejected_until = time.time() + self.readmit_after
+        return [e.apiurl for e in self.endpoints if e.healthy]
+
+
+    def close(self):
+        """Close any pooled connections held by this client"""
+        for endpoint in self.endpoints:
+            endpoint.pool.close()
+
+
+    def endpoint_stats(self):
+        """Per endpoint health and load, for monitoring
+
+        :returns: list of dicts, one per endpoint
+
+        """
+        with self._lock:
+            return [e.stats() for e in self.endpoints]
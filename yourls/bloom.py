@@ -0,0 +1,237 @@
+# bloom.py
+#  - Bloom filter of known keywords for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.bloom
+   :synopsis: Fail expands of unknown keywords without asking the server
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+A :class:`KeywordFilter` holds every keyword of a YOURLS instance in a Bloom
+filter. A keyword the filter has never seen certainly does not exist, so
+``expand`` can fail it straight away; one it has seen (or a false positive,
+at the configured rate) goes to the api as usual::
+
+    keywords = KeywordFilter(client, error_rate=0.001, interval=600)
+    keywords.refresh()
+    keywords.start()
+    client.keyword_filter = keywords
+
+Keywords created by other clients are unknown until the next refresh, so
+expands of brand new links fail for up to ``interval`` seconds. Keywords
+created through a client using the filter are added to it straight away.
+"""
+
+import hashlib
+import logging
+import math
+import struct
+import threading
+import time
+
+from yourls.index import keyword_of
+
+LN2 = math.log(2)
+
+log = logging.getLogger('yourls')
+
+class BloomFilter(object):
+    """A fixed size Bloom filter of strings"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        :param capacity: The number of keys the filter is sized for
+        :param error_rate: The false positive rate once capacity keys are in
+
+        """
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = int(math.ceil(-capacity * math.log(error_rate) / LN2 ** 2))
+        self.num_hashes = max(1, int(round(self.num_bits * LN2 / capacity)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+
+
+    def _positions(self, key):
+        # double hashing (Kirsch and Mitzenmacher) from one md5 digest
+        first, second = struct.unpack('<QQ', hashlib.md5(key).digest())
+        for i in xrange(self.num_hashes):
+            yield (first + i * second) % self.num_bits
+
+
+    def add(self, key):
+        with self._lock:
+            for position in self._positions(key):
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+
+    def __contains__(self, key):
+        bits = self._bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+    def __len__(self):
+        return self.count
+
+
+    def false_positive_rate(self):
+        """The expected false positive rate for the keys added so far"""
+        return (1 - math.exp(-float(self.num_hashes) * self.count /
+                             self.num_bits)) ** self.num_hashes
+
+
+class KeywordFilter(object):
+    """Known keywords of a YOURLS instance, refreshed from the stats action
+
+    ``hits`` counts the checks that passed (the keyword may exist) and
+    ``misses`` those that failed locally (it certainly does not).
+
+    """
+
+    def __init__(self, client, error_rate=0.01, headroom=1.5, interval=None,
+                 chunk_size=1000):
+        """
+        :param client: The YourlsClient to list keywords with
+        :param error_rate: The false positive rate to size the filter for
+        :param headroom: Size the filter for this many times the current links
+        :param interval: Seconds between refreshes once :meth:`start` is called
+        :param chunk_size: The number of links fetched per stats request
+
+        """
+        self.client = client
+        self.error_rate = error_rate
+        self.headroom = headroom
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refreshed_at = None
+
+        self._filter = None
+        self._building = None
+        self._stop = threading.Event()
+        self._thread = None
+
+
+    def refresh(self, links=None, capacity=None):
+        """Rebuild the filter and swap it in
+
+        :param links: Link objects, keywords or (keyword, url) pairs to build
+                      from; every link of the client's instance if None
+        :param capacity: The number of keywords to size for (from db-stats,
+                         times headroom, if None)
+
+        """
+        if capacity is None:
+            if links is None:
+                capacity = self.client.db_stats().total_links * self.headroom
+            else:
+                links = list(links)
+                capacity = len(links) * self.headroom
+        if links is None:
+            links = self.client.stats('last', chunk_size=self.chunk_size)
+
+        bloom = BloomFilter(capacity + 1000, self.error_rate)
+        # keywords added by this client during the rebuild go in both filters
+        self._building = bloom
+        try:
+            for link in links:
+                if hasattr(link, 'shorturl'):
+                    link = link.shorturl
+                elif isinstance(link, tuple):
+                    link = link[0]
+                bloom.add(keyword_of(link))
+            self._filter = bloom
+        finally:
+            self._building = None
+        self.refreshes += 1
+        self.refreshed_at = time.time()
+
+
+    def add(self, shorturl):
+        """Record a keyword created since the last refresh"""
+        keyword = keyword_of(shorturl)
+        for bloom in (self._filter, self._building):
+            if bloom is not None:
+                bloom.add(keyword)
+
+
+    def might_exist(self, shorturl):
+        """False only if the keyword certainly does not exist
+
+        Everything passes until the filter has been built.
+
+        """
+        bloom = self._filter
+        if bloom is None:
+            return True
+        if keyword_of(shorturl) in bloom:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                # keep the old filter and try again next time
+                log.exception('yourls keyword filter refresh failed')
+
+
+    def start(self):
+        """Refresh the filter every ``interval`` seconds in the background"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+    def stats(self):
+        """Counters for monitoring
+
+        :returns: dict with keywords, hits, misses, false_positive_rate,
+                  refreshes and refreshed_at
+
+        """
+        bloom = self._filter
+        return {'keywords' : len(bloom) if bloom is not None else 0,
+                'hits' : self.hits, 'misses' : self.misses,
+                'false_positive_rate' : (bloom.false_positive_rate()
+                                         if bloom is not None else 0.0),
+                'refreshes' : self.refreshes, 'refreshed_at' : self.refreshed_at}
@@ -0,0 +1,296 @@
+# cache.py
+#  - Result caches for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.cache
+   :synopsis: Caches for expand() and shorten() results
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+Cache keys are tuples, ``('expand', shorturl)`` for expansions and
+``('shorten', url, custom, title)`` for shortened URLs. Any object that
+provides the :class:`CacheBackend` methods can be passed to YourlsClient as
+its cache; the persistent backends let a restarted process resolve URLs it
+has already seen without asking the server again.
+"""
+
+import anydbm
+import collections
+import json
+import sqlite3
+import threading
+import time
+
+class CacheBackend(object):
+    """Interface for caches used by YourlsClient"""
+
+    hits = 0
+    misses = 0
+
+    def get(self, key):
+        """Look up a cached value
+
+        :returns: the cached value, or None on a miss
+
+        """
+        raise NotImplementedError
+
+
+    def set(self, key, value):
+        """Store a value"""
+        raise NotImplementedError
+
+
+    def clear(self):
+        """Drop every entry"""
+        raise NotImplementedError
+
+
+    def close(self):
+        """Write out anything buffered and release resources"""
+        pass
+
+
+    def stats(self):
+        """Counters for sizing the cache
+
+        :returns: dict with hits and misses
+
+        """
+        return {'hits' : self.hits, 'misses' : self.misses}
+
+
+def _encode_key(key):
+    """Serialize a cache key tuple for the persistent backends"""
+    return json.dumps(key, separators=(',', ':'))
+
+
+class LRUCache(CacheBackend):
+    """A size bounded, thread safe LRU cache with an optional per-entry TTL"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        :param maxsize: The maximum number of entries to hold
+        :param ttl: Seconds an entry stays valid for (forever if None)
+
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+    def get(self, key):
+        """Look up a cached value
+
+        :returns: the cached value, or None on a miss
+
+        """
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                self.misses += 1
+                return None
+
+            self._data[key] = entry
+            self.hits += 1
+            return value
+
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if full"""
+        expires = None
+        if self.ttl is not None:
+            expires = time.time() + self.ttl
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+
+    def clear(self):
+        """Drop every entry, keeping the counters"""
+        with self._lock:
+            self._data.clear()
+
+
+    def stats(self):
+        """Counters for sizing the cache
+
+        :returns: dict with hits, misses, evictions and size
+
+        """
+        return {'hits' : self.hits, 'misses' : self.misses,
+                'evictions' : self.evictions, 'size' : len(self._data)}
+
+
+class SQLiteCache(CacheBackend):
+    """Persistent cache stored in an SQLite database
+
+    The database runs in WAL mode and writes are buffered in memory, then
+    committed ``batch_size`` at a time in one transaction. Lookups go
+    through the primary key index. Call :meth:`close` (or :meth:`flush`) to
+    make sure buffered writes reach the disk.
+
+    """
+
+    def __init__(self, path, batch_size=100):
+        """
+        :param path: The database file to use, created if needed
+        :param batch_size: The number of writes to buffer before committing
+
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.text_factory = str
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS cache '
+                         '(key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._db.commit()
+
+
+    def get(self, key):
+        key = _encode_key(key)
+        with self._lock:
+            value = self._pending.get(key)
+            if value is None:
+                row = self._db.execute('SELECT value FROM cache WHERE key = ?',
+                                       (key,)).fetchone()
+                if row is not None:
+                    value = row[0]
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+
+    def set(self, key, value):
+        with self._lock:
+            self._pending[_encode_key(key)] = value
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+
+    def _flush(self):
+        if self._pending:
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO cache (key, value) '
+                                     'VALUES (?, ?)', self._pending.items())
+            self._pending.clear()
+
+
+    def flush(self):
+        """Commit any buffered writes"""
+        with self._lock:
+            self._flush()
+
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            with self._db:
+                self._db.execute('DELETE FROM cache')
+
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+
+    def __len__(self):
+        self.flush()
+        return self._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+class DbmCache(CacheBackend):
+    """Persistent cache stored in a dbm database
+
+    Whichever dbm implementation ``anydbm`` picks is used. Writes go
+    straight to the database.
+
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The database file to use, created if needed
+
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = anydbm.open(path, 'c')
+
+
+    def get(self, key):
+        key = _encode_key(key)
+        with self._lock:
+            if key in self._db:
+                self.hits += 1
+                return self._db[key]
+            self.misses += 1
+            return None
+
+
+    def set(self, key, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        with self._lock:
+            self._db[_encode_key(key)] = value
+
+
+    def clear(self):
+        with self._lock:
+            for key in self._db.keys():
+                del self._db[key]
+
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+    def __len__(self):
+        return len(self._db)
@@ -0,0 +1,120 @@
+# canonical.py
+#  - Long URL canonicalization for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.canonical
+   :synopsis: Rewrite equivalent long URLs to one form before shortening
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+YOURLS only recognizes a long URL it has seen before if it is byte for byte
+the same, so ``HTTP://Example.com:80/?b=2&a=1&utm_source=x`` and
+``http://example.com/?a=1&b=2`` get different short URLs. A client given a
+:class:`Canonicalizer` rewrites long URLs before caching, coalescing or
+sending them, so such variants share one request and one short URL::
+
+    client = YourlsClient(apiurl, token=token,
+                          canonicalizer=Canonicalizer(drop_params=('utm_*', 'fbclid')))
+"""
+
+import fnmatch
+import re
+import urllib
+import urlparse
+
+DEFAULT_PORTS = {'http' : '80', 'https' : '443'}
+
+class Canonicalizer(object):
+    """A configurable long URL rewriter
+
+    Only changes that keep the URL pointing at the same resource on
+    ordinary web servers are made; anything else is passed through as is.
+    The percent encoding of the query is left alone, parameters are only
+    dropped or reordered.
+
+    """
+
+    def __init__(self, drop_params=('utm_*',), sort_query=True,
+                 normalize_host=True, drop_fragment=False):
+        """
+        :param drop_params: Query parameter names to remove, shell style
+                            patterns allowed (case insensitive)
+        :param sort_query: Sort the query parameters by name
+        :param normalize_host: Lower case the scheme and host, drop the
+                               scheme's default port and an empty path
+        :param drop_fragment: Remove the ``#fragment``
+
+        """
+        self.drop_params = tuple(drop_params or ())
+        self.sort_query = sort_query
+        self.normalize_host = normalize_host
+        self.drop_fragment = drop_fragment
+        self._drop = None
+        if self.drop_params:
+            self._drop = re.compile('|'.join(fnmatch.translate(p.lower())
+                                             for p in self.drop_params))
+
+
+    def __call__(self, url):
+        """The canonical form of a long URL
+
+        :returns: The URL, of the type passed in
+
+        """
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if not netloc:
+            # not something we know how to rewrite
+            return url
+
+        if self.normalize_host:
+            scheme = scheme.lower()
+            netloc = self._host(scheme, netloc)
+            if not path and scheme in DEFAULT_PORTS:
+                path = '/'
+        if query:
+            query = self._query(query)
+        if self.drop_fragment:
+            fragment = ''
+        return urlparse.urlunsplit((scheme, netloc, path, query, fragment))
+
+
+    def _host(self, scheme, netloc):
+        userinfo, at, hostport = netloc.rpartition('@')
+        host, colon, port = hostport.rpartition(':')
+        # a colon inside brackets is part of an IPv6 address, not a port
+        if not colon or not port.isdigit() or host.endswith(':'):
+            host, port = hostport, ''
+        host = host.lower().rstrip('.')
+        if port and port != DEFAULT_PORTS.get(scheme):
+            host += ':' + port
+        return userinfo + at + host
+
+
+    def _query(self, query):
+        params = [param for param in query.split('&') if param]
+        if self._drop is not None:
+            params = [param for param in params if not self._drop.match(
+                urllib.unquote_plus(param.split('=', 1)[0]).lower())]
+        if self.sort_query:
+            # stable, so repeated names keep their relative order
+            params.sort(key=lambda param: param.split('=', 1)[0])
+        return '&'.join(params)
@@ -0,0 +1,349 @@
+# cli.py
+#  - The yourls command line tool
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.cli
+   :synopsis: Bulk shorten and expand CSV or JSONL files from the shell
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+Input is streamed in chunks of rows, each chunk handled by one of
+``--processes`` worker processes with ``--threads`` requests in flight, and
+output rows are written in input order. After every chunk the number of
+rows done and the output size are saved to a checkpoint file, so running
+the same command again after an interruption carries on where it stopped::
+
+    yourls --apiurl http://sho.rt/yourls-api.php --token SECRET \\
+        bulk-shorten links.csv -o short.csv --processes 4 --threads 8
+"""
+
+import argparse
+import collections
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+
+from yourls import YourlsError
+from yourls.client import YourlsClient
+from yourls.resilience import RetryPolicy
+from yourls.util import utf8
+
+SHORTEN = 'bulk-shorten'
+EXPAND = 'bulk-expand'
+
+# column read from and column written to, per command
+COLUMNS = {SHORTEN : ('url', 'shorturl'), EXPAND : ('shorturl', 'longurl')}
+ERROR_COLUMN = 'error'
+
+# AsyncResult.get() without a timeout cannot be interrupted with ^C
+_WAIT = 365 * 24 * 3600
+
+def _read_rows(stream, format):
+    """Stream the rows of a CSV (with a header line) or JSONL file as dicts
+
+    :returns: tuple of (CSV field names or None, generator of rows)
+
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        return reader.fieldnames or [], reader
+    return None, (json.loads(line) for line in stream if line.strip())
+
+
+class Checkpoint(object):
+    """Progress of a bulk run, saved atomically next to its output"""
+
+    def __init__(self, path, command, input):
+        self.path = path
+        self.command = command
+        self.input = input
+
+
+    def load(self):
+        """The saved progress as (rows done, output bytes), or None
+
+        :raises: YourlsError if the checkpoint belongs to a different run
+
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as checkpoint:
+            state = json.load(checkpoint)
+        if state.get('command') != self.command or state.get('input') != self.input:
+            raise YourlsError("Checkpoint %s is for '%s %s', not this run"
+                              % (self.path, state.get('command'), state.get('input')))
+        return state['rows'], state['output_bytes']
+
+
+    def save(self, rows, output_bytes):
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as checkpoint:
+            json.dump({'command' : self.command, 'input' : self.input,
+                       'rows' : rows, 'output_bytes' : output_bytes}, checkpoint)
+        os.rename(temp, self.path)
+
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# the client and settings of a worker process, set up by _init_worker
+_worker = {}
+
+def _init_worker(client_args, threads):
+    retries = client_args.pop('retries')
+    _worker['client'] = YourlsClient(pool_size=threads,
+                                     retry=RetryPolicy(retries=retries),
+                                     **client_args)
+    _worker['threads'] = threads
+
+
+def _process_chunk(task):
+    """Shorten or expand one chunk of rows, filling in the result columns"""
+    command, source, title, keyword, rows = task
+    client = _worker['client']
+    result_column = COLUMNS[command][1]
+
+    if command == SHORTEN:
+        items = [(utf8(row.get(source) or ''),
+                  keyword and row.get(keyword) and utf8(row[keyword]) or None,
+                  title and row.get(title) and utf8(row[title]) or None)
+                 for row in rows]
+        results = client.shorten_many(items, workers=_worker['threads'])
+    else:
+        items = [utf8(row.get(source) or '') for row in rows]
+        results = client.expand_many(items, workers=_worker['threads'])
+
+    for row, (item, result) in zip(rows, results):
+        if isinstance(result, YourlsError):
+            row[result_column] = ''
+            row[ERROR_COLUMN] = result.message
+        else:
+            row[result_column] = result
+            row[ERROR_COLUMN] = ''
+    return rows
+
+
+def _run_chunks(tasks, processes, threads, client_args):
+    """Process chunks over a pool of worker processes, in input order
+
+    At most two chunks per process are queued ahead of the output, so the
+    input is never read much further than it has been written.
+
+    """
+    if processes <= 1:
+        _init_worker(dict(client_args), threads)
+        for task in tasks:
+            yield _process_chunk(task)
+        return
+
+    pool = multiprocessing.Pool(processes, _init_worker, (client_args, threads))
+    try:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_process_chunk, (task,)))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().get(_WAIT)
+        while pending:
+            yield pending.popleft().get(_WAIT)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _guess_format(path):
+    if os.path.splitext(path)[1].lower() in ('.jsonl', '.json', '.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def bulk(options):
+    """Run a bulk-shorten or bulk-expand command
+
+    :returns: int -- The number of rows that failed
+
+    """
+    command = options.command
+    source = options.column or COLUMNS[command][0]
+    format = options.format or _guess_format(options.input)
+    to_stdout = options.output in (None, '-')
+
+    client_args = {'apiurl' : options.apiurl, 'username' : options.username,
+                   'password' : options.password, 'token' : options.token,
+                   'timeout' : options.timeout, 'retries' : options.retries}
+    # fail early, before starting any workers, on bad settings
+    YourlsClient(options.apiurl, options.username, options.password,
+                 options.token)
+
+    checkpoint = None
+    done = output_bytes = 0
+    if not to_stdout and not options.no_checkpoint:
+        checkpoint = Checkpoint(options.checkpoint or options.output + '.checkpoint',
+                                command, os.path.abspath(options.input))
+        if options.restart:
+            checkpoint.remove()
+        state = checkpoint.load()
+        if state is not None:
+            done, output_bytes = state
+            if (not os.path.exists(options.output) or
+                    os.path.getsize(options.output) < output_bytes):
+                raise YourlsError('%s is shorter than its checkpoint says, '
+                                  'use --restart to start over' % options.output)
+
+    if options.input == '-':
+        infile = sys.stdin
+    else:
+        infile = open(options.input, 'rb')
+    if to_stdout:
+        outfile = sys.stdout
+    else:
+        outfile = open(options.output, 'ab' if done else 'wb')
+        # drop anything written after the last checkpoint
+        outfile.truncate(output_bytes)
+
+    fieldnames, rows = _read_rows(infile, format)
+    if fieldnames is not None:
+        extra = [c for c in (COLUMNS[command][1], ERROR_COLUMN) if c not in fieldnames]
+        writer = csv.DictWriter(outfile, fieldnames + extra, extrasaction='ignore')
+        if not done:
+            writer.writeheader()
+        # csv writes None as an empty field, which str() would not
+        write = lambda row: writer.writerow(dict(
+            (k, utf8(v) if isinstance(v, basestring) else v) for k, v in row.items()))
+    else:
+        write = lambda row: outfile.write(json.dumps(row) + '\n')
+
+    tasks = ((command, source, options.title_column, options.keyword_column, chunk)
+             for chunk in _chunks(itertools.islice(rows, done, None),
+                                  options.chunk_size))
+    failed = 0
+    try:
+        for rows_out in _run_chunks(tasks, options.processes, options.threads,
+                                    client_args):
+            for row in rows_out:
+                write(row)
+                if row[ERROR_COLUMN]:
+                    failed += 1
+            done += len(rows_out)
+            outfile.flush()
+            if checkpoint is not None:
+                os.fsync(outfile.fileno())
+                checkpoint.save(done, outfile.tell())
+            if options.verbose:
+                sys.stderr.write('%d rows done\n' % done)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+
+    if checkpoint is not None:
+        checkpoint.remove()
+    sys.stderr.write('%d rows done, %d failed\n' % (done, failed))
+    return failed
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='yourls',
+            description='Command line client for the YOURLS URL shortener')
+    env = os.environ.get
+    parser.add_argument('--apiurl', default=env('YOURLS_APIURL'),
+                        help='the yourls-api.php url ($YOURLS_APIURL)')
+    parser.add_argument('--username', default=env('YOURLS_USERNAME'),
+                        help='($YOURLS_USERNAME)')
+    parser.add_argument('--password', default=env('YOURLS_PASSWORD'),
+                        help='($YOURLS_PASSWORD)')
+    parser.add_argument('--token', default=env('YOURLS_SIGNATURE'),
+                        help='signature token, instead of username and '
+                             'password ($YOURLS_SIGNATURE)')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='socket timeout in seconds')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='retries for failed expands (shortens are never retried)')
+
+    commands = parser.add_subparsers(dest='command')
+    for command, help in ((SHORTEN, 'shorten the urls of a CSV or JSONL file'),
+                          (EXPAND, 'expand the short urls of a CSV or JSONL file')):
+        source, result = COLUMNS[command]
+        sub = commands.add_parser(command, help=help,
+                description='%s, adding %s and %s columns' % (help[0].upper() + help[1:],
+                                                             result, ERROR_COLUMN))
+        sub.add_argument('input', help="input file, or '-' for stdin")
+        sub.add_argument('-o', '--output',
+                         help='output file (stdout, without checkpoints, if not given)')
+        sub.add_argument('--format', choices=('csv', 'jsonl'),
+                         help='input and output format (guessed from the input name)')
+        sub.add_argument('--column', help='the column to read (%s)' % source)
+        if command == SHORTEN:
+            sub.add_argument('--title-column', help='column with page titles')
+            sub.add_argument('--keyword-column', help='column with custom keywords')
+        else:
+            sub.set_defaults(title_column=None, keyword_column=None)
+        sub.add_argument('-p', '--processes', type=int, default=1,
+                         help='worker processes')
+        sub.add_argument('-t', '--threads', type=int, default=8,
+                         help='requests in flight per process')
+        sub.add_argument('--chunk-size', type=int, default=500,
+                         help='rows per chunk of work (and per checkpoint)')
+        sub.add_argument('--checkpoint',
+                         help='checkpoint file (OUTPUT.checkpoint by default)')
+        sub.add_argument('--restart', action='store_true',
+                         help='ignore any checkpoint and start from the first row')
+        sub.add_argument('--no-checkpoint', action='store_true',
+                         help='do not save progress')
+        sub.add_argument('-v', '--verbose', action='store_true',
+                         help='report progress after every chunk')
+    return parser
+
+
+def main(argv=None):
+    """Entry point of the yourls command
+
+    :returns: int -- The exit status, 1 if any row failed
+
+    """
+    parser = make_parser()
+    options = parser.parse_args(argv)
+    if not options.apiurl:
+        parser.error('an api url is required (--apiurl or $YOURLS_APIURL)')
+
+    try:
+        failed = bulk(options)
+    except YourlsError as error:
+        parser.exit(2, 'yourls: error: %s\n' % error)
+    except KeyboardInterrupt:
+        parser.exit(130, 'yourls: interrupted, run again to resume\n')
+    return 1 if failed else 0
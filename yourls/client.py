@@ -27,20 +27,63 @@
 .. moduleauthor:: Tim Flink <tflink@redhat.com>
 """
 
+import functools
+import json
+import logging
+import threading
+import time
 import urllib
 import urllib2
-import json
 from yourls import YourlsError, YourlsOperationError
+from yourls.decoders import get_decoder
+from yourls.futures import Future, imap
+from yourls.hooks import CallEvent, FAIL, ERROR
+from yourls.models import Link, LinkStats, DbStats, ShortenResult
+from yourls.pipeline import PipelinedPool
+from yourls.pool import ConnectionPool
+from yourls.ratelimit import THROTTLE_STATUSES
+from yourls.singleflight import SingleFlight
+from yourls.util import capture, shorten_item
+
+log = logging.getLogger('yourls')
+
+# operations of the batch action, and its size when the server does not say
+BATCH_ACTIONS = ('shorturl', 'expand', 'url-stats')
+DEFAULT_BATCH_SIZE = 100
 
 class YourlsClient():
 
-    def __init__(self, apiurl, username=None, password=None, token=None):
+    request_headers = {'Content-Type' : 'application/x-www-form-urlencoded'}
+
+    def __init__(self, apiurl, username=None, password=None, token=None,
+                 pool=None, pool_size=4, idle_timeout=30.0, cache=None,
+                 coalesce=False, timeout=None, deadline=None, retry=None,
+                 breaker=None, rate_limiter=None, hooks=None, decoder=None,
+                 compress=True, index=None, keyword_filter=None,
+                 canonicalizer=None, pipeline=None):
         """The use of a username/password combo or a signature token is required
 
         :param apiurl: The location of the api php file
         :param username: The username to login with (not needed with signature token)
         :param password: The password to login with (not needed with signature token)
         :param token: The signature token to use (not needed with username/password combo)
+        :param pool: A ConnectionPool to share with other clients (one is created if not given)
+        :param pool_size: The number of keep-alive connections to hold open
+        :param idle_timeout: Seconds before an idle pooled connection is closed
+        :param cache: A cache (e.g. yourls.cache.LRUCache) for shorten and expand results
+        :param coalesce: Share one request between concurrent identical calls
+        :param timeout: Socket timeout in seconds for each attempt (ignored when pool is given)
+        :param deadline: Seconds after which a call stops retrying
+        :param retry: A yourls.resilience.RetryPolicy for idempotent actions
+        :param breaker: A yourls.resilience.CircuitBreaker to fail fast with
+        :param rate_limiter: A yourls.ratelimit.RateLimiter, may be shared between clients
+        :param hooks: Callables to pass a yourls.hooks.CallEvent for every request
+        :param decoder: JSON module name or loads function (fastest installed if None)
+        :param compress: Accept gzip/deflate encoded responses (ignored when pool is given)
+        :param index: A yourls.index.ExpansionIndex for expand to try before the api
+        :param keyword_filter: A yourls.bloom.KeywordFilter for expand to fail unknown keywords with
+        :param canonicalizer: A yourls.canonical.Canonicalizer to rewrite long URLs with before shortening
+        :param pipeline: The number of read-only requests to pipeline on a connection, see yourls.pipeline (ignored when pool is given)
         :throws: YourlsError for incorrent parameters
 
         """
@@ -60,6 +103,40 @@ class YourlsClient():
             self.password = password
             self.std_args = {'username':self.username, 'password':self.password,
                              'format':self.data_format}
+        self._encoded_std_args = urllib.urlencode(self.std_args)
+
+        if pool is None and pipeline:
+            pool = PipelinedPool(apiurl, depth=pipeline, maxsize=pool_size,
+                                 idle_timeout=idle_timeout, timeout=timeout,
+                                 compress=compress)
+        elif pool is None:
+            pool = ConnectionPool(apiurl, maxsize=pool_size,
+                                  idle_timeout=idle_timeout, timeout=timeout,
+                                  compress=compress)
+        self.pool = pool
+        self.cache = cache
+        self.index = index
+        self.keyword_filter = keyword_filter
+        self.canonicalizer = canonicalizer
+        self.deadline = deadline
+        self.retry = retry
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+        self.hooks = list(hooks or [])
+
+        if decoder is None or isinstance(decoder, basestring):
+            decoder = get_decoder(decoder)
+        self.decode = decoder
+        self._local = threading.local()
+        self._batch_size = None
+        self._batch_lock = threading.Lock()
+        # requests not sent because an identical one was in the same bulk call
+        self.deduplicated = 0
+        self._deduplicated_lock = threading.Lock()
+
+        self.flights = None
+        if coalesce:
+            self.flights = SingleFlight()
 
 
     def _send_request(self, args):
@@ -68,12 +145,111 @@ class YourlsClient():
         :param args: The arguments to send to YOURLS
 
         """
-        urlargs = urllib.urlencode(self._make_args(args))
-        req = urllib2.Request(self.apiurl)
-        req.add_data(urlargs)
-        r = urllib2.urlopen(req)
-        data = r.read()
-        return data
+        urlargs = self._encode_args(args)
+        response = self._urlopen(self.pool, urlargs)
+        self._record_wire_bytes(self.pool, response)
+        return response
+
+
+    def _urlopen(self, pool, urlargs):
+        """POST to a pool with the socket timeout of the current call,
+        capped at what is left of its deadline"""
+        timeout = getattr(self._local, 'timeout', None)
+        give_up_at = getattr(self._local, 'give_up_at', None)
+        if give_up_at is not None:
+            remaining = max(give_up_at - time.time(), 0.001)
+            if timeout is None:
+                timeout = getattr(pool, 'timeout', None)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        if timeout is None:
+            return pool.urlopen(urlargs, self.request_headers)
+        return pool.urlopen(urlargs, self.request_headers, timeout)
+
+
+    def _with_limits(self, timeout, deadline, fn, *args):
+        """Call fn with a socket timeout and deadline applying to the
+        requests it sends from this thread"""
+        if timeout is None and deadline is None:
+            return fn(*args)
+        local = self._local
+        saved = (getattr(local, 'timeout', None), getattr(local, 'give_up_at', None))
+        if timeout is not None:
+            local.timeout = timeout
+        if deadline is not None:
+            local.give_up_at = time.time() + deadline
+        try:
+            return fn(*args)
+        finally:
+            local.timeout, local.give_up_at = saved
+
+
+    def _encode_args(self, args):
+        """Build the request body, accounting for it in the current event
+
+        The auth args are encoded once per client and the call args are
+        appended; YOURLS, like PHP in general, lets the later duplicate win,
+        which matches :meth:`_make_args`.
+
+        """
+        event = self._current_event()
+        if event is None:
+            return self._encoded_std_args + '&' + urllib.urlencode(args)
+
+        start = time.time()
+        urlargs = self._encoded_std_args + '&' + urllib.urlencode(args)
+        event.encode_time += time.time() - start
+        event.bytes_sent += len(urlargs)
+        return urlargs
+
+
+    def _record_wire_bytes(self, pool, response):
+        """Note the compressed size of a response in the current event"""
+        event = self._current_event()
+        if event is not None:
+            event.bytes_on_wire = getattr(pool, 'last_wire_bytes', len(response))
+
+
+    def add_hook(self, hook):
+        """Register a callable to receive a CallEvent after every request"""
+        self.hooks.append(hook)
+
+
+    def remove_hook(self, hook):
+        """Unregister a hook added with :meth:`add_hook`"""
+        self.hooks.remove(hook)
+
+
+    def _current_event(self):
+        """The CallEvent of the request running on this thread, if observed"""
+        if not self.hooks:
+            return None
+        return getattr(self._local, 'event', None)
+
+
+    def close(self):
+        """Close any pooled connections held by this client"""
+        self.pool.close()
+
+
+    def _coalesce(self, key, fn, *args):
+        """Call fn, sharing the call with identical ones in flight if enabled
+
+        Joining a call in flight still stops at this call's deadline.
+
+        """
+        if self.flights is None:
+            return fn(*args)
+        give_up_at = getattr(self._local, 'give_up_at', None)
+        if give_up_at is None:
+            return self.flights.do(key, fn, *args)
+        try:
+            return self.flights.do(key, fn, *args,
+                                   timeout=max(give_up_at - time.time(), 0))
+        except YourlsOperationError:
+            raise
+        except YourlsError:
+            # the url or short url is the second part of every key
+            raise YourlsOperationError(key[1], 'Call deadline exceeded')
 
 
     def _make_args(self, new_args):
@@ -93,18 +269,141 @@ class YourlsClient():
         :raises: YourlsOperationError
 
         """
-        try:
-            data = json.loads(self._send_request(args))
-        except urllib2.URLError as error:
-            raise YourlsOperationError(url, str(error))
+        if self.hooks:
+            return self._observed_request(args, url)
+
+        data = self.decode(self._send_with_retry(args, url))
 
         if 'errorCode' in data:
-            raise YourlsOperationError(url, data['message'])
+            raise YourlsOperationError(url, data['message'], data.get('code'))
 
         return data
 
 
-    def shorten(self, url, custom = None, title = None):
+    def _observed_request(self, args, url):
+        """:meth:`_base_request`, recording a CallEvent for the hooks"""
+        event = CallEvent(args['action'], self.apiurl)
+        self._local.event = event
+        start = time.time()
+        try:
+            try:
+                response = self._send_with_retry(args, url)
+            except YourlsOperationError as error:
+                event.outcome = ERROR
+                event.error = error.message
+                event.network_time = time.time() - start - event.encode_time
+                raise
+
+            received = time.time()
+            event.network_time = received - start - event.encode_time
+            event.bytes_received = len(response)
+            data = self.decode(response)
+            event.decode_time = time.time() - received
+
+            if 'errorCode' in data:
+                event.outcome = FAIL
+                event.error = data['message']
+                raise YourlsOperationError(url, data['message'], data.get('code'))
+            if data.get('status') == 'fail' or data.get('statusCode', 200) != 200:
+                event.outcome = FAIL
+                event.error = data.get('message')
+            return data
+        finally:
+            self._local.event = None
+            event.total_time = time.time() - start
+            for hook in list(self.hooks):
+                try:
+                    hook(event)
+                except Exception:
+                    log.exception('yourls hook %r failed', hook)
+
+
+    def _send_with_retry(self, args, url):
+        """Send a request, applying the retry policy, circuit breaker and
+        rate limiter
+
+        The deadline of the call, or else the client's, bounds the socket
+        timeout of each attempt, the wait for the rate limiter and the
+        backoff between retries.
+
+        :param args: The arguments to send to YOURLS
+        :param url: The url (short or long) arg being used in the request
+        :raises: YourlsOperationError
+
+        """
+        give_up_at = getattr(self._local, 'give_up_at', None)
+        if give_up_at is None and self.deadline is not None:
+            return self._with_limits(None, self.deadline, self._send_with_retry,
+                                     args, url)
+
+        bucket = None
+        if self.rate_limiter is not None:
+            bucket = self.rate_limiter.bucket(args['action'])
+
+        attempt = 0
+        while True:
+            remaining = None
+            if give_up_at is not None:
+                remaining = give_up_at - time.time()
+                if remaining <= 0:
+                    raise YourlsOperationError(url, 'Call deadline exceeded')
+            # before the breaker, which may hand this call its one trial
+            if bucket is not None and not bucket.acquire(remaining):
+                raise YourlsOperationError(url, 'Call deadline exceeded '
+                                           'waiting for the rate limiter')
+            if self.breaker is not None and not self.breaker.allow():
+                raise YourlsOperationError(url, 'YOURLS backend unavailable '
+                                           '(circuit breaker open)')
+            started = time.time()
+            recorded = False
+            try:
+                response = self._send_request(args)
+            except urllib2.URLError as error:
+                # an HTTP 4xx means the server is up and refused this request
+                code = getattr(error, 'code', 500)
+                server_fault = code >= 500
+                if bucket is not None:
+                    if server_fault or code in THROTTLE_STATUSES:
+                        bucket.on_failure()
+                    else:
+                        bucket.on_success(time.time() - started)
+                if self.breaker is not None:
+                    recorded = True
+                    if server_fault:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+
+                if (not server_fault or self.retry is None or
+                        not self.retry.should_retry(args['action'], attempt)):
+                    raise YourlsOperationError(url, str(error),
+                                               getattr(error, 'code', None))
+
+                delay = self.retry.delay(attempt)
+                if give_up_at is not None and time.time() + delay >= give_up_at:
+                    raise YourlsOperationError(url, str(error), code)
+                time.sleep(delay)
+                attempt += 1
+                event = self._current_event()
+                if event is not None:
+                    event.retries = attempt
+                continue
+            else:
+                if self.breaker is not None:
+                    recorded = True
+                    self.breaker.record_success()
+            finally:
+                if self.breaker is not None and not recorded:
+                    # anything but a response or URLError leaves no verdict
+                    self.breaker.release()
+
+            if bucket is not None:
+                bucket.on_success(time.time() - started)
+            return response
+
+
+    def shorten(self, url, custom = None, title = None, timeout = None,
+                deadline = None):
         """Request a shortened URL from YOURLS with an optional keyword request
 
         :param url: The URL to shorten
@@ -113,10 +412,53 @@ class YourlsClient():
         :type custom: str
         :param title: Use the given title instead of download it from the URL, this will increase performances
         :type title: str
+        :param timeout: Socket timeout in seconds for this call's requests
+        :param deadline: Seconds the whole call may take, instead of the client's
         :returns: str -- The short URL
         :raises: YourlsOperationError
 
         """
+        return self._with_limits(timeout, deadline, self._shorten_cached, url,
+                                 custom, title)
+
+
+    def _shorten_cached(self, url, custom, title):
+        url = self._canonical(url)
+        key = ('shorten', url, custom, title)
+        if self.cache is None:
+            return self._coalesce(key, self._shorten, url, custom, title).shorturl
+
+        shorturl = self.cache.get(key)
+        if shorturl is None:
+            shorturl = self._coalesce(key, self._shorten, url, custom,
+                                      title).shorturl
+            self.cache.set(key, shorturl)
+        self.cache.set(('expand', shorturl), url)
+        return shorturl
+
+
+    def shorten_result(self, url, custom = None, title = None):
+        """Like :meth:`shorten`, but return everything YOURLS reported
+
+        The cache is not consulted, as it only holds short URLs.
+
+        :returns: yourls.models.ShortenResult
+        :raises: YourlsOperationError
+
+        """
+        url = self._canonical(url)
+        return self._coalesce(('shorten', url, custom, title), self._shorten,
+                              url, custom, title)
+
+
+    def _canonical(self, url):
+        """The long URL as it is sent, cached and coalesced"""
+        if self.canonicalizer is None:
+            return url
+        return self.canonicalizer(url)
+
+
+    def _shorten_args(self, url, custom = None, title = None):
         args = {'action':'shorturl','url':url}
 
         if custom:
@@ -125,51 +467,355 @@ class YourlsClient():
         if title:
             args['title'] = title
 
+        return args
+
+
+    def _shorten(self, url, custom, title):
+        """Send the shorturl request for :meth:`shorten`"""
         # shorten
-        raw_data = self._base_request(args, url)
+        raw_data = self._base_request(self._shorten_args(url, custom, title), url)
+
+        return self._parse_shorten(raw_data, url)
 
+
+    def _parse_shorten(self, raw_data, url):
         # parse result
         if raw_data['status'] == 'fail' and raw_data['code'] == 'error:keyword':
-            raise YourlsOperationError(url, raw_data['message'])
+            raise YourlsOperationError(url, raw_data['message'], raw_data['code'])
 
         if not 'shorturl' in raw_data:
-            raise YourlsOperationError(url, 'Unknown error: %s' % raw_data['message'])
+            raise YourlsOperationError(url, 'Unknown error: %s' % raw_data['message'],
+                                       raw_data.get('code'))
 
-        return raw_data['shorturl']
+        if self.keyword_filter is not None:
+            self.keyword_filter.add(raw_data['shorturl'])
+        return ShortenResult.from_json(raw_data, url)
 
 
-    def expand(self, shorturl):
+    def expand(self, shorturl, timeout = None, deadline = None):
         """Expand a shortened URL to its original form
 
         :param shorturl: The URL to expand
+        :param timeout: Socket timeout in seconds for this call's requests
+        :param deadline: Seconds the whole call may take, instead of the client's
         :returns: str -- The expanded URL
         :raises: YourlsOperationError
 
         """
-        args = {'action' : 'expand', 'shorturl' : shorturl, 'format' : 'json'}
+        return self._with_limits(timeout, deadline, self._expand_cached, shorturl)
+
+
+    def _expand_cached(self, shorturl):
+        if self.index is not None:
+            longurl = self.index.get(shorturl)
+            if longurl is not None:
+                return longurl
+        if (self.keyword_filter is not None and
+                not self.keyword_filter.might_exist(shorturl)):
+            raise YourlsOperationError(shorturl, 'Error: short URL not found')
+
+        key = ('expand', shorturl)
+        if self.cache is None:
+            return self._coalesce(key, self._expand, shorturl)
+
+        longurl = self.cache.get(key)
+        if longurl is None:
+            longurl = self._coalesce(key, self._expand, shorturl)
+            self.cache.set(key, longurl)
+        return longurl
 
-        raw_data = self._base_request(args, shorturl)
 
+    def _expand(self, shorturl):
+        """Send the expand request for :meth:`expand`"""
+        args = {'action' : 'expand', 'shorturl' : shorturl}
+
+        return self._parse_expand(self._base_request(args, shorturl), shorturl)
+
+
+    def _parse_expand(self, raw_data, shorturl):
         if not 'longurl' in raw_data:
             raise YourlsOperationError(shorturl, raw_data['message'])
 
         return raw_data['longurl']
 
 
-    def get_url_stats(self, shorturl):
+    def get_url_stats(self, shorturl, timeout = None, deadline = None):
         """Get statistics about a shortened URL
 
         :param shorturl: The URL to expand
-        :returns: a list of stuff - FIXME, this isn't complete
+        :param timeout: Socket timeout in seconds for this call's requests
+        :param deadline: Seconds the whole call may take, instead of the client's
+        :returns: yourls.models.LinkStats
         :raises: YourlsOperationError
 
         """
+        return self._with_limits(timeout, deadline, self._coalesce,
+                                 ('url-stats', shorturl), self._get_url_stats,
+                                 shorturl)
+
 
-        args = {'action' : 'url-stats', 'shorturl' : shorturl, 'format' : 'json'}
+    def _get_url_stats(self, shorturl):
+        """Send the url-stats request for :meth:`get_url_stats`"""
+        args = {'action' : 'url-stats', 'shorturl' : shorturl}
 
-        raw_data = self._base_request(args, shorturl)
+        return self._parse_url_stats(self._base_request(args, shorturl), shorturl)
 
+
+    def _parse_url_stats(self, raw_data, shorturl):
         if raw_data['statusCode'] != 200:
             raise YourlsOperationError(shorturl, raw_data['message'])
 
-        return raw_data['link']
+        return LinkStats.from_json(raw_data['link'])
+
+
+    def stats(self, filter = 'top', limit = None, chunk_size = 100):
+        """Iterate over links from the YOURLS stats action
+
+        Links are fetched ``chunk_size`` at a time using the ``start``
+        offset, so only one chunk is held in memory however many links are
+        listed. With the ``rand`` filter each chunk is a fresh random sample.
+
+        :param filter: One of top, bottom, last or rand
+        :param limit: The most links to yield (all of them if None)
+        :param chunk_size: The number of links fetched per request
+        :returns: generator of yourls.models.Link
+        :raises: YourlsOperationError
+
+        """
+        start = 0
+        while limit is None or start < limit:
+            count = chunk_size
+            if limit is not None:
+                count = min(chunk_size, limit - start)
+            args = {'action' : 'stats', 'filter' : filter, 'limit' : count,
+                    'start' : start}
+
+            raw_data = self._base_request(args, filter)
+            links = raw_data.get('links') or {}
+            # links come keyed link_1 .. link_N
+            for name in sorted(links, key=lambda name: int(name[5:])):
+                yield Link.from_json(links[name])
+
+            if len(links) < count:
+                return
+            start += len(links)
+
+
+    def db_stats(self):
+        """Get the total number of links and clicks
+
+        :returns: yourls.models.DbStats
+        :raises: YourlsOperationError
+
+        """
+        raw_data = self._base_request({'action' : 'db-stats'}, self.apiurl)
+
+        return DbStats.from_json(raw_data['db-stats'])
+
+
+    def _shorten_key(self, item):
+        if isinstance(item, basestring):
+            item = (item,)
+        item = tuple(item) + (None, None)
+        return (self._canonical(item[0]),) + item[1:3]
+
+
+    def _count_deduplicated(self, count):
+        # bulk calls, and ShortenQueue senders, run on several threads
+        with self._deduplicated_lock:
+            self.deduplicated += count
+
+
+    def _once_per_key(self, fn, key):
+        """Wrap fn so items with the same key in flight at once share a call
+
+        The first item with a key makes the call; items with the same key
+        arriving while it runs get its result and count as deduplicated.
+        A key is forgotten as soon as its call is done, so no more than
+        the items in flight are held on to.
+
+        """
+        calls = {}
+        lock = threading.Lock()
+
+        def call(item):
+            item_key = key(item)
+            with lock:
+                future = calls.get(item_key)
+                first = future is None
+                if first:
+                    future = calls[item_key] = Future()
+            if not first:
+                self._count_deduplicated(1)
+            if first:
+                try:
+                    future.set_result(fn(item))
+                except Exception as error:
+                    future.set_exception(error)
+                finally:
+                    with lock:
+                        del calls[item_key]
+            return future.result()
+        return call
+
+
+    def shorten_many(self, urls, workers = 8, ordered = True, window = None):
+        """Shorten many URLs concurrently, streaming the results
+
+        :param urls: An iterable of URLs, or of (url, custom, title) tuples
+        :param workers: The number of requests to run in parallel
+        :param ordered: Yield results in input order instead of completion order
+        :param window: The maximum number of URLs read ahead (2 * workers by default)
+        :returns: generator of (item, result) tuples, where result is the
+                  short URL or the YourlsOperationError raised for that item
+
+        Items that are the same after canonicalization are sent once while
+        one of them is in flight; give the client a size bounded ``cache``
+        to also collapse repeats further apart in the stream.
+
+        """
+        return imap(self._once_per_key(functools.partial(shorten_item, self.shorten),
+                                       self._shorten_key),
+                    urls, workers, window, ordered)
+
+
+    def expand_many(self, shorturls, workers = 8, ordered = True, window = None):
+        """Expand many short URLs concurrently, streaming the results
+
+        :param shorturls: An iterable of short URLs or keywords
+        :param workers: The number of requests to run in parallel
+        :param ordered: Yield results in input order instead of completion order
+        :param window: The maximum number of URLs read ahead (2 * workers by default)
+        :returns: generator of (shorturl, result) tuples, where result is the
+                  long URL or the YourlsOperationError raised for that item
+
+        """
+        return imap(functools.partial(capture, self.expand), shorturls, workers,
+                    window, ordered)
+
+
+    def supports_batch(self):
+        """Whether the server has the batch action, asked once per client
+
+        :raises: YourlsOperationError if the server could not be reached
+
+        """
+        if self._batch_size is None:
+            with self._batch_lock:
+                if self._batch_size is None:
+                    self._batch_size = self._probe_batch()
+        return self._batch_size > 0
+
+
+    def _probe_batch(self):
+        """Send an empty batch, returning the batch size the server allows"""
+        try:
+            response = self._send_request({'action' : 'batch',
+                                           'operations' : '[]'})
+        except urllib2.HTTPError as error:
+            # unknown actions are answered with a 400
+            if error.code in (400, 404, 501):
+                return 0
+            raise YourlsOperationError(self.apiurl, str(error))
+        except urllib2.URLError as error:
+            raise YourlsOperationError(self.apiurl, str(error))
+
+        data = self.decode(response)
+        if 'errorCode' in data or 'results' not in data:
+            return 0
+        return int(data.get('max_batch') or DEFAULT_BATCH_SIZE)
+
+
+    def _batch_args(self, operation):
+        """The api args and url of one batch operation"""
+        action = operation[0]
+        if action == 'shorturl':
+            url = self._canonical(operation[1])
+            return self._shorten_args(url, *operation[2:4]), url
+        if action in ('expand', 'url-stats'):
+            return {'action' : action, 'shorturl' : operation[1]}, operation[1]
+        raise YourlsError("Unsupported batch operation '%s'" % action)
+
+
+    def _parse_batch_item(self, action, raw_data, url):
+        if 'errorCode' in raw_data:
+            raise YourlsOperationError(url, raw_data['message'], raw_data.get('code'))
+        if action == 'shorturl':
+            return self._parse_shorten(raw_data, url).shorturl
+        if action == 'expand':
+            return self._parse_expand(raw_data, url)
+        return self._parse_url_stats(raw_data, url)
+
+
+    def _batch_item(self, operation):
+        """Run one batch operation as a call of its own"""
+        action = operation[0]
+        if action == 'shorturl':
+            return capture(self.shorten, *operation[1:4])
+        if action == 'expand':
+            return capture(self.expand, operation[1])
+        return capture(self.get_url_stats, operation[1])
+
+
+    def batch(self, operations, workers = 8):
+        """Run many operations in as few requests as possible
+
+        Operations are sent together to the batch action if the server has
+        one (split into batches of the size it allows), or else as separate
+        calls, ``workers`` at a time. Batched operations skip the cache.
+        Operations that are identical (after canonicalization of long URLs)
+        are only sent once.
+
+        :param operations: ('shorturl', url[, custom[, title]]), ('expand',
+                           shorturl) and ('url-stats', shorturl) tuples
+        :param workers: The number of separate calls run in parallel when
+                        the server has no batch action
+        :returns: list of results in operation order: the short URL, long
+                  URL or yourls.models.LinkStats, or the YourlsOperationError
+                  raised for that operation
+        :raises: YourlsError for unsupported operations,
+                 YourlsOperationError if a whole batch failed
+
+        """
+        operations = list(operations)
+        requests = [self._batch_args(operation) for operation in operations]
+        if not operations:
+            return []
+
+        slots = []
+        positions = {}
+        distinct = []
+        for operation, request in zip(operations, requests):
+            key = tuple(sorted(request[0].items()))
+            if key not in positions:
+                positions[key] = len(distinct)
+                distinct.append((operation, request))
+            slots.append(positions[key])
+        self._count_deduplicated(len(operations) - len(distinct))
+
+        results = self._batch_distinct([operation for operation, request in distinct],
+                                       [request for operation, request in distinct],
+                                       workers)
+        return [results[slot] for slot in slots]
+
+
+    def _batch_distinct(self, operations, requests, workers):
+        """Run the operations of :meth:`batch`, all of them different"""
+        if not self.supports_batch():
+            return [result for operation, result in
+                    imap(self._batch_item, operations, workers)]
+
+        results = []
+        size = self._batch_size
+        for start in xrange(0, len(requests), size):
+            chunk = requests[start:start + size]
+            args = {'action' : 'batch',
+                    'operations' : json.dumps([op_args for op_args, url in chunk])}
+            items = self._base_request(args, self.apiurl).get('results') or []
+            if len(items) != len(chunk):
+                raise YourlsOperationError(self.apiurl, 'Batch answered %d of %d '
+                                           'operations' % (len(items), len(chunk)))
+            for (op_args, url), item in zip(chunk, items):
+                results.append(capture(self._parse_batch_item,
+                                       op_args['action'], item, url))
+        return results
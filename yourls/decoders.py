@@ -0,0 +1,70 @@
+# decoders.py
+#  - JSON decoder selection for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.decoders
+   :synopsis: Pick the fastest installed JSON decoder
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+orjson, ujson and simplejson are used when installed, in that order of
+preference, falling back to the standard library json module.
+"""
+
+from yourls import YourlsError
+
+PREFERENCE = ('orjson', 'ujson', 'simplejson', 'json')
+
+def _load(name):
+    """Import the named JSON module and return its loads, or None"""
+    try:
+        module = __import__(name, {}, {}, [], 0)
+    except ImportError:
+        return None
+    return module.loads
+
+
+def available_decoders():
+    """The names of the installed JSON decoders, fastest first"""
+    return [name for name in PREFERENCE if _load(name) is not None]
+
+
+def get_decoder(name=None):
+    """Find a JSON decoding function
+
+    :param name: The module to use, or None for the fastest installed one
+    :returns: callable taking a JSON string
+    :raises: YourlsError if the named decoder is not supported or installed
+
+    """
+    if name is None:
+        for candidate in PREFERENCE:
+            loads = _load(candidate)
+            if loads is not None:
+                return loads
+
+    if name not in PREFERENCE:
+        raise YourlsError("Unsupported JSON decoder '%s'" % name)
+    loads = _load(name)
+    if loads is None:
+        raise YourlsError("JSON decoder '%s' is not installed" % name)
+    return loads
@@ -0,0 +1,511 @@
+# fakeserver.py
+#  - In-process stand-in for the YOURLS api, for tests and benchmarks
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.fakeserver
+   :synopsis: A fake yourls-api.php served from a background thread
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+The fake keeps its links in memory and answers the ``shorturl``,
+``expand``, ``url-stats``, ``stats``, ``db-stats`` and ``version`` actions
+with the same JSON, and the same HTTP status codes, as yourls-api.php::
+
+    with FakeYourlsServer(signature='secret', latency=0.01) as server:
+        client = YourlsClient(server.apiurl, token=server.signature)
+        client.shorten('http://example.com/')
+
+With ``max_batch`` set it also serves the batch action, which is not part
+of YOURLS itself: ``operations`` is a JSON list of ``shorturl``, ``expand``
+and ``url-stats`` argument objects, and the response lists the JSON each
+of them would have been answered with on its own under ``results``.
+
+A :class:`LatencyProxy` in front of the fake adds network round trip time.
+"""
+
+import BaseHTTPServer
+import Queue
+import SocketServer
+import json
+import random
+import socket
+import threading
+import time
+import urlparse
+import zlib
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+UNKNOWN_ACTION = {'errorCode' : 400,
+                  'message' : 'Unknown or missing "action" parameter'}
+
+BATCH_ACTIONS = ('shorturl', 'expand', 'url-stats')
+
+def _base36(number):
+    keyword = ''
+    while True:
+        number, digit = divmod(number, 36)
+        keyword = DIGITS[digit] + keyword
+        if not number:
+            return keyword
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._respond(dict(urlparse.parse_qsl(body)))
+
+    def do_GET(self):
+        self._respond(dict(urlparse.parse_qsl(urlparse.urlsplit(self.path).query)))
+
+    def _respond(self, args):
+        fake = self.server.fake
+        status, data = fake.handle(args)
+        encoding = fake._encoding(self.headers.get('Accept-Encoding', ''))
+        if encoding is not None:
+            data = fake._compress(data, encoding)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(data)))
+        if not fake.keep_alive:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeYourlsServer(object):
+    """A fake YOURLS api listening on localhost"""
+
+    def __init__(self, username=None, password=None, signature=None,
+                 latency=0, error_rate=0, error_status=503, seed=None,
+                 compress=False, max_batch=0, keep_alive=True):
+        """Credentials that are not given are not checked
+
+        :param username: The username requests must log in with
+        :param password: The password requests must log in with
+        :param signature: The signature token requests may use instead
+        :param latency: Seconds to wait before answering each request
+        :param error_rate: Fraction of requests answered with error_status
+        :param error_status: The HTTP status used for injected errors
+        :param seed: Seed for the error injection, for reproducible runs
+        :param compress: Encode responses with gzip or deflate when the
+                         client accepts it, as mod_deflate would
+        :param max_batch: The most operations per batch action, 0 to answer
+                          it as an unknown action like YOURLS does
+        :param keep_alive: Keep connections open between requests, as
+                           opposed to closing them after every response
+
+        """
+        self.username = username
+        self.password = password
+        self.signature = signature
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.compress = compress
+        self.max_batch = max_batch
+        self.keep_alive = keep_alive
+        self.requests = 0
+
+        self._random = random.Random(seed)
+        self._links = {}
+        self._keywords = {}
+        self._order = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+
+    def start(self):
+        """Start serving on a free port of 127.0.0.1"""
+        self._server = _HTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval' : 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        """Stop serving and close the listening socket"""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+    @property
+    def baseurl(self):
+        return 'http://127.0.0.1:%d/' % self._server.server_address[1]
+
+
+    @property
+    def apiurl(self):
+        return self.baseurl + 'yourls-api.php'
+
+
+    def add(self, url, keyword=None, title='', clicks=0):
+        """Store a link directly, without going through the api
+
+        :returns: str -- The keyword of the link
+
+        """
+        with self._lock:
+            return self._add(url, keyword, title, clicks)
+
+
+    def _add(self, url, keyword, title, clicks):
+        if keyword is None:
+            keyword = _base36(self._next_id)
+            while keyword in self._links:
+                self._next_id += 1
+                keyword = _base36(self._next_id)
+            self._next_id += 1
+        self._links[keyword] = {'url' : url, 'title' : title,
+                                'timestamp' : time.strftime('%Y-%m-%d %H:%M:%S'),
+                                'ip' : '127.0.0.1', 'clicks' : clicks}
+        self._keywords.setdefault(url, keyword)
+        self._order[keyword] = len(self._order)
+        return keyword
+
+
+    def click(self, keyword, count=1):
+        """Record clicks on a stored link"""
+        with self._lock:
+            self._links[keyword]['clicks'] += count
+
+
+    def handle(self, args):
+        """Answer one api call
+
+        :param args: The request arguments
+        :returns: tuple of (HTTP status, JSON body)
+
+        """
+        with self._lock:
+            self.requests += 1
+            inject_error = self._random.random() < self.error_rate
+
+        if self.latency:
+            time.sleep(self.latency)
+        if inject_error:
+            return self.error_status, json.dumps({'errorCode' : self.error_status,
+                                                  'message' : 'Injected error'})
+
+        if not self._authorized(args):
+            return self._output({'errorCode' : 403,
+                                 'message' : 'Please log in'})
+
+        action = getattr(self, '_action_' + args.get('action', '').replace('-', '_'),
+                         None)
+        if action is None or (action == self._action_batch and not self.max_batch):
+            return self._output(UNKNOWN_ACTION)
+        with self._lock:
+            return self._output(action(args))
+
+
+    def _encoding(self, accept_encoding):
+        """The Content-Encoding to answer with, or None for identity"""
+        if not self.compress:
+            return None
+        accepted = [part.split(';')[0].strip().lower()
+                    for part in accept_encoding.split(',')]
+        for encoding in ('gzip', 'deflate'):
+            if encoding in accepted:
+                return encoding
+        return None
+
+
+    def _compress(self, data, encoding):
+        wbits = zlib.MAX_WBITS
+        if encoding == 'gzip':
+            wbits += 16
+        compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+        return compressor.compress(data) + compressor.flush()
+
+
+    def _authorized(self, args):
+        if self.signature is not None and args.get('signature') == self.signature:
+            return True
+        if self.username is None and self.password is None:
+            return self.signature is None
+        return (args.get('username') == self.username and
+                args.get('password') == self.password)
+
+
+    def _output(self, data):
+        status = data.get('errorCode', data.get('statusCode', 200))
+        return status, json.dumps(data)
+
+
+    def _keyword(self, shorturl):
+        if shorturl.startswith(self.baseurl):
+            return shorturl[len(self.baseurl):]
+        return shorturl
+
+
+    def _link(self, keyword):
+        link = dict(self._links[keyword])
+        link['shorturl'] = self.baseurl + keyword
+        link['clicks'] = str(link['clicks'])
+        return link
+
+
+    def _action_shorturl(self, args):
+        url = args.get('url')
+        if not url:
+            return {'status' : 'fail', 'code' : 'error:nourl',
+                    'message' : 'Missing URL input', 'errorCode' : 400}
+
+        keyword = args.get('keyword')
+        if keyword and keyword in self._links:
+            return {'status' : 'fail', 'code' : 'error:keyword',
+                    'message' : 'Short URL %s already exists in database or is reserved' % keyword,
+                    'statusCode' : 200}
+
+        if url in self._keywords:
+            keyword = self._keywords[url]
+            return {'status' : 'fail', 'code' : 'error:url',
+                    'url' : self._link(keyword), 'shorturl' : self.baseurl + keyword,
+                    'message' : '%s already exists in database' % url,
+                    'title' : self._links[keyword]['title'], 'statusCode' : 200}
+
+        keyword = self._add(url, keyword or None, args.get('title', ''), 0)
+        link = self._link(keyword)
+        link['keyword'] = keyword
+        return {'status' : 'success', 'url' : link,
+                'message' : '%s added to database' % url, 'title' : link['title'],
+                'shorturl' : self.baseurl + keyword, 'statusCode' : 200}
+
+
+    def _action_expand(self, args):
+        keyword = self._keyword(args.get('shorturl', ''))
+        if keyword not in self._links:
+            return {'keyword' : keyword, 'message' : 'Error: short URL not found',
+                    'errorCode' : 404}
+        return {'keyword' : keyword, 'shorturl' : self.baseurl + keyword,
+                'longurl' : self._links[keyword]['url'], 'message' : 'success',
+                'statusCode' : 200}
+
+
+    def _action_url_stats(self, args):
+        keyword = self._keyword(args.get('shorturl', ''))
+        if keyword not in self._links:
+            return {'message' : 'Error: short URL not found', 'statusCode' : 404}
+        return {'link' : self._link(keyword), 'message' : 'success',
+                'statusCode' : 200}
+
+
+    def _totals(self):
+        return {'total_links' : str(len(self._links)),
+                'total_clicks' : str(sum(l['clicks'] for l in self._links.values()))}
+
+
+    def _action_stats(self, args):
+        kind = args.get('filter', 'top')
+        limit = int(args.get('limit', 10))
+        start = int(args.get('start', 0))
+
+        keywords = self._links.keys()
+        if kind == 'top':
+            keywords.sort(key=lambda k: (-self._links[k]['clicks'], self._order[k]))
+        elif kind == 'bottom':
+            keywords.sort(key=lambda k: (self._links[k]['clicks'], self._order[k]))
+        elif kind == 'last':
+            keywords.sort(key=lambda k: -self._order[k])
+        else:
+            self._random.shuffle(keywords)
+
+        links = {}
+        for i, keyword in enumerate(keywords[start:start + limit]):
+            links['link_%d' % (i + 1)] = self._link(keyword)
+        return {'links' : links, 'stats' : self._totals(), 'statusCode' : 200,
+                'message' : 'success'}
+
+
+    def _action_db_stats(self, args):
+        return {'db-stats' : self._totals(), 'statusCode' : 200,
+                'message' : 'success'}
+
+
+    def _action_version(self, args):
+        return {'version' : '1.5.1', 'statusCode' : 200, 'message' : 'success'}
+
+
+    def _action_batch(self, args):
+        try:
+            operations = json.loads(args.get('operations', '[]'))
+        except ValueError:
+            return {'errorCode' : 400, 'message' : 'Malformed batch operations'}
+        if len(operations) > self.max_batch:
+            return {'errorCode' : 400,
+                    'message' : 'At most %d operations per batch' % self.max_batch}
+
+        results = []
+        for operation in operations:
+            operation = dict((str(k), v) for k, v in operation.items())
+            name = operation.get('action')
+            if name not in BATCH_ACTIONS:
+                results.append(UNKNOWN_ACTION)
+                continue
+            results.append(getattr(self, '_action_' + name.replace('-', '_'))(operation))
+        return {'results' : results, 'max_batch' : self.max_batch,
+                'statusCode' : 200, 'message' : 'success'}
+
+
+class LatencyProxy(object):
+    """A TCP proxy adding half a round trip of delay in each direction
+
+    Unlike the ``latency`` of FakeYourlsServer, which holds up the answer
+    to every request, the delay is on the wire: bytes sent back to back
+    travel together, as they would over a long link::
+
+        with FakeYourlsServer() as server, LatencyProxy(server, rtt=0.08) as proxy:
+            client = YourlsClient(proxy.apiurl, token='unused')
+
+    """
+
+    def __init__(self, server, rtt=0.08):
+        """
+        :param server: The started FakeYourlsServer to forward to
+        :param rtt: Seconds added to every round trip
+
+        """
+        self.server = server
+        self.rtt = rtt
+        self.connections = 0
+        self._listener = None
+        self._sockets = []
+        self._lock = threading.Lock()
+
+
+    def start(self):
+        """Start listening on a free port of 127.0.0.1"""
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(16)
+        self._thread(self._accept)
+        return self
+
+
+    def stop(self):
+        """Stop listening and drop every proxied connection"""
+        self._listener.close()
+        with self._lock:
+            for sock in self._sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+                sock.close()
+            self._sockets = []
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+    @property
+    def baseurl(self):
+        return 'http://127.0.0.1:%d/' % self._listener.getsockname()[1]
+
+
+    @property
+    def apiurl(self):
+        return self.baseurl + 'yourls-api.php'
+
+
+    def _thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+
+    def _accept(self):
+        while True:
+            try:
+                client, address = self._listener.accept()
+            except socket.error:
+                return
+            upstream = socket.create_connection(self.server._server.server_address)
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self.connections += 1
+                self._sockets.extend((client, upstream))
+            for source, dest in ((client, upstream), (upstream, client)):
+                queue = Queue.Queue()
+                self._thread(self._receive, source, queue)
+                self._thread(self._deliver, queue, dest)
+
+
+    def _receive(self, source, queue):
+        while True:
+            try:
+                data = source.recv(65536)
+            except socket.error:
+                data = ''
+            queue.put((time.time() + self.rtt / 2, data))
+            if not data:
+                return
+
+
+    def _deliver(self, queue, dest):
+        while True:
+            due, data = queue.get()
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                if not data:
+                    dest.shutdown(socket.SHUT_WR)
+                    return
+                dest.sendall(data)
+            except socket.error:
+                return
@@ -0,0 +1,255 @@
+# futures.py
+#  - Minimal futures and worker pool for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.futures
+   :synopsis: Futures and a fixed size worker pool
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+"""
+
+import Queue
+import collections
+import itertools
+import logging
+import threading
+
+from yourls import YourlsError
+
+log = logging.getLogger('yourls')
+
+class Future(object):
+    """The pending result of a call running on a worker thread"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+
+    def done(self):
+        """Whether the call has finished"""
+        return self._done
+
+
+    def _wait(self, timeout):
+        with self._condition:
+            if not self._done:
+                self._condition.wait(timeout)
+            if not self._done:
+                raise YourlsError('Timed out waiting for result')
+
+
+    def result(self, timeout=None):
+        """Wait for and return the result of the call
+
+        :param timeout: Seconds to wait before giving up
+        :raises: the exception raised by the call, YourlsError on timeout
+
+        """
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+    def exception(self, timeout=None):
+        """Wait for the call and return the exception it raised, if any
+
+        :param timeout: Seconds to wait before giving up
+        :raises: YourlsError on timeout
+
+        """
+        self._wait(timeout)
+        return self._exception
+
+
+    def add_done_callback(self, fn):
+        """Call ``fn(future)`` once the call finishes
+
+        Callbacks run on the worker thread that completed the call, or
+        immediately if the future is already done. An exception raised by
+        a callback is logged, not passed on.
+
+        """
+        with self._condition:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        self._call_back(fn)
+
+
+    def _call_back(self, fn):
+        # a callback must not take down the worker thread running it
+        try:
+            fn(self)
+        except Exception:
+            log.exception('yourls future callback %r failed', fn)
+
+
+    def _finish(self, result, exception):
+        with self._condition:
+            self._result = result
+            self._exception = exception
+            self._done = True
+            self._condition.notify_all()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            self._call_back(fn)
+
+
+    def set_result(self, result):
+        self._finish(result, None)
+
+
+    def set_exception(self, exception):
+        self._finish(None, exception)
+
+
+class Executor(object):
+    """A fixed number of worker threads pulling calls off a shared queue"""
+
+    def __init__(self, max_workers):
+        """
+        :param max_workers: The number of calls that may run at once
+
+        """
+        if max_workers < 1:
+            raise YourlsError('max_workers must be at least 1')
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule ``fn(*args, **kwargs)`` to run on a worker
+
+        :returns: Future
+
+        """
+        with self._lock:
+            if self._shutdown:
+                raise YourlsError('Cannot submit to an executor that was shut down')
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+
+    def shutdown(self, wait=True):
+        """Stop the workers once the queued calls have run
+
+        :param wait: Block until all workers have exited
+
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            for thread in self._threads:
+                self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def imap(fn, iterable, max_workers, window=None, ordered=True, route=None):
+    """Stream ``fn(item)`` for every item of ``iterable`` over a worker pool
+
+    Only ``window`` items are ever read ahead of the consumer, so arbitrarily
+    long iterables can be streamed in constant memory.
+
+    :param fn: The callable to apply to each item
+    :param iterable: The items to process
+    :param max_workers: The number of calls that may run at once (per route)
+    :param window: The maximum number of outstanding items (2 * max_workers by default)
+    :param ordered: Yield in input order rather than completion order
+    :param route: Callable giving the key of an item; items with different
+                  keys run on separate pools of max_workers threads each
+    :returns: generator of (item, result) tuples
+    :raises: any exception raised by ``fn``
+
+    """
+    if window is None:
+        window = max_workers * 2
+    window = max(window, 1)
+
+    executors = {}
+    items = iter(iterable)
+    pending = collections.deque()
+    finished = Queue.Queue()
+
+    def submit(item):
+        key = route(item) if route is not None else None
+        executor = executors.get(key)
+        if executor is None:
+            executor = executors[key] = Executor(max_workers)
+        future = executor.submit(fn, item)
+        if ordered:
+            pending.append((item, future))
+        else:
+            future.add_done_callback(lambda f: finished.put((item, f)))
+
+    try:
+        outstanding = 0
+        for item in itertools.islice(items, window):
+            submit(item)
+            outstanding += 1
+
+        while outstanding:
+            if ordered:
+                item, future = pending.popleft()
+            else:
+                item, future = finished.get()
+            outstanding -= 1
+            result = future.result()
+
+            for next_item in itertools.islice(items, 1):
+                submit(next_item)
+                outstanding += 1
+
+            yield item, result
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=False)
@@ -0,0 +1,187 @@
+# hooks.py
+#  - Instrumentation hooks and metrics for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.hooks
+   :synopsis: Per-call events and metrics collection
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+A hook is any callable registered with ``YourlsClient.add_hook``. It is
+called with a :class:`CallEvent` after every api request. When no hooks are
+registered the client does not build events at all.
+"""
+
+import bisect
+import threading
+
+SUCCESS = 'success'
+FAIL = 'fail'
+ERROR = 'error'
+
+class CallEvent(object):
+    """Timings and sizes of one api request
+
+    Times are in seconds. ``encode_time`` covers building the request body,
+    ``network_time`` sending it and reading the response (including any
+    retry backoff) and ``decode_time`` parsing the JSON. ``outcome`` is
+    ``success``, ``fail`` for a YOURLS level failure such as an unknown
+    short URL, or ``error`` when the request raised. ``bytes_received`` is
+    the size of the decoded response body and ``bytes_on_wire`` its size as
+    received, before any gzip or deflate decompression.
+
+    """
+
+    __slots__ = ('action', 'endpoint', 'bytes_sent', 'bytes_received',
+                 'bytes_on_wire', 'encode_time', 'network_time', 'decode_time', 'total_time',
+                 'retries', 'outcome', 'error')
+
+    def __init__(self, action, endpoint):
+        self.action = action
+        self.endpoint = endpoint
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.bytes_on_wire = 0
+        self.encode_time = 0.0
+        self.network_time = 0.0
+        self.decode_time = 0.0
+        self.total_time = 0.0
+        self.retries = 0
+        self.outcome = SUCCESS
+        self.error = None
+
+
+    def __repr__(self):
+        return '<CallEvent %s %s %.1fms>' % (self.action, self.outcome,
+                                             self.total_time * 1000)
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+class Histogram(object):
+    """Fixed bucket histogram of observed values"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+    def quantile(self, fraction):
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class MetricsCollector(object):
+    """A hook that aggregates events into in-memory histograms
+
+    Latency histograms are kept per action for the total time and for each
+    phase, along with request, byte and retry counters per action and
+    outcome.
+
+    """
+
+    PHASES = ('total', 'encode', 'network', 'decode')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.requests = {}
+        self.histograms = {}
+        self.bytes_sent = {}
+        self.bytes_received = {}
+        self.bytes_on_wire = {}
+        self.retries = {}
+        self._lock = threading.Lock()
+
+
+    def __call__(self, event):
+        key = (event.action, event.outcome)
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            action = event.action
+            self.bytes_sent[action] = self.bytes_sent.get(action, 0) + event.bytes_sent
+            self.bytes_received[action] = (self.bytes_received.get(action, 0) +
+                                           event.bytes_received)
+            self.bytes_on_wire[action] = (self.bytes_on_wire.get(action, 0) +
+                                          event.bytes_on_wire)
+            self.retries[action] = self.retries.get(action, 0) + event.retries
+            for phase in self.PHASES:
+                histogram = self.histograms.get((action, phase))
+                if histogram is None:
+                    histogram = Histogram(self.buckets)
+                    self.histograms[(action, phase)] = histogram
+                histogram.observe(getattr(event, phase + '_time'))
+
+
+    def histogram(self, action, phase='total'):
+        """The latency histogram for an action and phase, or None"""
+        return self.histograms.get((action, phase))
+
+
+    def prometheus_text(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append('# TYPE yourls_requests_total counter')
+            for (action, outcome), count in sorted(self.requests.items()):
+                lines.append('yourls_requests_total{action="%s",outcome="%s"} %d'
+                             % (action, outcome, count))
+
+            for name, counter in (('yourls_bytes_sent_total', self.bytes_sent),
+                                  ('yourls_bytes_received_total', self.bytes_received),
+                                  ('yourls_bytes_on_wire_total', self.bytes_on_wire),
+                                  ('yourls_retries_total', self.retries)):
+                lines.append('# TYPE %s counter' % name)
+                for action, count in sorted(counter.items()):
+                    lines.append('%s{action="%s"} %d' % (name, action, count))
+
+            lines.append('# TYPE yourls_request_duration_seconds histogram')
+            for (action, phase), histogram in sorted(self.histograms.items()):
+                labels = 'action="%s",phase="%s"' % (action, phase)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append('yourls_request_duration_seconds_bucket{%s,le="%r"} %d'
+                                 % (labels, bound, cumulative))
+                lines.append('yourls_request_duration_seconds_bucket{%s,le="+Inf"} %d'
+                             % (labels, histogram.count))
+                lines.append('yourls_request_duration_seconds_sum{%s} %r'
+                             % (labels, histogram.sum))
+                lines.append('yourls_request_duration_seconds_count{%s} %d'
+                             % (labels, histogram.count))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,297 @@
+# index.py
+#  - Offline keyword to long URL index for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.index
+   :synopsis: A sorted, memory-mapped keyword to long URL table
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+Links almost never change once created, so expanding them can be answered
+from a local snapshot instead of the api::
+
+    index = ExpansionIndex.build('links.idx', client.stats('last'))
+    client = YourlsClient(apiurl, token=token, index=index)
+    ...
+    index.refresh(client)   # pick up the links added since
+
+The file holds the records sorted by keyword followed by a table of their
+offsets, so a lookup is a binary search over the mapped file and only the
+pages it touches are read from disk.
+"""
+
+import csv
+import mmap
+import os
+import struct
+import threading
+
+from yourls import YourlsError
+from yourls.util import utf8
+
+MAGIC = 'YRLSIDX1'
+# magic, number of records, offset of the record offset table
+HEADER = struct.Struct('<8sQQ')
+OFFSET = struct.Struct('<Q')
+# keyword length, long url length
+RECORD = struct.Struct('<HI')
+
+def keyword_of(shorturl):
+    """The keyword of a short URL (YOURLS keywords never contain a slash)"""
+    return utf8(shorturl).rstrip('/').rsplit('/', 1)[-1]
+
+
+def _entries(links):
+    """Normalize Link objects or (keyword, url) pairs to utf-8 pairs"""
+    for link in links:
+        if hasattr(link, 'shorturl'):
+            yield keyword_of(link.shorturl), utf8(link.url)
+        else:
+            keyword, url = link
+            yield keyword_of(keyword), utf8(url)
+
+
+def read_export(path):
+    """Read (keyword, url) pairs from an export of the yourls_url table
+
+    The export is a CSV or tab separated file (as written by ``mysql
+    --batch`` or ``SELECT ... INTO OUTFILE`` with a header added) whose
+    header names at least the ``keyword`` and ``url`` columns.
+
+    """
+    with open(path, 'rb') as export:
+        header = export.readline()
+        delimiter = '\t' if '\t' in header else ','
+        fields = [field.strip() for field in
+                  next(csv.reader([header], delimiter=delimiter))]
+        if 'keyword' not in fields or 'url' not in fields:
+            raise YourlsError("%s has no keyword and url columns" % path)
+        keyword, url = fields.index('keyword'), fields.index('url')
+        for row in csv.reader(export, delimiter=delimiter):
+            if row:
+                yield row[keyword], row[url]
+
+
+def _write(path, entries):
+    """Write sorted, unique (keyword, url) pairs to path atomically"""
+    temp = path + '.tmp'
+    offsets = []
+    with open(temp, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, 0, 0))
+        position = HEADER.size
+        for keyword, url in entries:
+            offsets.append(position)
+            record = RECORD.pack(len(keyword), len(url)) + keyword + url
+            out.write(record)
+            position += len(record)
+        for offset in offsets:
+            out.write(OFFSET.pack(offset))
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, len(offsets), position))
+        out.flush()
+        os.fsync(out.fileno())
+    os.rename(temp, path)
+
+
+def _merge(old, new):
+    """Merge two sorted streams of pairs; new wins on equal keywords"""
+    old, new = iter(old), iter(new)
+    old_entry = next(old, None)
+    new_entry = next(new, None)
+    while old_entry is not None and new_entry is not None:
+        if old_entry[0] < new_entry[0]:
+            yield old_entry
+            old_entry = next(old, None)
+        else:
+            if old_entry[0] == new_entry[0]:
+                old_entry = next(old, None)
+            yield new_entry
+            new_entry = next(new, None)
+    for entry in (old_entry, new_entry):
+        if entry is not None:
+            yield entry
+    for rest in (old, new):
+        for entry in rest:
+            yield entry
+
+
+def _sorted_unique(links):
+    """Sort pairs by keyword, keeping the last url given for a keyword"""
+    latest = dict(_entries(links))
+    return sorted(latest.iteritems())
+
+
+class ExpansionIndex(object):
+    """A read-only keyword to long URL map backed by a memory-mapped file
+
+    Lookups never block each other. :meth:`update` and :meth:`refresh`
+    write a merged file next to the old one and swap it in, so readers see
+    either the old or the new table, never a mix.
+
+    """
+
+    def __init__(self, path):
+        """
+        :param path: An index file written by :meth:`build`
+        :raises: YourlsError if the file is not an index
+
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._update_lock = threading.Lock()
+        self._map = self._open()
+
+
+    def _open(self):
+        with open(self.path, 'rb') as index:
+            try:
+                mapped = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, count, table = HEADER.unpack_from(mapped, 0)
+            except (ValueError, struct.error):
+                magic = None
+        if magic != MAGIC:
+            raise YourlsError("%s is not a yourls index" % self.path)
+        return mapped, count, table
+
+
+    @classmethod
+    def build(cls, path, links):
+        """Write a new index and open it
+
+        The entries are sorted in memory, so the build needs about as much
+        memory as the links themselves take up.
+
+        :param path: The index file to (over)write
+        :param links: yourls.models.Link objects (e.g. from
+                      ``YourlsClient.stats``) or (keyword, url) pairs (e.g.
+                      from :func:`read_export`)
+        :returns: ExpansionIndex
+
+        """
+        _write(path, _sorted_unique(links))
+        return cls(path)
+
+
+    def __len__(self):
+        return self._map[1]
+
+
+    def __contains__(self, shorturl):
+        return self._find(keyword_of(shorturl)) is not None
+
+
+    def __iter__(self):
+        """The (keyword, url) pairs of the index in keyword order"""
+        mapped, count, table = self._map
+        for i in xrange(count):
+            offset = OFFSET.unpack_from(mapped, table + i * OFFSET.size)[0]
+            yield self._record(mapped, offset)
+
+
+    def _record(self, mapped, offset):
+        keyword_len, url_len = RECORD.unpack_from(mapped, offset)
+        start = offset + RECORD.size
+        return (mapped[start:start + keyword_len],
+                mapped[start + keyword_len:start + keyword_len + url_len])
+
+
+    def _find(self, keyword):
+        mapped, count, table = self._map
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            offset = OFFSET.unpack_from(mapped, table + middle * OFFSET.size)[0]
+            keyword_len = RECORD.unpack_from(mapped, offset)[0]
+            start = offset + RECORD.size
+            found = mapped[start:start + keyword_len]
+            if found < keyword:
+                low = middle + 1
+            elif found > keyword:
+                high = middle
+            else:
+                return self._record(mapped, offset)[1]
+        return None
+
+
+    def get(self, shorturl):
+        """Look up the long URL of a short URL or keyword
+
+        :returns: unicode -- The long URL, or None if it is not indexed
+
+        """
+        url = self._find(keyword_of(shorturl))
+        if url is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return url.decode('utf-8')
+
+
+    def update(self, links):
+        """Merge links into the index, replacing the urls of known keywords
+
+        :param links: Link objects or (keyword, url) pairs
+        :returns: int -- The number of links merged
+
+        """
+        new = _sorted_unique(links)
+        if not new:
+            return 0
+        with self._update_lock:
+            _write(self.path, _merge(iter(self), new))
+            # the old mapping is closed once the last reader drops it
+            self._map = self._open()
+        return len(new)
+
+
+    def refresh(self, client, chunk_size=1000):
+        """Add the links created since the index was built or last refreshed
+
+        Links are listed newest first with the ``last`` stats filter until
+        one that is already indexed turns up.
+
+        :param client: The YourlsClient to list links with
+        :param chunk_size: The number of links fetched per request
+        :returns: int -- The number of links added
+
+        """
+        new = []
+        for link in client.stats('last', chunk_size=chunk_size):
+            if link.shorturl in self:
+                break
+            new.append(link)
+        return self.update(new)
+
+
+    def stats(self):
+        """Size and counters for monitoring
+
+        :returns: dict with links, hits and misses
+
+        """
+        return {'links' : len(self), 'hits' : self.hits, 'misses' : self.misses}
+
+
+    def close(self):
+        """Drop the mapping; later lookups all miss"""
+        self._map = (None, 0, 0)
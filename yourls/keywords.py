@@ -0,0 +1,266 @@
+# keywords.py
+#  - Pre-checked custom keyword pool for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.keywords
+   :synopsis: Hand out custom keywords that are known to be free
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+Trying generated keywords one at a time costs a round trip for every one
+that is already taken, which adds up once most short keywords are in use.
+A :class:`KeywordAllocator` checks candidates in bulk ahead of time (one
+batch request where the server has the batch action) and keeps the free
+ones in a pool::
+
+    keywords = KeywordAllocator(client, length=5, pool_size=200)
+    shorturl = keywords.shorten('http://example.com/')
+
+A keyword can still be taken by someone else between the check and its
+use; :meth:`KeywordAllocator.shorten` then moves on to the next one.
+"""
+
+import collections
+import logging
+import random
+import string
+import threading
+
+from yourls import YourlsError, YourlsOperationError
+from yourls.index import keyword_of
+
+log = logging.getLogger('yourls')
+
+ALPHABET = string.digits + string.ascii_lowercase
+
+# how YOURLS answers expand for a keyword nobody has: a 404 carrying this
+# message, which only the batch action passes on
+NOT_FOUND = 'short URL not found'
+
+class KeywordAllocator(object):
+    """A refillable pool of free custom keywords for one client
+
+    When the pool runs below ``low_water`` a background thread tops it up,
+    so :meth:`get` only waits for the network when the pool ran dry.
+
+    """
+
+    def __init__(self, client, length=6, alphabet=ALPHABET, generator=None,
+                 pool_size=100, low_water=None, max_rounds=5, max_attempts=3,
+                 workers=8, seed=None):
+        """
+        :param client: The YourlsClient to check and shorten with
+        :param length: The length of generated keywords
+        :param alphabet: The characters of generated keywords
+        :param generator: A callable returning candidate keywords, instead
+                          of random ones of ``length`` characters
+        :param pool_size: The number of free keywords to keep
+        :param low_water: Refill in the background below this many (a
+                          quarter of pool_size if None)
+        :param max_rounds: The most check requests per refill
+        :param max_attempts: Keywords tried per shorten before giving up
+        :param workers: Checks in flight when the server has no batch action
+        :param seed: Seed for the random keywords, for reproducible runs
+
+        """
+        self.client = client
+        self.pool_size = pool_size
+        self.low_water = pool_size // 4 if low_water is None else low_water
+        self.max_rounds = max_rounds
+        self.max_attempts = max_attempts
+        self.workers = workers
+
+        self.allocated = 0
+        self.checked = 0
+        self.taken = 0
+        self.collisions = 0
+        self.refills = 0
+
+        if generator is None:
+            chooser = random.Random(seed).choice
+            generator = lambda: ''.join(chooser(alphabet) for i in xrange(length))
+        self.generator = generator
+        self._pool = collections.deque()
+        self._pooled = set()
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._refilling = False
+
+
+    def _check(self, candidates):
+        """The candidates that do not exist yet
+
+        :raises: YourlsOperationError if the check request failed
+
+        """
+        results = self.client.batch([('expand', keyword) for keyword in candidates],
+                                    workers=self.workers)
+        free = []
+        for keyword, result in zip(candidates, results):
+            if isinstance(result, YourlsOperationError):
+                # only a definite miss frees a keyword, not a failed request
+                if result.code == 404 or NOT_FOUND in result.message:
+                    free.append(keyword)
+            else:
+                self.taken += 1
+        self.checked += len(candidates)
+        return free
+
+
+    def refill(self):
+        """Top the pool up to ``pool_size`` free keywords
+
+        :returns: int -- The number of keywords added
+        :raises: YourlsOperationError if a check request failed
+
+        """
+        added = 0
+        # keywords found taken in an earlier round are not checked again
+        taken = set()
+        with self._refill_lock:
+            for i in xrange(self.max_rounds):
+                with self._lock:
+                    need = self.pool_size - len(self._pool)
+                    if need <= 0:
+                        break
+                    candidates = set()
+                    for j in xrange(need * 4):
+                        keyword = self.generator()
+                        if keyword not in self._pooled and keyword not in taken:
+                            candidates.add(keyword)
+                        if len(candidates) == need:
+                            break
+                candidates = sorted(candidates)
+                if not candidates:
+                    break
+                free = self._check(candidates)
+                taken.update(set(candidates) - set(free))
+                with self._lock:
+                    for keyword in free:
+                        if keyword not in self._pooled:
+                            self._pool.append(keyword)
+                            self._pooled.add(keyword)
+                            added += 1
+            self.refills += 1
+        return added
+
+
+    def _background_refill(self):
+        try:
+            self.refill()
+        except Exception:
+            # the next get() tries again
+            log.exception('yourls keyword pool refill failed')
+        finally:
+            self._refilling = False
+
+
+    def _maybe_refill(self):
+        with self._lock:
+            if self._refilling or len(self._pool) >= self.low_water:
+                return
+            self._refilling = True
+        thread = threading.Thread(target=self._background_refill)
+        thread.daemon = True
+        thread.start()
+
+
+    def _pop(self):
+        with self._lock:
+            if not self._pool:
+                return None
+            keyword = self._pool.popleft()
+            self._pooled.discard(keyword)
+            self.allocated += 1
+            return keyword
+
+
+    def get(self):
+        """A keyword that was free when it was checked
+
+        :returns: str
+        :raises: YourlsError if no free keyword could be found,
+                 YourlsOperationError if the pool was empty and the check
+                 request failed
+
+        """
+        keyword = self._pop()
+        if keyword is None:
+            self.refill()
+            keyword = self._pop()
+            if keyword is None:
+                raise YourlsError('No free keywords found in %d rounds of %d '
+                                  'candidates' % (self.max_rounds, self.pool_size))
+        self._maybe_refill()
+        return keyword
+
+
+    def release(self, keyword):
+        """Put back a keyword that was handed out but not used"""
+        with self._lock:
+            if keyword not in self._pooled:
+                self._pool.appendleft(keyword)
+                self._pooled.add(keyword)
+                self.allocated -= 1
+
+
+    def shorten(self, url, title = None):
+        """Shorten a URL with a keyword from the pool
+
+        A keyword taken since it was checked is dropped and the next one
+        tried, up to ``max_attempts`` keywords. If YOURLS already had the
+        URL its existing short URL is returned and the keyword put back.
+
+        :returns: str -- The short URL
+        :raises: YourlsOperationError, YourlsError if no keyword was tried
+
+        """
+        collision = None
+        for attempt in xrange(self.max_attempts):
+            keyword = self.get()
+            try:
+                shorturl = self.client.shorten(url, keyword, title)
+            except YourlsOperationError as error:
+                if error.code != 'error:keyword':
+                    raise
+                self.collisions += 1
+                collision = error
+                continue
+            if keyword_of(shorturl) != keyword:
+                self.release(keyword)
+            return shorturl
+        if collision is None:
+            raise YourlsError('No keyword tried (max_attempts is %d)'
+                              % self.max_attempts)
+        raise collision
+
+
+    def stats(self):
+        """Counters for monitoring
+
+        :returns: dict with pooled, allocated, checked, taken, collisions
+                  and refills
+
+        """
+        return {'pooled' : len(self._pool), 'allocated' : self.allocated,
+                'checked' : self.checked, 'taken' : self.taken,
+                'collisions' : self.collisions, 'refills' : self.refills}
@@ -0,0 +1,173 @@
+# models.py
+#  - Result types for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.models
+   :synopsis: Compact records decoded from YOURLS api responses
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+"""
+
+import datetime
+
+def parse_timestamp(value):
+    """Parse a YOURLS 'YYYY-MM-DD HH:MM:SS' timestamp
+
+    :returns: datetime.datetime, or None if value is missing or malformed
+
+    """
+    try:
+        return datetime.datetime(int(value[0:4]), int(value[5:7]),
+                                 int(value[8:10]), int(value[11:13]),
+                                 int(value[14:16]), int(value[17:19]))
+    except (TypeError, ValueError):
+        return None
+
+
+class Link(object):
+    """One short link as listed by the stats action
+
+    ``clicks`` is an int and ``timestamp`` a datetime (None if the server
+    sent something unparseable).
+
+    """
+
+    __slots__ = ('shorturl', 'url', 'title', 'timestamp', 'ip', 'clicks')
+
+    def __init__(self, shorturl, url, title, timestamp, ip, clicks):
+        self.shorturl = shorturl
+        self.url = url
+        self.title = title
+        self.timestamp = timestamp
+        self.ip = ip
+        self.clicks = clicks
+
+
+    @classmethod
+    def from_json(cls, data):
+        get = data.get
+        return cls(get('shorturl'), get('url'), get('title'),
+                   parse_timestamp(get('timestamp')), get('ip'),
+                   int(get('clicks') or 0))
+
+
+    def __repr__(self):
+        return '<Link %s -> %s (%d clicks)>' % (self.shorturl, self.url,
+                                                self.clicks)
+
+
+class LinkStats(Link):
+    """Statistics for one short link, as returned by ``get_url_stats``
+
+    Fields can also be read dict style (``stats['clicks']``, ``get``,
+    ``keys``, ``in``, iteration), as older versions of the client returned
+    the raw JSON dict. Unlike in that dict, ``clicks`` is an int rather
+    than the string the server sends and ``timestamp`` a datetime.
+
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in Link.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+
+    def __contains__(self, key):
+        return key in Link.__slots__
+
+
+    def __iter__(self):
+        return iter(Link.__slots__)
+
+
+    def __len__(self):
+        return len(Link.__slots__)
+
+
+    def keys(self):
+        return list(Link.__slots__)
+
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in Link.__slots__]
+
+
+    def get(self, key, default=None):
+        if key not in Link.__slots__:
+            return default
+        return getattr(self, key)
+
+
+class ShortenResult(object):
+    """The outcome of a shorturl request
+
+    ``created`` is False when YOURLS already knew the long URL and returned
+    its existing short URL instead of making a new one.
+
+    """
+
+    __slots__ = ('shorturl', 'url', 'keyword', 'title', 'created', 'message')
+
+    def __init__(self, shorturl, url, keyword, title, created, message):
+        self.shorturl = shorturl
+        self.url = url
+        self.keyword = keyword
+        self.title = title
+        self.created = created
+        self.message = message
+
+
+    @classmethod
+    def from_json(cls, data, url):
+        link = data.get('url')
+        keyword = None
+        if isinstance(link, dict):
+            keyword = link.get('keyword') or None
+        return cls(data['shorturl'], url, keyword, data.get('title'),
+                   data.get('status') == 'success', data.get('message'))
+
+
+    def __repr__(self):
+        return '<ShortenResult %s -> %s>' % (self.shorturl, self.url)
+
+
+class DbStats(object):
+    """Totals for the whole YOURLS database"""
+
+    __slots__ = ('total_links', 'total_clicks')
+
+    def __init__(self, total_links, total_clicks):
+        self.total_links = total_links
+        self.total_clicks = total_clicks
+
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(int(data.get('total_links') or 0),
+                   int(data.get('total_clicks') or 0))
+
+
+    def __repr__(self):
+        return '<DbStats %d links, %d clicks>' % (self.total_links,
+                                                  self.total_clicks)
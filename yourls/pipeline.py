@@ -0,0 +1,455 @@
+# pipeline.py
+#  - HTTP/1.1 pipelining transport for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.pipeline
+   :synopsis: Send several requests down one connection without waiting
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+A keep-alive connection still waits a full round trip per request. A
+:class:`PipelinedPool` writes up to ``depth`` requests from concurrent
+callers down one connection before the first answer is back, and hands
+out the responses in the order they arrive, which HTTP/1.1 guarantees is
+the order the requests were sent in::
+
+    client = YourlsClient(apiurl, token=token, pipeline=8)
+    for shorturl, longurl in client.expand_many(shorturls, workers=8):
+        ...
+
+Only read-only actions are pipelined, since a request lost when a
+and every request over https or through a proxy, goes through an ordinary
+and every request over https, goes through an ordinary
+:class:`yourls.pool.ConnectionPool`.
+"""
+
+import collections
+import httplib
+import logging
+import re
+import socket
+import threading
+import time
+import urllib2
+import urlparse
+import zlib
+from StringIO import StringIO
+
+from yourls import YourlsError
+from yourls.futures import Future
+from yourls.pool import ConnectionPool, read_body
+
+log = logging.getLogger('yourls')
+
+PIPELINE_ACTIONS = ('expand', 'url-stats', 'stats', 'db-stats', 'version')
+
+_ACTION = re.compile(r'(?:^|&)action=([^&]*)')
+
+def _action(body):
+    """The api action of an encoded request body (the last one, as in PHP)"""
+    actions = _ACTION.findall(body)
+    return urllib2.unquote(actions[-1]) if actions else None
+
+
+class _Broken(Exception):
+    """A pipelined request was lost with its connection"""
+
+
+class _SharedFile(object):
+    """Hands httplib.HTTPResponse the connection's one buffered reader,
+    which it must not close between responses"""
+
+    def __init__(self, fp):
+        self._fp = fp
+
+
+    def makefile(self, mode, bufsize=None):
+        return self
+
+
+    def read(self, *args):
+        return self._fp.read(*args)
+
+
+    def readline(self, *args):
+        return self._fp.readline(*args)
+
+
+    def close(self):
+        pass
+
+
+class _PipelinedConnection(object):
+    """One socket with a reader thread matching responses to requests
+
+    Until the first response shows that the server keeps the connection
+    open, only one request is sent on it.
+
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.in_flight = 0
+        self.answered = 0
+        self.broken = False
+        self.last_used = time.time()
+
+        self._waiting = collections.deque()
+        self._lock = threading.Lock()
+        # requests that may still be sent before the next response
+        self._free = 1
+        self._room = threading.Condition(self._lock)
+        self._verified = False
+        self._sock = pool._connect()
+        self._file = self._sock.makefile('rb')
+        reader = threading.Thread(target=self._read_responses)
+        reader.daemon = True
+        reader.start()
+
+
+    def submit(self, request, timeout=None):
+        """Send a request once there is room in the pipeline
+
+        :param timeout: Seconds to wait for room (forever if None)
+        :returns: Future of (response, body, bytes received)
+        :raises: _Broken if the connection is closed, socket.timeout if
+                 there was no room in time
+
+        """
+        give_up_at = None if timeout is None else time.time() + timeout
+        future = Future()
+        failed = None
+        with self._lock:
+            while not self._free and not self.broken:
+                remaining = None
+                if give_up_at is not None:
+                    remaining = give_up_at - time.time()
+                    if remaining <= 0:
+                        raise socket.timeout('timed out waiting to pipeline')
+                self._room.wait(remaining)
+            if self.broken:
+                raise _Broken('connection closed')
+            self._free -= 1
+            self._waiting.append(future)
+            self.in_flight += 1
+            self.last_used = time.time()
+            try:
+                self._sock.sendall(request)
+            except socket.error as error:
+                failed = error
+        if failed is not None:
+            # fails this request and any sent before it
+            self._break(failed)
+        return future
+
+
+    def _read_responses(self):
+        while True:
+            try:
+                response = httplib.HTTPResponse(_SharedFile(self._file),
+                                                method='POST')
+                response.begin()
+                data, wire_bytes = read_body(response)
+            except socket.timeout as error:
+                with self._lock:
+                    idle = not self._waiting
+                if idle and not self.broken:
+                    continue
+                self._break(error)
+                return
+            except (httplib.HTTPException, socket.error, zlib.error) as error:
+                self._break(error)
+                return
+
+            keep_alive = response.version == 11 and not response.will_close
+            with self._lock:
+                future = self._waiting.popleft()
+                self.in_flight -= 1
+                self.answered += 1
+                if keep_alive:
+                    if not self._verified:
+                        self._verified = True
+                        self._free += self.pool.depth - 1
+                    self._free += 1
+                    self._room.notify_all()
+
+            if not keep_alive:
+                # before anyone can queue another request behind this one
+                if self.answered == 1:
+                    self.pool._unsupported(self)
+                self._break('server closed the connection')
+            future.set_result((response, data, wire_bytes))
+            if not keep_alive:
+                return
+
+
+    def _break(self, error):
+        """Close the connection, failing every request still waiting"""
+        with self._lock:
+            if self.broken:
+                return
+            self.broken = True
+            waiting = list(self._waiting)
+            self._waiting.clear()
+            self.in_flight = 0
+            # callers waiting for room find the connection broken
+            self._room.notify_all()
+        if waiting and self.answered <= 1:
+            # the server lost requests sent behind the first one
+            self.pool._failed(self, error)
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._sock.close()
+        for future in waiting:
+            future.set_exception(_Broken(error))
+
+
+    def close(self):
+        self._break('connection closed by the client')
+
+
+class PipelinedPool(object):
+    """A drop-in for ConnectionPool that pipelines read-only requests
+
+    At most ``connections`` pipelined connections are opened; a new one
+    is only opened while every open one has requests in flight.
+
+    A server that answers the first request on a connection with HTTP/1.0
+    or by closing it cannot pipeline, and the pool sends everything
+    serially from then on. The same happens after ``max_failures``
+    connections lost the requests queued behind their first one. Set a
+    ``timeout``, or a server that stalls on pipelined requests instead of
+    closing the connection will hang them.
+
+    ``pipelined`` counts the requests answered over a pipeline and
+    ``fallbacks`` those sent again serially after their connection broke.
+
+    """
+
+    def __init__(self, url, depth=8, connections=1, maxsize=4, idle_timeout=30.0,
+                 timeout=None, compress=True, actions=PIPELINE_ACTIONS,
+                 max_failures=3):
+        """
+        :param url: The url that requests will be sent to
+        :param depth: The most requests in flight on one connection
+        :param connections: The most pipelined connections to open
+        :param maxsize: The idle connections kept for serial requests
+        :param idle_timeout: Seconds after which an idle connection is dropped
+        :param timeout: Socket timeout in seconds for every connection
+        :param compress: Ask the server for gzip or deflate encoded responses
+        :param actions: The api actions that may be pipelined
+        :param max_failures: Broken pipelines before giving up on pipelining
+        :throws: YourlsError for unsupported urls
+
+        """
+        self.serial = ConnectionPool(url, maxsize=maxsize,
+                                     idle_timeout=idle_timeout, timeout=timeout,
+                                     compress=compress)
+        parsed = urlparse.urlsplit(url)
+        self.url = url
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.path = self.serial.path
+        self._host_header = parsed.netloc.rpartition('@')[2]
+
+        self.depth = depth
+        self.connections = connections
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.compress = compress
+        self.actions = frozenset(actions)
+        self.max_failures = max_failures
+        # a proxy in between may not pass pipelined requests on as sent
+        self.pipelining = (depth > 1 and parsed.scheme == 'http' and
+                           not self.serial.proxy)
+
+        self.pipelined = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self._bytes_on_wire = 0
+        self._bytes_decoded = 0
+
+        self._conns = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+
+    @property
+    def bytes_on_wire(self):
+        return self._bytes_on_wire + self.serial.bytes_on_wire
+
+
+    @property
+    def bytes_decoded(self):
+        return self._bytes_decoded + self.serial.bytes_decoded
+
+
+    @property
+    def last_wire_bytes(self):
+        """Bytes received for the last response read on this thread"""
+        return getattr(self._local, 'wire_bytes', 0)
+
+
+    def _connect(self):
+        if self.timeout is None:
+            sock = socket.create_connection((self.host, self.port))
+        else:
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+
+    def _unsupported(self, conn):
+        with self._lock:
+            was_pipelining, self.pipelining = self.pipelining, False
+        if was_pipelining:
+            log.warning('%s does not keep connections open, not pipelining',
+                        self.url)
+
+
+    def _failed(self, conn, error):
+        with self._lock:
+            self.failures += 1
+            give_up = self.failures >= self.max_failures and self.pipelining
+            if give_up:
+                self.pipelining = False
+        if give_up:
+            log.warning('pipelined requests to %s keep failing (%s), not '
+                        'pipelining', self.url, error)
+
+
+    def _connection(self):
+        """The open connection with the fewest requests in flight, opening
+        another one while they are all busy and the limit allows
+
+        :returns: _PipelinedConnection, or None once pipelining was given up
+
+        """
+        now = time.time()
+        with self._lock:
+            # pipelining may have stopped since the caller looked
+            if not self.pipelining:
+                return None
+            live = []
+            for conn in self._conns:
+                if conn.broken:
+                    continue
+                if not conn.in_flight and now - conn.last_used >= self.idle_timeout:
+                    conn.close()
+                    continue
+                live.append(conn)
+            self._conns = live
+            if live:
+                conn = min(live, key=lambda conn: conn.in_flight)
+                if not conn.in_flight or len(live) >= self.connections:
+                    return conn
+            conn = _PipelinedConnection(self)
+            self._conns.append(conn)
+            return conn
+
+
+    def _request(self, body, headers):
+        lines = ['POST %s HTTP/1.1' % self.path, 'Host: %s' % self._host_header,
+                 'Content-Length: %d' % len(body)]
+        lines.extend('%s: %s' % header for header in headers.items())
+        return '\r\n'.join(lines) + '\r\n\r\n' + body
+
+
+    def _serial(self, body, headers, timeout=None):
+        try:
+            return self.serial.urlopen(body, headers, timeout)
+        finally:
+            self._local.wire_bytes = self.serial.last_wire_bytes
+
+
+    def urlopen(self, body, headers=None, timeout=None):
+        """POST ``body`` to the pool's url, pipelined if its action allows
+
+        A pipelined request shares its socket with others, so ``timeout``
+        bounds the wait for room in the pipeline and then for its response,
+        which is dropped if it arrives later.
+
+        :param body: The encoded request body
+        :param headers: Extra headers to send
+        :param timeout: Seconds to wait for this response instead of the
+                        pool's socket timeout
+        :returns: str -- The response body
+        :raises: urllib2.URLError, urllib2.HTTPError
+
+        """
+        if headers is None:
+            headers = {}
+        if self.compress and 'Accept-Encoding' not in headers:
+            headers = dict(headers, **{'Accept-Encoding' : 'gzip, deflate'})
+        if not self.pipelining or _action(body) not in self.actions:
+            return self._serial(body, headers, timeout)
+
+        conn = self._connection()
+        if conn is None:
+            return self._serial(body, headers, timeout)
+
+        give_up_at = None if timeout is None else time.time() + timeout
+        try:
+            future = conn.submit(self._request(body, headers), timeout)
+            if give_up_at is not None:
+                timeout = max(give_up_at - time.time(), 0)
+            response, data, wire_bytes = future.result(timeout)
+        except _Broken:
+            self.fallbacks += 1
+            return self._serial(body, headers, timeout)
+        except YourlsError:
+            # the only thing result() raises of its own is a timeout
+            raise urllib2.URLError(socket.timeout('timed out'))
+        except (httplib.HTTPException, socket.error) as error:
+            raise urllib2.URLError(error)
+
+        self._local.wire_bytes = wire_bytes
+        with self._lock:
+            self.pipelined += 1
+            self._bytes_on_wire += wire_bytes
+            self._bytes_decoded += len(data)
+
+        if response.status >= 400:
+            raise urllib2.HTTPError(self.url, response.status, response.reason,
+                                    response.msg, StringIO(data))
+        return data
+
+
+    def evict_idle(self):
+        """Close every idle connection that has outlived ``idle_timeout``"""
+        self.serial.evict_idle()
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            for conn in self._conns:
+                if not conn.in_flight and conn.last_used <= cutoff:
+                    conn.close()
+
+
+    def close(self):
+        """Close all connections"""
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self.serial.close()
@@ -0,0 +1,326 @@
+# pool.py
+#  - Persistent HTTP connection pool for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.pool
+   :synopsis: Keep-alive HTTP connection pool used by the YOURLS client
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+"""
+
+import base64
+import collections
+import errno
+import httplib
+import socket
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+import zlib
+from StringIO import StringIO
+
+from yourls import YourlsError
+
+READ_CHUNK = 64 * 1024
+
+# what sending on, or reading the status line from, a connection the
+# server closed while it sat idle in the pool fails with
+STALE_ERRNOS = (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+def _stale(error):
+    """Whether a request failed because its pooled connection had been
+    closed, before any of the response arrived"""
+    if isinstance(error, socket.timeout):
+        # the server may be working on the request
+        return False
+    if isinstance(error, httplib.BadStatusLine):
+        return not error.line.strip("'") or error.line.startswith('No status line')
+    return isinstance(error, socket.error) and error.errno in STALE_ERRNOS
+
+
+def _decompressor(encoding):
+    """A zlib decompressor for a Content-Encoding, or None for identity"""
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return zlib.decompressobj()
+    return None
+
+
+def read_body(response):
+    """Read a whole httplib response body, decompressing it chunk by chunk
+
+    :returns: tuple of (body, bytes received)
+    :raises: httplib.HTTPException, socket.error, zlib.error
+
+    """
+    encoding = response.getheader('content-encoding', '').strip().lower()
+    decompressor = _decompressor(encoding)
+    if decompressor is None:
+        data = response.read()
+        return data, len(data)
+
+    chunks = []
+    wire_bytes = 0
+    while True:
+        chunk = response.read(READ_CHUNK)
+        if not chunk:
+            break
+        try:
+            chunks.append(decompressor.decompress(chunk))
+        except zlib.error:
+            # some servers send deflate without the zlib header
+            if wire_bytes or encoding != 'deflate':
+                raise
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            chunks.append(decompressor.decompress(chunk))
+        wire_bytes += len(chunk)
+    chunks.append(decompressor.flush())
+    return ''.join(chunks), wire_bytes
+
+
+class ConnectionPool(object):
+    """A small pool of persistent HTTP/1.1 connections to a single host
+
+    Connections are handed out most-recently-used first so that a busy
+    client keeps reusing warm sockets, while connections that have been idle
+    for longer than ``idle_timeout`` are closed instead of reused.
+
+    With ``compress`` on, responses may come back gzip or deflate encoded
+    and are decompressed as they are read. ``bytes_on_wire`` counts the
+    response bytes as received and ``bytes_decoded`` after decompression.
+
+    Like ``urllib2.urlopen``, the pool goes through the proxy that the
+    ``http_proxy``/``https_proxy`` environment variables (or the system
+    settings) name for the url's scheme, unless ``no_proxy`` exempts the
+    host. https is tunnelled through the proxy with CONNECT.
+
+    """
+
+    def __init__(self, url, maxsize=4, idle_timeout=30.0, timeout=None,
+                 compress=True, proxies=None):
+        """
+        :param url: The url that requests will be sent to
+        :param maxsize: The maximum number of idle connections to keep open
+        :param idle_timeout: Seconds after which an idle connection is dropped
+        :param timeout: Socket timeout in seconds for new connections
+        :param compress: Ask the server for gzip or deflate encoded responses
+        :param proxies: dict of url scheme to proxy url, as returned by
+                        urllib.getproxies() (which is used if None)
+        :throws: YourlsError for unsupported urls
+
+        """
+        parsed = urlparse.urlsplit(url)
+        if parsed.scheme == 'https':
+            self._conn_class = httplib.HTTPSConnection
+        elif parsed.scheme == 'http':
+            self._conn_class = httplib.HTTPConnection
+        else:
+            raise YourlsError("Unsupported url scheme for '%s'" % url)
+
+        self.url = url
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.path = parsed.path or '/'
+        if parsed.query:
+            self.path += '?' + parsed.query
+
+        if proxies is None:
+            proxies = urllib.getproxies()
+        self.proxy = proxies.get(parsed.scheme)
+        if self.proxy and urllib.proxy_bypass(self.host):
+            self.proxy = None
+        self._proxy_headers = {}
+        self._tunnel = False
+        if self.proxy:
+            proxy = urlparse.urlsplit(self.proxy if '://' in self.proxy
+                                      else 'http://' + self.proxy)
+            self._proxy_address = (proxy.hostname, proxy.port or 80)
+            if proxy.username:
+                credentials = '%s:%s' % (urllib.unquote(proxy.username),
+                                         urllib.unquote(proxy.password or ''))
+                self._proxy_headers['Proxy-Authorization'] = \
+                        'Basic ' + base64.b64encode(credentials)
+            if parsed.scheme == 'https':
+                self._tunnel = True
+            else:
+                # a plain http proxy is sent the full url
+                self.path = url
+
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.compress = compress
+
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.bytes_on_wire = 0
+        self.bytes_decoded = 0
+
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+
+    def _new_connection(self):
+        """Open a new connection to the pool's host, or its proxy"""
+        self.connections_created += 1
+        host, port = self.host, self.port
+        if self.proxy:
+            host, port = self._proxy_address
+        if self.timeout is None:
+            conn = self._conn_class(host, port)
+        else:
+            conn = self._conn_class(host, port, timeout=self.timeout)
+        if self._tunnel:
+            conn.set_tunnel(self.host, self.port, self._proxy_headers)
+        return conn
+
+
+    def _get_connection(self):
+        """Take an idle connection from the pool or create a new one
+
+        :returns: tuple of (connection, reused)
+
+        """
+        now = time.time()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    self.connections_reused += 1
+                    return conn, True
+                conn.close()
+        return self._new_connection(), False
+
+
+    def _put_connection(self, conn):
+        """Return a connection to the pool, closing it if the pool is full"""
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append((conn, time.time()))
+                return
+        conn.close()
+
+
+    def evict_idle(self):
+        """Close every pooled connection that has outlived ``idle_timeout``"""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            while self._idle and self._idle[0][1] <= cutoff:
+                conn, last_used = self._idle.popleft()
+                conn.close()
+
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                conn.close()
+
+
+    @property
+    def last_wire_bytes(self):
+        """Bytes received for the last response read on this thread"""
+        return getattr(self._local, 'wire_bytes', 0)
+
+
+    def _set_timeout(self, conn, timeout):
+        """Change the socket timeout of a connection, open or not"""
+        if timeout is None:
+            timeout = socket.getdefaulttimeout()
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+
+    def _do_request(self, conn, body, headers):
+        """Send a single POST on ``conn`` and read the response headers"""
+        conn.request('POST', self.path, body, headers)
+        return conn.getresponse()
+
+
+    def _read(self, response):
+        """Read a response body, decompressing it chunk by chunk"""
+        data, wire_bytes = read_body(response)
+        self._local.wire_bytes = wire_bytes
+        with self._lock:
+            self.bytes_on_wire += wire_bytes
+            self.bytes_decoded += len(data)
+        return data
+
+
+    def urlopen(self, body, headers=None, timeout=None):
+        """POST ``body`` to the pool's url over a pooled connection
+
+        A request that fails on a reused connection before any response
+        arrived, because the server had dropped the idle socket, is sent
+        once more on a fresh one. Anything else, a timeout in particular,
+        is not, as the server may already have acted on the request.
+
+        :param body: The encoded request body
+        :param headers: Extra headers to send
+        :param timeout: Socket timeout for this request instead of the pool's
+        :returns: str -- The response body
+        :raises: urllib2.URLError, urllib2.HTTPError
+
+        """
+        if headers is None:
+            headers = {}
+        if self.compress and 'Accept-Encoding' not in headers:
+            headers = dict(headers, **{'Accept-Encoding' : 'gzip, deflate'})
+        if self._proxy_headers and not self._tunnel:
+            headers = dict(headers, **self._proxy_headers)
+
+        conn, reused = self._get_connection()
+        try:
+            if timeout is not None:
+                self._set_timeout(conn, timeout)
+            try:
+                response = self._do_request(conn, body, headers)
+            except (httplib.HTTPException, socket.error) as error:
+                conn.close()
+                if not reused or not _stale(error):
+                    raise
+                conn = self._new_connection()
+                if timeout is not None:
+                    self._set_timeout(conn, timeout)
+                response = self._do_request(conn, body, headers)
+            data = self._read(response)
+        except (httplib.HTTPException, socket.error, zlib.error) as error:
+            conn.close()
+            raise urllib2.URLError(error)
+
+        if response.will_close:
+            conn.close()
+        else:
+            if timeout is not None:
+                self._set_timeout(conn, self.timeout)
+            self._put_connection(conn)
+
+        if response.status >= 400:
+            raise urllib2.HTTPError(self.url, response.status, response.reason,
+                                    response.msg, StringIO(data))
+        return data
@@ -0,0 +1,156 @@
+# ratelimit.py
+#  - Client side rate limiting for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.ratelimit
+   :synopsis: Adaptive token bucket rate limiting per API action
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+"""
+
+import threading
+import time
+
+from yourls import YourlsError
+
+# HTTP statuses that mean "slow down": flood protection plugins answer 403
+# or 429, an overloaded PHP front end 503
+THROTTLE_STATUSES = frozenset([403, 429, 503])
+
+class TokenBucket(object):
+    """A thread safe token bucket whose rate adapts to server feedback
+
+    The rate follows AIMD: every successful request adds roughly
+    ``increase`` requests/second per second of traffic, up to ``max_rate``,
+    and every throttled, failed or slow request multiplies the rate by
+    ``decrease``, down to ``min_rate``.
+
+    """
+
+    def __init__(self, rate, burst=None, max_rate=None, min_rate=None,
+                 increase=1.0, decrease=0.5, slow_threshold=None):
+        """
+        :param rate: The starting rate in requests per second
+        :param burst: The most tokens that can accumulate (rate by default)
+        :param max_rate: The ceiling for the adapted rate (rate by default)
+        :param min_rate: The floor for the adapted rate (rate / 100 by default)
+        :param increase: Requests/second gained per second of successful traffic
+        :param decrease: Factor the rate is multiplied by on failure
+        :param slow_threshold: Seconds after which a response counts as a failure
+        :throws: YourlsError for a rate that is not positive
+
+        """
+        if rate <= 0:
+            raise YourlsError('The rate must be greater than 0')
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.max_rate = float(max_rate if max_rate is not None else rate)
+        self.min_rate = float(min_rate if min_rate is not None else rate / 100.0)
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_threshold = slow_threshold
+
+        self.throttled = 0
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+
+    def _refill(self, now):
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+    def acquire(self, timeout=None):
+        """Block until a request may be sent
+
+        The token is reserved straight away, so concurrent callers queue up
+        behind each other instead of racing for the next token.
+
+        :param timeout: Seconds to wait at most (forever if None)
+        :returns: bool -- False, without taking a token, if the wait would
+                  have been longer than ``timeout``
+
+        """
+        with self._lock:
+            self._refill(time.time())
+            wait = (1 - self._tokens) / self.rate
+            if timeout is not None and wait > timeout:
+                return False
+            self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+    def on_success(self, elapsed):
+        """Feed back a successful request that took ``elapsed`` seconds"""
+        if self.slow_threshold is not None and elapsed > self.slow_threshold:
+            self.on_failure()
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+
+    def on_failure(self):
+        """Feed back a throttled or failed request"""
+        with self._lock:
+            self.throttled += 1
+            self._refill(time.time())
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+
+
+class RateLimiter(object):
+    """One TokenBucket per YOURLS API action"""
+
+    def __init__(self, rates, default=None, **bucket_args):
+        """
+        :param rates: dict of API action to starting requests per second
+        :param default: The rate for actions not in rates (unlimited if None)
+
+        Any other keyword arguments are passed to each TokenBucket.
+
+        """
+        self.buckets = dict((action, TokenBucket(rate, **bucket_args))
+                            for action, rate in rates.items())
+        self.default = None
+        if default is not None:
+            self.default = TokenBucket(default, **bucket_args)
+
+
+    def bucket(self, action):
+        """The bucket that limits ``action``, or None if it is unlimited"""
+        return self.buckets.get(action, self.default)
+
+
+    def stats(self):
+        """The current rate and throttle count of every bucket
+
+        :returns: dict of action to dict with rate and throttled
+
+        """
+        buckets = dict(self.buckets)
+        if self.default is not None:
+            buckets['default'] = self.default
+        return dict((action, {'rate' : b.rate, 'throttled' : b.throttled})
+                    for action, b in buckets.items())
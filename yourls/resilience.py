@@ -0,0 +1,161 @@
+# resilience.py
+#  - Retry and circuit breaker policies for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.resilience
+   :synopsis: Retry with backoff and a circuit breaker for failing backends
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+"""
+
+import random
+import threading
+import time
+
+class RetryPolicy(object):
+    """Retries with jittered exponential backoff for idempotent actions
+
+    Only transport failures and HTTP 5xx responses are retried; YOURLS
+    level errors such as an unknown short URL are returned to the caller
+    straight away.
+
+    """
+
+    def __init__(self, retries=3, backoff=0.1, max_backoff=5.0,
+                 actions=('expand', 'url-stats', 'stats', 'db-stats', 'version')):
+        """
+        :param retries: The number of retries after the first attempt
+        :param backoff: The base delay in seconds, doubled for every retry
+        :param max_backoff: The longest delay in seconds between attempts
+        :param actions: The API actions that are safe to retry
+
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.actions = frozenset(actions)
+
+
+    def should_retry(self, action, attempt):
+        """Whether a failed attempt (counted from 0) may be retried"""
+        return action in self.actions and attempt < self.retries
+
+
+    def delay(self, attempt):
+        """Seconds to sleep before retrying after attempt (counted from 0)
+
+        Uses "full jitter", a uniform delay up to the exponential backoff, so
+        that clients which failed together do not retry together.
+
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class CircuitBreaker(object):
+    """Fails calls fast while the backend looks unhealthy
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    calls are refused for ``reset_timeout`` seconds. It then half-opens and
+    lets a single trial call through: success closes the breaker, failure
+    opens it again.
+
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        :param failure_threshold: Consecutive failures before opening
+        :param reset_timeout: Seconds to stay open before allowing a trial call
+
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self._state = self.CLOSED
+        self._opened_at = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+
+    @property
+    def state(self):
+        """The current state, one of closed, open or half-open"""
+        with self._lock:
+            if (self._state == self.OPEN and
+                    time.time() - self._opened_at >= self.reset_timeout):
+                self._state = self.HALF_OPEN
+            return self._state
+
+
+    def allow(self):
+        """Whether a call may go to the backend right now"""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+
+    def release(self):
+        """Give back the half-open trial of a call that ended without a
+        success or failure to record"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_running = False
+
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            self._state = self.CLOSED
+
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if (self._state == self.HALF_OPEN or
+                    self.failures >= self.failure_threshold):
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.time()
+            self._trial_running = False
+
+
+    def stats(self):
+        """State and counters for monitoring
+
+        :returns: dict with state, failures, times_opened and rejected
+
+        """
+        return {'state' : self.state, 'failures' : self.failures,
+                'times_opened' : self.times_opened, 'rejected' : self.rejected}
@@ -0,0 +1,347 @@
+# sharding.py
+#  - A client for several independent YOURLS instances
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.sharding
+   :synopsis: Treat several YOURLS instances as one shortener
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+Each shard is a separate YOURLS instance with its own database, keyword
+space and short domain. Long URLs are placed on a shard by consistent
+hashing; short URLs are sent back to the shard that owns their host::
+
+    client = ShardedYourlsClient(['http://a.sho.rt/yourls-api.php',
+                                  'http://b.sho.rt/yourls-api.php'],
+                                 token='secret')
+    shorturl = client.shorten('http://example.com/')
+    client.expand(shorturl)
+"""
+
+import bisect
+import functools
+import hashlib
+import struct
+import threading
+import urlparse
+
+from yourls import YourlsError, YourlsOperationError
+from yourls.client import YourlsClient
+from yourls.futures import imap
+from yourls.models import DbStats
+from yourls.util import capture, shorten_item, utf8
+
+DEFAULT_PORTS = {'http' : 80, 'https' : 443}
+
+def _host(url):
+    """The host of a URL, with its port unless it is the scheme's default"""
+    parsed = urlparse.urlsplit(utf8(url))
+    host = (parsed.hostname or '').lower()
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(parsed.scheme):
+        host += ':%d' % parsed.port
+    return host
+
+
+class HashRing(object):
+    """A consistent hash ring of shard names
+
+    Every shard is placed on the ring at ``vnodes`` points and a key belongs
+    to the first shard point at or after the key's hash. Adding or removing
+    a shard only moves the keys between its points and their neighbours,
+    about 1/N of all keys.
+
+    """
+
+    def __init__(self, names=(), vnodes=160):
+        """
+        :param names: The initial shard names
+        :param vnodes: The number of ring points per shard (per unit of weight)
+
+        """
+        self.vnodes = vnodes
+        # sorted hashes and the shard owning each, replaced as a whole
+        self._ring = ((), ())
+        self._lock = threading.Lock()
+        for name in names:
+            self.add(name)
+
+
+    @staticmethod
+    def _hash(key):
+        return struct.unpack('<Q', hashlib.md5(utf8(key)).digest()[:8])[0]
+
+
+    def add(self, name, weight=1):
+        """Place a shard on the ring
+
+        :param weight: Relative share of keys, e.g. 2 for a shard twice as big
+
+        """
+        points = [(self._hash('%s#%d' % (name, i)), name)
+                  for i in xrange(int(self.vnodes * weight))]
+        with self._lock:
+            hashes, names = self._ring
+            merged = sorted(zip(hashes, names) + points)
+            self._ring = (tuple(h for h, n in merged), tuple(n for h, n in merged))
+
+
+    def remove(self, name):
+        with self._lock:
+            hashes, names = self._ring
+            kept = [(h, n) for h, n in zip(hashes, names) if n != name]
+            self._ring = (tuple(h for h, n in kept), tuple(n for h, n in kept))
+
+
+    def get(self, key):
+        """The name of the shard a key belongs to
+
+        :raises: YourlsError if the ring is empty
+
+        """
+        hashes, names = self._ring
+        if not hashes:
+            raise YourlsError('No shards to route to')
+        return names[bisect.bisect_left(hashes, self._hash(key)) % len(hashes)]
+
+
+    def names(self):
+        return sorted(set(self._ring[1]))
+
+
+class ShardedYourlsClient(object):
+    """A client for independent YOURLS instances, each owning its own links
+
+    ``shorten`` picks a shard by consistent hashing of the long URL, so the
+    same URL always lands on the same shard and keeps its existing short
+    URL. ``expand`` and ``get_url_stats`` are routed by the host of the
+    short URL; the api host of every shard is known up front, and the short
+    domains it answers with are learnt from ``shorten``, or can be given
+    with ``domains``. A bare keyword cannot be routed and fails with
+    YourlsOperationError.
+
+    Bulk calls keep ``workers`` requests in flight per shard, so one slow
+    shard does not hold up the others.
+
+    """
+
+    def __init__(self, shards, username=None, password=None, token=None,
+                 vnodes=160, domains=None, **kwargs):
+        """
+        :param shards: The api urls of the shards, or YourlsClients for shards
+                       needing their own settings
+        :param username: The username to login to url shards with
+        :param password: The password to login to url shards with
+        :param token: The signature token to use for url shards
+        :param vnodes: The number of hash ring points per shard
+        :param domains: dict of short URL host to the api url of its shard
+        :throws: YourlsError for incorrent parameters
+
+        Any other keyword arguments are passed on to the YourlsClient of
+        each url shard. A ``canonicalizer`` among them is also used to place
+        long URLs, so variants of a URL land on the same shard.
+
+        """
+        self.username = username
+        self.password = password
+        self.token = token
+        self.client_args = kwargs
+        self.canonicalizer = kwargs.get('canonicalizer')
+        self.ring = HashRing(vnodes=vnodes)
+        self.shards = {}
+        self.domains = {}
+        self._lock = threading.Lock()
+
+        if not shards:
+            raise YourlsError('At least one shard is required')
+        for shard in shards:
+            self.add_shard(shard)
+        for host, apiurl in (domains or {}).items():
+            self.domains[host.lower()] = apiurl
+
+
+    def add_shard(self, shard, weight=1):
+        """Start placing new long URLs on another shard
+
+        :param shard: An api url, or a YourlsClient
+        :param weight: Relative share of new long URLs
+        :returns: YourlsClient -- The shard's client
+
+        """
+        if isinstance(shard, basestring):
+            shard = YourlsClient(shard, self.username, self.password,
+                                 self.token, **self.client_args)
+        with self._lock:
+            self.shards[shard.apiurl] = shard
+            self.domains.setdefault(_host(shard.apiurl), shard.apiurl)
+        self.ring.add(shard.apiurl, weight)
+        return shard
+
+
+    def remove_shard(self, apiurl):
+        """Stop using a shard and close its connections"""
+        self.ring.remove(apiurl)
+        with self._lock:
+            shard = self.shards.pop(apiurl)
+            for host, owner in self.domains.items():
+                if owner == apiurl:
+                    del self.domains[host]
+        shard.close()
+
+
+    def shard_for_url(self, url):
+        """The client of the shard a long URL is shortened on"""
+        return self.shards[self._url_route(url)]
+
+
+    def shard_for_shorturl(self, shorturl):
+        """The client of the shard owning a short URL
+
+        :raises: YourlsOperationError if the host belongs to no shard
+
+        """
+        host = _host(shorturl)
+        apiurl = self.domains.get(host)
+        if apiurl is None:
+            if not host:
+                raise YourlsOperationError(shorturl, 'A bare keyword cannot be '
+                                           'routed to a shard')
+            raise YourlsOperationError(shorturl, "No shard for host '%s'" % host)
+        return self.shards[apiurl]
+
+
+    def _learn(self, shard, shorturl):
+        host = _host(shorturl)
+        if host and host not in self.domains:
+            with self._lock:
+                self.domains.setdefault(host, shard.apiurl)
+
+
+    def shorten(self, url, custom = None, title = None, timeout = None,
+                deadline = None):
+        """Shorten a URL on the shard its hash maps to
+
+        :returns: str -- The short URL
+        :raises: YourlsOperationError
+
+        """
+        shard = self.shard_for_url(url)
+        shorturl = shard.shorten(url, custom, title, timeout, deadline)
+        self._learn(shard, shorturl)
+        return shorturl
+
+
+    def shorten_result(self, url, custom = None, title = None):
+        """Like :meth:`shorten`, but return everything YOURLS reported
+
+        :returns: yourls.models.ShortenResult
+
+        """
+        shard = self.shard_for_url(url)
+        result = shard.shorten_result(url, custom, title)
+        self._learn(shard, result.shorturl)
+        return result
+
+
+    def expand(self, shorturl, timeout = None, deadline = None):
+        """Expand a short URL on the shard owning its host
+
+        :returns: str -- The expanded URL
+        :raises: YourlsOperationError
+
+        """
+        return self.shard_for_shorturl(shorturl).expand(shorturl, timeout,
+                                                        deadline)
+
+
+    def get_url_stats(self, shorturl, timeout = None, deadline = None):
+        """Get statistics about a short URL from the shard owning its host
+
+        :returns: yourls.models.LinkStats
+        :raises: YourlsOperationError
+
+        """
+        return self.shard_for_shorturl(shorturl).get_url_stats(shorturl, timeout,
+                                                               deadline)
+
+
+    def db_stats(self):
+        """The total number of links and clicks over all shards
+
+        :returns: yourls.models.DbStats
+
+        """
+        totals = [shard.db_stats() for shard in self.shards.values()]
+        return DbStats(sum(t.total_links for t in totals),
+                       sum(t.total_clicks for t in totals))
+
+
+    def _url_route(self, item):
+        if not isinstance(item, basestring):
+            item = item[0]
+        if self.canonicalizer is not None:
+            item = self.canonicalizer(item)
+        return self.ring.get(item)
+
+
+    def _shorturl_route(self, shorturl):
+        # unroutable short URLs share a pool and fail in expand()
+        return self.domains.get(_host(shorturl))
+
+
+    def shorten_many(self, urls, workers = 8, ordered = True, window = None):
+        """Shorten many URLs, in parallel on every shard
+
+        :param urls: An iterable of URLs, or of (url, custom, title) tuples
+        :param workers: The number of requests in flight per shard
+        :param ordered: Yield results in input order instead of completion order
+        :param window: The maximum number of URLs read ahead (2 * workers per shard by default)
+        :returns: generator of (item, result) tuples, where result is the
+                  short URL or the YourlsOperationError raised for that item
+
+        """
+        if window is None:
+            window = 2 * workers * len(self.shards)
+        return imap(functools.partial(shorten_item, self.shorten), urls, workers,
+                    window, ordered, route=self._url_route)
+
+
+    def expand_many(self, shorturls, workers = 8, ordered = True, window = None):
+        """Expand many short URLs, in parallel on every shard
+
+        :param shorturls: An iterable of short URLs
+        :param workers: The number of requests in flight per shard
+        :param ordered: Yield results in input order instead of completion order
+        :param window: The maximum number of URLs read ahead (2 * workers per shard by default)
+        :returns: generator of (shorturl, result) tuples, where result is the
+                  long URL or the YourlsOperationError raised for that item
+
+        """
+        if window is None:
+            window = 2 * workers * len(self.shards)
+        return imap(functools.partial(capture, self.expand), shorturls, workers,
+                    window, ordered, route=self._shorturl_route)
+
+
+    def close(self):
+        """Close the pooled connections of every shard"""
+        for shard in self.shards.values():
+            shard.close()
@@ -0,0 +1,88 @@
+# singleflight.py
+#  - Coalescing of identical concurrent requests for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.singleflight
+   :synopsis: Share one in-flight call between concurrent identical callers
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+"""
+
+import threading
+
+from yourls.futures import Future
+
+class SingleFlight(object):
+    """Runs at most one call per key at a time
+
+    The first caller for a key runs the call. Callers that arrive with the
+    same key while it is running wait for it and get the same result, or
+    the same exception, without making a call of their own.
+
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._flights = {}
+
+
+    def do(self, key, fn, *args, **kwargs):
+        """Call ``fn(*args)``, or join an identical call already in flight
+
+        :param key: Identifies calls that can share a result
+        :param timeout: Seconds to wait for a call in flight (keyword only,
+                        forever if None)
+        :returns: the result of the call
+        :raises: the exception raised by the call, YourlsError if the wait
+                 for a call in flight timed out
+
+        """
+        timeout = kwargs.pop('timeout', None)
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Future()
+                self.calls += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return flight.result(timeout)
+
+        try:
+            result = fn(*args)
+        except Exception as error:
+            self._land(key)
+            flight.set_exception(error)
+            raise
+        self._land(key)
+        flight.set_result(result)
+        return result
+
+
+    def _land(self, key):
+        with self._lock:
+            del self._flights[key]
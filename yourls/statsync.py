@@ -0,0 +1,283 @@
+# statsync.py
+#  - Adaptive click statistics poller for the python yourls client
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.statsync
+   :synopsis: Poll click counts at a rate matching each link's traffic
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+Every tracked link has its own polling interval. A link whose count has
+not moved waits twice as long before the next poll, up to
+``max_interval``; a link that is being clicked is polled about every
+``target_clicks`` clicks, going by a smoothed clicks per second estimate,
+down to ``min_interval``. Only changes are written to the time series::
+
+    sync = StatsSync(client, 'clicks.db', budget=500, workers=4)
+    sync.track(shorturls)
+    sync.start(60)      # run a cycle every minute
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from yourls import YourlsOperationError
+from yourls.futures import imap
+
+log = logging.getLogger('yourls')
+
+# weight of the newest observation in the clicks per second estimate
+SMOOTHING = 0.5
+
+class StatsSync(object):
+    """Syncs ``get_url_stats`` click counts into an SQLite time series
+
+    The ``links`` table holds the schedule and last count of every tracked
+    link and the ``clicks`` table a row per poll that saw the count change
+    (the first poll of a link counts from zero, so a link that has never
+    been clicked gets no row).
+
+    """
+
+    def __init__(self, client, path, min_interval=60.0, max_interval=86400.0,
+                 target_clicks=10, budget=1000, workers=4):
+        """
+        :param client: The YourlsClient to poll with
+        :param path: The database file to use, created if needed
+        :param min_interval: Seconds between polls of the busiest links
+        :param max_interval: Seconds between polls of links nobody clicks
+        :param target_clicks: Clicks a busy link should gather between polls
+        :param budget: The most links polled in one cycle
+        :param workers: The number of requests in flight during a cycle
+
+        """
+        self.client = client
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_clicks = target_clicks
+        self.budget = budget
+        self.workers = workers
+
+        self.cycles = 0
+        self.polled = 0
+        self.changed = 0
+        self.errors = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.text_factory = str
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS links '
+                         '(shorturl TEXT PRIMARY KEY, clicks INTEGER, '
+                         'velocity REAL NOT NULL, interval REAL NOT NULL, '
+                         'last_polled REAL, next_poll REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS links_next_poll '
+                         'ON links (next_poll)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS clicks '
+                         '(shorturl TEXT NOT NULL, time REAL NOT NULL, '
+                         'clicks INTEGER NOT NULL, delta INTEGER NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS clicks_shorturl '
+                         'ON clicks (shorturl, time)')
+        self._db.commit()
+
+
+    def track(self, shorturls, now=None):
+        """Start polling links, the new ones in the next cycle"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.executemany('INSERT OR IGNORE INTO links (shorturl, '
+                                     'velocity, interval, next_poll) '
+                                     'VALUES (?, 0, ?, ?)',
+                                     ((s, self.min_interval, now) for s in shorturls))
+
+
+    def untrack(self, shorturl):
+        """Stop polling a link, keeping its history"""
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM links WHERE shorturl = ?', (shorturl,))
+
+
+    def _fetch(self, shorturls):
+        """get_url_stats for every short URL, batched where possible
+
+        :returns: list of LinkStats or YourlsOperationError
+
+        """
+        batch = getattr(self.client, 'batch', None)
+        if batch is not None:
+            try:
+                return batch([('url-stats', s) for s in shorturls],
+                             workers=self.workers)
+            except YourlsOperationError as error:
+                return [error] * len(shorturls)
+        return [result for shorturl, result in
+                imap(self._stats_item, shorturls, self.workers)]
+
+
+    def _stats_item(self, shorturl):
+        try:
+            return self.client.get_url_stats(shorturl)
+        except YourlsOperationError as error:
+            return error
+
+
+    def _schedule(self, old_clicks, clicks, velocity, interval, last_polled, now):
+        """The new (velocity, interval) of a link after a poll"""
+        if old_clicks is None:
+            # first sighting, poll again soon to get a rate
+            return 0.0, self.min_interval
+
+        delta = clicks - old_clicks
+        observed = float(max(delta, 0)) / max(now - last_polled, 1e-3)
+        velocity = SMOOTHING * observed + (1 - SMOOTHING) * velocity
+        if delta and velocity > 0:
+            interval = self.target_clicks / velocity
+        else:
+            interval = interval * 2
+        return velocity, min(self.max_interval, max(self.min_interval, interval))
+
+
+    def run_cycle(self, now=None):
+        """Poll the links that are due, at most ``budget`` of them
+
+        :returns: dict with the number of links polled, changed, errors and
+                  still due
+
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            due = self._db.execute('SELECT shorturl, clicks, velocity, interval, '
+                                   'last_polled FROM links WHERE next_poll <= ? '
+                                   'ORDER BY next_poll LIMIT ?',
+                                   (now, self.budget)).fetchall()
+        if not due:
+            return {'polled' : 0, 'changed' : 0, 'errors' : 0, 'due' : 0}
+
+        results = self._fetch([row[0] for row in due])
+
+        updates = []
+        deltas = []
+        errors = 0
+        for (shorturl, old_clicks, velocity, interval, last_polled), result in \
+                zip(due, results):
+            if isinstance(result, Exception):
+                errors += 1
+                interval = min(self.max_interval, interval * 2)
+                updates.append((old_clicks, velocity, interval, last_polled,
+                                now + interval, shorturl))
+                continue
+
+            clicks = result.clicks
+            velocity, interval = self._schedule(old_clicks, clicks, velocity,
+                                                interval, last_polled, now)
+            if clicks != (old_clicks or 0):
+                deltas.append((shorturl, now, clicks, clicks - (old_clicks or 0)))
+            updates.append((clicks, velocity, interval, now, now + interval,
+                            shorturl))
+
+        with self._lock:
+            with self._db:
+                self._db.executemany('UPDATE links SET clicks = ?, velocity = ?, '
+                                     'interval = ?, last_polled = ?, next_poll = ? '
+                                     'WHERE shorturl = ?', updates)
+                self._db.executemany('INSERT INTO clicks (shorturl, time, clicks, '
+                                     'delta) VALUES (?, ?, ?, ?)', deltas)
+            still_due = self._db.execute('SELECT COUNT(*) FROM links WHERE '
+                                         'next_poll <= ?', (now,)).fetchone()[0]
+
+        self.cycles += 1
+        self.polled += len(due)
+        self.changed += len(deltas)
+        self.errors += errors
+        return {'polled' : len(due), 'changed' : len(deltas), 'errors' : errors,
+                'due' : still_due}
+
+
+    def clicks(self, shorturl):
+        """The last synced click count of a link, or None"""
+        with self._lock:
+            row = self._db.execute('SELECT clicks FROM links WHERE shorturl = ?',
+                                   (shorturl,)).fetchone()
+        return row[0] if row is not None else None
+
+
+    def history(self, shorturl, since=0):
+        """The recorded changes of a link's click count
+
+        :returns: list of (time, clicks, delta) tuples, oldest first
+
+        """
+        with self._lock:
+            return self._db.execute('SELECT time, clicks, delta FROM clicks '
+                                    'WHERE shorturl = ? AND time >= ? ORDER BY time',
+                                    (shorturl, since)).fetchall()
+
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.run_cycle()
+            except Exception:
+                log.exception('yourls stats sync cycle failed')
+
+
+    def start(self, interval=60.0):
+        """Run a cycle every ``interval`` seconds in the background"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+    def stats(self):
+        """Counters for monitoring
+
+        :returns: dict with tracked, cycles, polled, changed and errors
+
+        """
+        with self._lock:
+            tracked = self._db.execute('SELECT COUNT(*) FROM links').fetchone()[0]
+        return {'tracked' : tracked, 'cycles' : self.cycles, 'polled' : self.polled,
+                'changed' : self.changed, 'errors' : self.errors}
+
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._db.close()
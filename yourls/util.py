@@ -0,0 +1,57 @@
+# util.py
+#  - Small helpers shared by the python yourls client modules
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.util
+   :synopsis: Small helpers shared by the client modules
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+"""
+
+from yourls import YourlsOperationError
+
+def utf8(value):
+    """A byte string of value, unicode encoded as utf-8
+
+    Anything that is not a string goes through str(), so keywords given
+    as numbers work too.
+
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def capture(fn, *args):
+    """Call fn, returning any YourlsOperationError instead of raising it"""
+    try:
+        return fn(*args)
+    except YourlsOperationError as error:
+        return error
+
+
+def shorten_item(shorten, item):
+    """Call shorten for an item of a bulk call, a URL or a (url, custom,
+    title) tuple, returning any YourlsOperationError instead of raising it"""
+    if isinstance(item, basestring):
+        return capture(shorten, item)
+    return capture(shorten, *item)
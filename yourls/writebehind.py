@@ -0,0 +1,277 @@
+# writebehind.py
+#  - Background batching queue for shorten requests
+#
+# Copyright 2011, Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Author:
+#       Tim Flink <tflink@redhat.com>
+
+"""
+.. module:: yourls.writebehind
+   :synopsis: Queue shorten calls and send them in batches in the background
+
+.. moduleauthor:: Tim Flink <tflink@redhat.com>
+
+Request handlers hand their URLs to a :class:`ShortenQueue` and get a
+future back straight away. A collector thread groups queued URLs into
+batches of at most ``max_batch`` URLs, waiting no longer than ``max_delay``
+after the first one, and at most ``senders`` batches are sent at once, so a
+burst of shortens reaches YOURLS as a steady stream::
+
+    queue = ShortenQueue(client, max_batch=20, max_delay=0.05, senders=2)
+    future = queue.submit('http://example.com/')
+    ...
+    shorturl = future.result(timeout=5)
+    queue.close()
+"""
+
+import Queue
+import threading
+import time
+
+from yourls import YourlsError
+from yourls.futures import Executor, Future
+
+# markers passed through the queue to the collector
+_FLUSH = object()
+_STOP = object()
+
+class _MarkerQueue(Queue.Queue):
+    """A bounded queue that markers can always be added to"""
+
+    def put_marker(self, item):
+        """Add an item without waiting for room, so flush and close never
+        block behind a full queue"""
+        with self.not_full:
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+
+class ShortenQueue(object):
+    """Write-behind queue in front of ``YourlsClient.shorten``
+
+    Identical requests within a batch are sent once and share the result.
+    Batches go to YOURLS as one request when the server has the batch
+    action (see ``YourlsClient.batch``).
+    When ``maxsize`` URLs are waiting, :meth:`submit` blocks for up to
+    ``put_timeout`` seconds and then raises YourlsError, pushing back on
+    callers instead of letting the queue grow without bound.
+
+    """
+
+    def __init__(self, client, max_batch=50, max_delay=0.05, senders=2,
+                 maxsize=1000, put_timeout=None):
+        """
+        :param client: The YourlsClient to shorten with
+        :param max_batch: The most URLs sent as one batch
+        :param max_delay: Seconds to wait for a batch to fill up
+        :param senders: The number of batches sent at once
+        :param maxsize: The most URLs waiting to be batched
+        :param put_timeout: Seconds submit waits for room (forever if None)
+
+        """
+        self.client = client
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.senders = senders
+        self.put_timeout = put_timeout
+
+        self.submitted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.deduplicated = 0
+
+        self._queue = _MarkerQueue(maxsize)
+        self._slots = threading.Semaphore(senders)
+        self._executor = Executor(senders)
+        self._outstanding = 0
+        self._idle = threading.Condition()
+        self._closed = False
+        self._submit_lock = threading.Lock()
+        self._collector = threading.Thread(target=self._collect)
+        self._collector.daemon = True
+        self._collector.start()
+
+
+    def submit(self, url, custom = None, title = None):
+        """Queue a URL to be shortened
+
+        :returns: yourls.futures.Future of the short URL
+        :raises: YourlsError if the queue is closed or stays full
+
+        """
+        future = Future()
+        # nothing may be queued behind the stop marker
+        with self._submit_lock:
+            if self._closed:
+                raise YourlsError('Cannot submit to a closed shorten queue')
+            with self._idle:
+                self._outstanding += 1
+            try:
+                self._queue.put((future, url, custom, title), True,
+                                self.put_timeout)
+            except Queue.Full:
+                self._finished(1)
+                self.rejected += 1
+                raise YourlsError('Shorten queue is full')
+            self.submitted += 1
+        return future
+
+
+    def _collect(self):
+        try:
+            self._collect_batches()
+        finally:
+            # only once nothing more can be handed to it
+            self._executor.shutdown(False)
+
+
+    def _collect_batches(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = []
+            if item is not _FLUSH:
+                batch.append(item)
+            deadline = time.time() + self.max_delay
+            while batch and len(batch) < self.max_batch:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(True, timeout)
+                except Queue.Empty:
+                    break
+                if item is _FLUSH:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if batch:
+                # waiting for a free sender is what lets the queue fill up
+                self._slots.acquire()
+                self.batches += 1
+                self._executor.submit(self._send, batch)
+
+
+    def _send(self, batch):
+        """Shorten each distinct request of a batch and resolve its futures"""
+        try:
+            requests = {}
+            for future, url, custom, title in batch:
+                requests.setdefault((url, custom, title), []).append(future)
+            with self._idle:
+                self.deduplicated += len(batch) - len(requests)
+
+            keys = list(requests)
+            for key, result in zip(keys, self._shorten_all(keys)):
+                for future in requests[key]:
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self._slots.release()
+            self._finished(len(batch))
+
+
+    def _shorten_all(self, keys):
+        """Shorten (url, custom, title) requests, in one request if the
+        client and server support the batch action
+
+        :returns: list of short URLs or the exceptions raised
+
+        """
+        batch = getattr(self.client, 'batch', None)
+        if batch is not None:
+            try:
+                # workers=1 keeps the fallback to single calls at one per sender
+                return batch([('shorturl',) + key for key in keys], workers=1)
+            except Exception as error:
+                return [error] * len(keys)
+
+        results = []
+        for url, custom, title in keys:
+            try:
+                results.append(self.client.shorten(url, custom, title))
+            except Exception as error:
+                results.append(error)
+        return results
+
+
+    def _finished(self, count):
+        with self._idle:
+            self._outstanding -= count
+            if not self._outstanding:
+                self._idle.notify_all()
+
+
+    def flush(self, timeout=None):
+        """Send whatever is queued now and wait until it has been shortened
+
+        :param timeout: Seconds to wait at most (forever if None)
+        :returns: bool -- Whether everything submitted so far is done
+
+        """
+        with self._submit_lock:
+            if not self._closed:
+                self._queue.put_marker(_FLUSH)
+        give_up_at = None if timeout is None else time.time() + timeout
+        with self._idle:
+            while self._outstanding:
+                remaining = None
+                if give_up_at is not None:
+                    remaining = give_up_at - time.time()
+                    if remaining <= 0:
+                        return False
+                self._idle.wait(remaining)
+        return True
+
+
+    def close(self, wait=True):
+        """Stop accepting URLs, send what is queued and stop the threads
+
+        Without ``wait`` the queued URLs are still sent in the background.
+
+        :param wait: Block until every queued URL has been shortened
+
+        """
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put_marker(_STOP)
+        if wait:
+            self._collector.join()
+            self.flush()
+
+
+    def stats(self):
+        """Counters for monitoring
+
+        :returns: dict with submitted, rejected, batches, deduplicated,
+                  queued and outstanding
+
+        """
+        return {'submitted' : self.submitted, 'rejected' : self.rejected,
+                'batches' : self.batches, 'deduplicated' : self.deduplicated,
+                'queued' : self._queue.qsize(), 'outstanding' : self._outstanding}